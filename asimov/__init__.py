@@ -99,6 +99,14 @@ try:
         from .ledger import YAMLLedger
 
         current_ledger = YAMLLedger(config.get("ledger", "location"))
+    elif config.get("ledger", "engine") == "sqlite":
+        from .ledger import SQLiteLedger
+
+        current_ledger = SQLiteLedger(config.get("ledger", "location"))
+    elif config.get("ledger", "engine") == "sharded":
+        from .ledger import ShardedYAMLLedger
+
+        current_ledger = ShardedYAMLLedger(config.get("ledger", "location"))
     else:
         current_ledger = None
 except FileNotFoundError:
@@ -30,6 +30,7 @@ from warnings import warn
 from liquid import Liquid
 
 from asimov import config
+from asimov.dag import FINISHED_STATES
 from asimov.pipelines import known_pipelines
 from asimov.utils import update
 from asimov.storage import Store
@@ -51,7 +52,11 @@ class Analysis:
     def _process_dependencies(self, needs):
         """
         Process the dependencies list for this production.
+
+        A single dependency can be given without a list.
         """
+        if isinstance(needs, str):
+            return [needs]
         return needs
 
     @property
@@ -72,8 +77,7 @@ class Analysis:
 
     @property
     def finished(self):
-        finished_states = ["uploaded"]
-        return self.status in finished_states
+        return self.status in FINISHED_STATES
 
     @property
     def status(self):
@@ -193,6 +197,23 @@ class ProjectAnalysis(Analysis):
 
         self.subjects = subjects
         self.analyses = analyses
+        self.name = name
+        self.pipeline = pipeline.lower()
+        self.comment = comment
+        if status:
+            self.status_str = status.lower()
+        else:
+            self.status_str = "none"
+        self.meta = deepcopy(kwargs)
+
+    @property
+    def dependencies(self):
+        """
+        The analyses which this analysis needs, each given as
+        ``<event>/<analysis>``, as dependencies on the analyses of other
+        events are in `asimov.dag.ProjectGraph`.
+        """
+        return [f"{analysis.event.name}/{analysis.name}" for analysis in self.analyses]
 
 
 class GravitationalWaveTransient(SimpleAnalysis):
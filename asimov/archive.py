@@ -0,0 +1,210 @@
+"""
+An archive of the previous versions of events in the project ledger.
+
+When an event is updated by applying a new blueprint, or is removed from
+the ledger, a copy of its old version is added to the archive.
+The archive is kept apart from the ledger itself, so that it is only
+read when a previous version is needed, and the ledger only grows with
+the number of live events.
+"""
+
+import datetime
+import os
+
+import yaml
+
+from asimov.cache import Dumper, Loader
+from asimov.lock import FileLock
+
+
+class YAMLArchive:
+    """
+    An archive which keeps the previous versions of each event in a YAML
+    file named after the event.
+
+    New versions are appended to the end of the file, so adding to the
+    archive does not require the file to be re-written.
+
+    Parameters
+    ----------
+    location : str
+       The directory which contains the archive files.
+    """
+
+    def __init__(self, location):
+        self.location = os.path.abspath(location)
+        self.lock = FileLock(self.location + ".lock")
+
+    def path(self, name):
+        """
+        Find the path to the archive file for an event.
+        """
+        return os.path.join(self.location, f"{name}.yml")
+
+    def events(self):
+        """
+        List the names of the events which have archived versions.
+        """
+        if not os.path.isdir(self.location):
+            return []
+        return sorted(
+            filename[: -len(".yml")]
+            for filename in os.listdir(self.location)
+            if filename.endswith(".yml")
+        )
+
+    def versions(self, name):
+        """
+        Read all of the archived versions of an event.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+
+        Returns
+        -------
+        list of dict
+           The archived versions, oldest first.
+           Each has a ``version``, the ``reason`` it was archived, the
+           ``date`` it was archived, and the event's ``data``.
+        """
+        try:
+            with open(self.path(name), "r") as archive_file:
+                return [
+                    entry
+                    for entry in yaml.load_all(archive_file, Loader=Loader)
+                    if entry
+                ]
+        except FileNotFoundError:
+            return []
+
+    def get(self, name, version):
+        """
+        Read a single archived version of an event.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        version : str
+           The name of the version, for example ``version-1``.
+
+        Returns
+        -------
+        dict
+           The dictionary representation of the event.
+
+        Raises
+        ------
+        KeyError
+           If there is no such version of the event.
+        """
+        for entry in self.versions(name):
+            if entry["version"] == version:
+                return entry["data"]
+        raise KeyError(f"{name} has no archived version called {version}")
+
+    def add(self, name, data, reason, date=None):
+        """
+        Add a version of an event to the archive.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        data : dict
+           The dictionary representation of the event.
+        reason : str
+           Why the event was archived, for example ``updated`` or ``deleted``.
+        date : datetime, optional
+           When the event was archived; defaults to now.
+
+        Returns
+        -------
+        str
+           The name of the new version.
+        """
+        os.makedirs(self.location, exist_ok=True)
+        with self.lock:
+            version = f"version-{len(self.versions(name)) + 1}"
+            entry = {
+                "version": version,
+                "reason": reason,
+                "date": date or datetime.datetime.now(),
+                "data": data,
+            }
+            text = yaml.dump(
+                entry, default_flow_style=False, explicit_start=True, Dumper=Dumper
+            )
+            with open(self.path(name), "a") as archive_file:
+                archive_file.write(text)
+        return version
+
+
+class SQLiteArchive:
+    """
+    An archive which keeps the previous versions of events in a table of
+    the ledger database.
+
+    Parameters
+    ----------
+    database : `asimov.database.AsimovSQLiteDatabase`
+       The ledger database.
+    """
+
+    def __init__(self, database):
+        self.db = database
+        self.location = f"{os.path.abspath(database.location)}#archive"
+
+    def events(self):
+        """
+        List the names of the events which have archived versions.
+        """
+        return self.db.archived_event_names()
+
+    def versions(self, name):
+        """
+        Read all of the archived versions of an event.
+
+        See `YAMLArchive.versions`.
+        """
+        return self.db.archived_versions(name)
+
+    def get(self, name, version):
+        """
+        Read a single archived version of an event.
+
+        See `YAMLArchive.get`.
+        """
+        for entry in self.versions(name):
+            if entry["version"] == version:
+                return entry["data"]
+        raise KeyError(f"{name} has no archived version called {version}")
+
+    def add(self, name, data, reason, date=None):
+        """
+        Add a version of an event to the archive.
+
+        See `YAMLArchive.add`.
+        """
+        return self.db.archive_event(
+            name, data, reason, date or datetime.datetime.now()
+        )
+
+
+def copy_archive(source, target):
+    """
+    Copy every archived version of every event between two archives.
+
+    Parameters
+    ----------
+    source, target : `YAMLArchive` or `SQLiteArchive`
+       The archives to copy from and to.
+       Nothing is copied if they are the same archive.
+    """
+    if source.location == target.location:
+        return
+    for name in source.events():
+        for entry in source.versions(name):
+            target.add(name, entry["data"], entry["reason"], entry["date"])
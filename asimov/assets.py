@@ -0,0 +1,125 @@
+"""
+A cache of the assets, such as PSDs, which analyses have produced.
+
+Analyses which depend on another analysis look up the assets it produced,
+which can involve searching its run directory, each time they are built.
+The assets found for each analysis are kept for the rest of the process,
+along with the modification times of the directories which the pipeline
+finds them in, and are only looked up again once one of those directories
+changes.
+The cache is also kept in ``.asimov/_cache_assets.json`` so that it can be
+used by later commands; this can be switched off using the
+``pipelines>asset cache`` setting.
+"""
+
+import json
+import os
+from copy import deepcopy
+
+from asimov import config
+
+
+def _fingerprint(locations):
+    """
+    Find the modification time of each of a list of paths.
+
+    Paths which do not exist are given a time of None, so that creating
+    them changes the fingerprint.
+    """
+    fingerprint = []
+    for location in locations:
+        try:
+            fingerprint.append([location, os.stat(location).st_mtime_ns])
+        except OSError:
+            fingerprint.append([location, None])
+    return fingerprint
+
+
+class AssetCache:
+    """
+    A cache of the assets produced by each analysis, keyed by the
+    pipeline and run directory of the analysis.
+    """
+
+    def __init__(self):
+        # The entries for each project, keyed by the location of their cache file
+        self._projects = {}
+
+    @property
+    def location(self):
+        """
+        The location of the cache file for the current project.
+        """
+        return os.path.abspath(os.path.join(".asimov", "_cache_assets.json"))
+
+    def _persistent(self):
+        return config.getboolean("pipelines", "asset cache")
+
+    def _entries(self):
+        location = self.location
+        if location not in self._projects:
+            entries = {}
+            if self._persistent():
+                try:
+                    with open(location, "r") as cache_file:
+                        entries = json.load(cache_file)
+                except (OSError, ValueError):
+                    # A missing or damaged cache is simply replaced
+                    pass
+            self._projects[location] = entries
+        return self._projects[location]
+
+    def _save(self):
+        if not self._persistent():
+            return
+        try:
+            with open(self.location + "_tmp", "w") as cache_file:
+                json.dump(self._entries(), cache_file)
+            os.replace(self.location + "_tmp", self.location)
+        except (OSError, TypeError, ValueError):
+            # The cache is only an optimisation, so it isn't an error if
+            # it can't be written.
+            pass
+
+    def get(self, production):
+        """
+        Find the assets which an analysis has produced.
+
+        Parameters
+        ----------
+        production : `asimov.event.Production`
+           The analysis.
+
+        Returns
+        -------
+        dict
+           The assets, as returned by the pipeline's ``collect_assets`` method.
+        """
+        pipeline = production.pipeline
+        if not production.rundir:
+            return pipeline.collect_assets()
+
+        key = f"{pipeline.name.lower()}:{production.rundir}"
+        entries = self._entries()
+        # The fingerprint is taken before the assets are collected, so that
+        # any which appear while they are being collected are found next time.
+        fingerprint = _fingerprint(pipeline.asset_locations())
+        entry = entries.get(key)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            return deepcopy(entry["assets"])
+
+        assets = pipeline.collect_assets()
+        entries[key] = {"fingerprint": fingerprint, "assets": assets}
+        if not production.event.read_only:
+            self._save()
+        return deepcopy(assets)
+
+    def clear(self):
+        """
+        Forget the assets of every analysis in the current project.
+        """
+        self._projects[self.location] = {}
+        self._save()
+
+
+asset_cache = AssetCache()
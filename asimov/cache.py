@@ -0,0 +1,110 @@
+"""
+A cache of the parsed contents of the project ledger.
+
+Parsing a large ledger file is much slower than reading a pickled copy
+of the dictionary which it contains, so a copy of the parsed ledger is
+kept next to the ledger file.
+The copy is only used if the size, modification time, and contents of
+the ledger file all match those which it was made from, so any change to
+the ledger file, including one made by hand, causes it to be parsed again.
+
+Where libyaml is available its C loader and dumper are used to read and
+write ledger files.
+"""
+
+import hashlib
+import os
+import pickle
+
+import yaml
+
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CDumper", yaml.Dumper)
+
+
+class LedgerCache:
+    """
+    A cache of the parsed contents of a ledger file.
+
+    Parameters
+    ----------
+    location : str
+       The path to the ledger file.
+       The cache is stored in the same directory, for example the cache for
+       ``.asimov/ledger.yml`` is stored in ``.asimov/_cache_ledger.yml.pickle``.
+    enabled : bool, optional
+       If false the ledger file is always parsed, and no cache is written.
+    """
+
+    def __init__(self, location, enabled=True):
+        self.source = location
+        directory, name = os.path.split(location)
+        self.location = os.path.join(directory, f"_cache_{name}.pickle")
+        self.enabled = enabled
+
+    def _key(self, contents):
+        """
+        Find the key which identifies a version of the ledger file.
+        """
+        status = os.stat(self.source)
+        return (
+            status.st_size,
+            status.st_mtime_ns,
+            hashlib.sha256(contents).hexdigest(),
+        )
+
+    def load(self):
+        """
+        Read the contents of the ledger file, using the cache if it is up to date.
+
+        Returns
+        -------
+        dict
+           The contents of the ledger file.
+        """
+        with open(self.source, "rb") as ledger_file:
+            contents = ledger_file.read()
+        if not self.enabled:
+            return yaml.load(contents, Loader=Loader)
+
+        key = self._key(contents)
+        try:
+            with open(self.location, "rb") as cache_file:
+                cached = pickle.load(cache_file)
+            if cached["key"] == key:
+                return cached["data"]
+        except Exception:
+            # A missing, stale, or damaged cache is simply replaced
+            pass
+
+        data = yaml.load(contents, Loader=Loader)
+        self._write(key, data)
+        return data
+
+    def store(self, data, text):
+        """
+        Update the cache after the ledger file has been written.
+
+        Parameters
+        ----------
+        data : dict
+           The contents of the ledger.
+        text : str
+           The text which was written to the ledger file.
+        """
+        if self.enabled:
+            self._write(self._key(text.encode()), data)
+
+    def _write(self, key, data):
+        try:
+            with open(self.location + "_tmp", "wb") as cache_file:
+                pickle.dump(
+                    {"key": key, "data": data},
+                    cache_file,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(self.location + "_tmp", self.location)
+        except OSError:
+            # The cache is only an optimisation, so a read-only project
+            # directory should not prevent the ledger being used.
+            pass
@@ -0,0 +1,408 @@
+"""
+A feed of the changes which are made to the project ledger.
+
+Each time an event is written to the ledger the fields which have changed
+are appended to the feed, with a sequence number.
+Programs which act on changes to the project, such as the HTML report and
+post-monitor hooks, keep a cursor in the feed, so that each time they run
+they only need to look at the changes made since they last ran.
+
+The feed is stored as one JSON record per line in ``changes.jsonl``,
+next to the ledger.
+Changes which every reader has read are removed from the feed once it
+grows beyond a set size.
+"""
+
+import contextlib
+import json
+import os
+from typing import Any, NamedTuple, Optional
+
+from asimov.lock import FileLock
+from asimov.utils import MISSING
+
+
+class Change(NamedTuple):
+    """
+    A change to a single field of an event or one of its analyses.
+
+    If an entire event or analysis was added or removed ``field`` is None,
+    and ``old`` or ``new`` hold the whole event or analysis.
+    Changes to the project-wide settings, which analyses inherit, have
+    an ``event`` of None.
+    """
+
+    sequence: int
+    event: str
+    production: Optional[str]
+    field: Optional[str]
+    old: Any
+    new: Any
+
+
+def _diff_fields(old, new, path=()):
+    changes = []
+    for key in list(old.keys()) + [key for key in new if key not in old]:
+        before = old.get(key, MISSING)
+        after = new.get(key, MISSING)
+        if before is after:
+            # Values which have been reused from the last version are unchanged
+            continue
+        if isinstance(before, dict) and isinstance(after, dict):
+            changes += _diff_fields(before, after, path + (key,))
+        elif before != after:
+            changes.append(
+                (
+                    "/".join(str(part) for part in path + (key,)),
+                    None if before is MISSING else before,
+                    None if after is MISSING else after,
+                )
+            )
+    return changes
+
+
+def _productions(event):
+    return {
+        name: details or {}
+        for entry in (event.get("productions") or [])
+        for name, details in entry.items()
+    }
+
+
+def diff_event(name, old, new):
+    """
+    Find the changes between two versions of an event.
+
+    Parameters
+    ----------
+    name : str
+       The name of the event.
+    old, new : dict
+       The dictionary representations of the event before and after the
+       change; either can be None if the event was added or removed.
+
+    Returns
+    -------
+    list
+       A list of ``(event, production, field, old, new)`` tuples.
+       Nested fields are given as a path separated by ``/``.
+    """
+    if old is None or new is None:
+        return [(name, None, None, old, new)]
+
+    changes = [
+        (name, None, field, before, after)
+        for field, before, after in _diff_fields(
+            {key: value for key, value in old.items() if key != "productions"},
+            {key: value for key, value in new.items() if key != "productions"},
+        )
+    ]
+    old_productions = _productions(old)
+    new_productions = _productions(new)
+    added = [
+        production
+        for production in new_productions
+        if production not in old_productions
+    ]
+    for production in list(old_productions.keys()) + added:
+        if production not in new_productions:
+            changes.append(
+                (name, production, None, old_productions[production], None)
+            )
+        elif production not in old_productions:
+            changes.append(
+                (name, production, None, None, new_productions[production])
+            )
+        else:
+            changes += [
+                (name, production, field, before, after)
+                for field, before, after in _diff_fields(
+                    old_productions[production], new_productions[production]
+                )
+            ]
+    return changes
+
+
+def diff_project(old, new):
+    """
+    Find the changes between two versions of the project-wide settings.
+
+    Parameters
+    ----------
+    old, new : dict
+       The project data before and after the change, without the events.
+
+    Returns
+    -------
+    list
+       A list of ``(None, None, field, old, new)`` tuples.
+    """
+    return [
+        (None, None, field, before, after)
+        for field, before, after in _diff_fields(
+            {key: value for key, value in old.items() if key != "events"},
+            {key: value for key, value in new.items() if key != "events"},
+        )
+    ]
+
+
+def _decode(line):
+    try:
+        return Change(**json.loads(line))
+    except (ValueError, TypeError):
+        # A record which was only partly written before its writer stopped
+        return None
+
+
+class ChangeFeed:
+    """
+    A sequence-numbered log of changes to the ledger.
+
+    Parameters
+    ----------
+    location : str
+       The path to the feed file.
+       The cursors of the programs which read the feed are kept in a file
+       next to it.
+    compact_size : int, optional
+       The size in bytes above which the feed is compacted after a reader
+       has read it; see `compact`.
+       If it is not given the feed is only compacted when `compact` is
+       called.
+    """
+
+    def __init__(self, location, compact_size=None):
+        self.location = location
+        self.cursor_location = location + ".cursors"
+        self.lock = FileLock(location + ".lock")
+        self.compact_size = compact_size
+
+    def _identity(self):
+        """
+        Identify the current feed file, which is replaced when it is compacted.
+        """
+        try:
+            status = os.stat(self.location)
+        except FileNotFoundError:
+            return None
+        return status.st_ino, status.st_dev
+
+    def _last_sequence(self):
+        """
+        Find the sequence number of the last complete record in the feed.
+        """
+        try:
+            with open(self.location, "rb") as feed:
+                feed.seek(0, os.SEEK_END)
+                end = feed.tell()
+                size = 4096
+                while True:
+                    start = max(0, end - size)
+                    feed.seek(start)
+                    lines = feed.read(end - start).split(b"\n")
+                    # The last element is either empty or an incomplete record
+                    complete = [line for line in lines[:-1] if line]
+                    if start > 0:
+                        # The first line may have been cut by the seek
+                        complete = complete[1:]
+                    for line in reversed(complete):
+                        record = _decode(line)
+                        if record is not None:
+                            return record.sequence
+                    if start == 0:
+                        return 0
+                    size *= 2
+        except FileNotFoundError:
+            return 0
+
+    def append(self, changes):
+        """
+        Add changes to the feed.
+
+        Parameters
+        ----------
+        changes : list
+           A list of ``(event, production, field, old, new)`` tuples.
+
+        Returns
+        -------
+        list of `Change`
+           The changes, with their sequence numbers.
+        """
+        if not changes:
+            return []
+        with self.lock:
+            sequence = self._last_sequence()
+            records = [
+                Change(sequence + number, *change)
+                for number, change in enumerate(changes, start=1)
+            ]
+            text = "".join(
+                json.dumps(record._asdict(), default=str) + "\n" for record in records
+            )
+            with open(self.location, "a+") as feed:
+                if feed.tell() > 0:
+                    feed.seek(feed.tell() - 1)
+                    if feed.read(1) != "\n":
+                        # Don't join the first record onto an incomplete one
+                        text = "\n" + text
+                feed.write(text)
+        return records
+
+    def read(self, sequence=0, offset=0):
+        """
+        Read the changes made after a given point in the feed.
+
+        Parameters
+        ----------
+        sequence : int, optional
+           Only return changes with a higher sequence number than this.
+        offset : int, optional
+           The position in the feed file to start reading from, which
+           avoids reading records which are known to be older.
+
+        Returns
+        -------
+        changes : list of `Change`
+           The changes.
+        offset : int
+           The position in the feed file after the last complete record.
+        """
+        try:
+            with open(self.location, "rb") as feed:
+                feed.seek(0, os.SEEK_END)
+                if offset > feed.tell():
+                    # The feed has been replaced since the cursor was saved
+                    sequence, offset = 0, 0
+                feed.seek(offset)
+                text = feed.read()
+        except FileNotFoundError:
+            return [], 0
+
+        end = text.rfind(b"\n") + 1
+        changes = []
+        for line in text[:end].splitlines():
+            if not line:
+                continue
+            change = _decode(line)
+            if change is not None and change.sequence > sequence:
+                changes.append(change)
+        return changes, offset + end
+
+    def cursors(self):
+        """
+        Find the position of each program which reads the feed.
+
+        Returns
+        -------
+        dict
+           A dictionary of the sequence number and file offset which
+           each reader has reached, keyed by the name of the reader.
+        """
+        try:
+            with open(self.cursor_location, "r") as cursor_file:
+                return json.load(cursor_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def consume(self, reader):
+        """
+        Read the changes which have been made since a reader last read the feed.
+
+        The reader's cursor is only moved past the changes once the
+        context closes without an exception, so if processing the changes
+        fails they will be returned again the next time.
+
+        Parameters
+        ----------
+        reader : str
+           A name which identifies the reader.
+
+        Examples
+        --------
+        >>> with ledger.changes.consume("my dashboard") as changes:
+        ...     for change in changes:
+        ...         print(change.event, change.production, change.field, change.new)
+        """
+        cursor = self.cursors().get(reader, {})
+        identity = self._identity()
+        changes, offset = self.read(
+            cursor.get("sequence", 0), cursor.get("offset", 0)
+        )
+        yield changes
+        if changes:
+            sequence = changes[-1].sequence
+        else:
+            # Allow for the feed having been replaced since the cursor was saved
+            sequence = min(cursor.get("sequence", 0), self._last_sequence())
+        with self.lock:
+            if self._identity() != identity:
+                # The feed was compacted while the changes were being
+                # processed, so the offset no longer points to them
+                offset = 0
+            cursors = self.cursors()
+            cursors[reader] = {"sequence": sequence, "offset": offset}
+            self._write_cursors(cursors)
+        if self.compact_size is not None:
+            try:
+                size = os.path.getsize(self.location)
+            except FileNotFoundError:
+                size = 0
+            if size > self.compact_size:
+                self.compact()
+
+    def _write_cursors(self, cursors):
+        with open(self.cursor_location + "_tmp", "w") as cursor_file:
+            json.dump(cursors, cursor_file)
+        os.replace(self.cursor_location + "_tmp", self.cursor_location)
+
+    def compact(self):
+        """
+        Remove the changes which every reader has already read.
+
+        Only the changes after the oldest reader's cursor are kept, along
+        with the most recent change, so that sequence numbers carry on
+        from it.
+        If no reader has a cursor nothing is removed, since there is no
+        way of knowing which changes will be needed.
+
+        Returns
+        -------
+        int
+           The number of changes which were removed.
+        """
+        with self.lock:
+            cursors = self.cursors()
+            if not cursors:
+                return 0
+            oldest = min(cursor.get("sequence", 0) for cursor in cursors.values())
+            try:
+                with open(self.location, "rb") as feed:
+                    lines = feed.read().split(b"\n")
+            except FileNotFoundError:
+                return 0
+            records = [
+                (line + b"\n", change)
+                for line, change in ((line, _decode(line)) for line in lines if line)
+                if change is not None
+            ]
+            kept = [record for record in records if record[1].sequence > oldest]
+            if not kept and records:
+                kept = records[-1:]
+            removed = len(records) - len(kept)
+            if removed == 0:
+                return 0
+
+            with open(self.location + "_tmp", "wb") as feed:
+                feed.write(b"".join(line for line, _ in kept))
+            os.replace(self.location + "_tmp", self.location)
+
+            # Move each cursor to the same change in the new file
+            for cursor in cursors.values():
+                sequence = cursor.get("sequence", 0)
+                cursor["offset"] = sum(
+                    len(line) for line, change in kept if change.sequence <= sequence
+                )
+            self._write_cursors(cursors)
+        return removed
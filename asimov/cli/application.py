@@ -10,9 +10,9 @@ import yaml
 from asimov import LOGGER_LEVEL, logger
 import asimov.event
 from asimov import current_ledger as ledger
+from asimov.schema import ANALYSIS, EVENT, ValidationError
 from asimov.utils import update
 from copy import deepcopy
-from datetime import datetime
 import sys
 
 if sys.version_info < (3, 10):
@@ -25,6 +25,24 @@ logger = logger.getChild("cli").getChild("apply")
 logger.setLevel(LOGGER_LEVEL)
 
 
+def _valid(document, schema):
+    """
+    Check a document against its schema, reporting any problems.
+    """
+    try:
+        schema.check(document)
+    except ValidationError as error:
+        click.echo(
+            click.style("●", fg="red")
+            + f" Could not apply {error.name} as it is not valid:"
+        )
+        for message in error.errors:
+            click.echo(f"\t{message}")
+        logger.error(str(error))
+        return False
+    return True
+
+
 def apply_page(file, event, ledger=ledger, update_page=False):
     if file[:4] == "http":
         r = requests.get(file)
@@ -46,9 +64,15 @@ def apply_page(file, event, ledger=ledger, update_page=False):
         if document["kind"] == "event":
             logger.info("Found an event")
             document.pop("kind")
+            if not _valid(document, EVENT):
+                continue
             event = asimov.event.Event.from_yaml(yaml.dump(document))
             # Check if the event is in the ledger already
             if event.name in ledger.events and update_page is True:
+                # Add the old version to the archive
+                previous = deepcopy(ledger.events[event.name])
+                ledger.archive.add(event.name, previous, "updated")
+
                 old_event = deepcopy(ledger.events[event.name])
                 for key in ["productions", "working directory", "repository", "ledger"]:
                     old_event.pop(key, None)
@@ -57,19 +81,10 @@ def apply_page(file, event, ledger=ledger, update_page=False):
                     for prod in ledger.events[event.name]["productions"]
                 ]
 
-                # Add the old version to the history
-                if "history" not in ledger.data:
-                    ledger.data["history"] = {}
-                history = ledger.data["history"].get(event.name, {})
-                version = f"version-{len(history)+1}"
-                history[version] = old_event
-                history[version]["date changed"] = datetime.now()
-
-                ledger.data["history"][event.name] = history
-                ledger.save()
-
                 update(ledger.events[event.name], event.meta)
                 ledger.events[event.name]["productions"] = analyses
+                ledger.invalidate(event.name, previous=previous)
+                ledger.save()
                 click.echo(
                     click.style("●", fg="green") + f" Successfully updated {event.name}"
                 )
@@ -95,6 +110,8 @@ def apply_page(file, event, ledger=ledger, update_page=False):
         elif document["kind"] == "analysis":
             logger.info("Found an analysis")
             document.pop("kind")
+            if not _valid(document, ANALYSIS):
+                continue
             if event:
                 event_s = event
             else:
@@ -131,8 +148,7 @@ def apply_page(file, event, ledger=ledger, update_page=False):
         elif document["kind"] == "configuration":
             logger.info("Found configurations")
             document.pop("kind")
-            update(ledger.data, document)
-            ledger.save()
+            ledger.update_project(document)
             click.echo(
                 click.style("●", fg="green")
                 + " Successfully applied a configuration update"
@@ -0,0 +1,142 @@
+"""
+Commands for managing the storage of the project ledger.
+"""
+
+import os
+import sys
+
+import click
+
+from asimov import config, current_ledger, logger, LOGGER_LEVEL
+from asimov.ledger import ShardedYAMLLedger, SQLiteLedger
+
+logger = logger.getChild("cli").getChild("ledger")
+logger.setLevel(LOGGER_LEVEL)
+
+DEFAULT_LOCATIONS = {
+    "yamlfile": os.path.join(".asimov", "ledger.yml"),
+    "sqlite": os.path.join(".asimov", "ledger.db"),
+    "sharded": os.path.join(".asimov", "project.yml"),
+}
+
+ENGINES = {
+    "sqlite": SQLiteLedger,
+    "sharded": ShardedYAMLLedger,
+}
+
+
+@click.group()
+def ledger():
+    """Manage the storage of the project ledger."""
+    pass
+
+
+@click.option(
+    "--location",
+    "location",
+    default=None,
+    help="The location to store the new ledger, defaults to a file in the .asimov directory.",
+)
+@click.argument("engine", type=click.Choice(list(DEFAULT_LOCATIONS.keys())))
+@ledger.command()
+def migrate(engine, location):
+    """
+    Move the project ledger to a different storage ENGINE.
+    """
+    current_engine = config.get("ledger", "engine")
+    if engine == current_engine:
+        click.echo(
+            click.style("●", fg="yellow") + f" The ledger is already stored as {engine}."
+        )
+        return
+
+    if not location:
+        location = DEFAULT_LOCATIONS[engine]
+
+    if current_engine not in DEFAULT_LOCATIONS:
+        click.echo(
+            click.style("●", fg="red")
+            + f" Unable to migrate a {current_engine} ledger to {engine}."
+        )
+        return
+
+    current_ledger.compact()
+    if engine == "yamlfile":
+        current_ledger.to_yaml(location)
+    else:
+        ENGINES[engine].from_ledger(current_ledger, location=location)
+
+    config.set("ledger", "engine", engine)
+    config.set("ledger", "location", location)
+    with open(os.path.join(".asimov", "asimov.conf"), "w") as config_file:
+        config.write(config_file)
+
+    click.echo(
+        click.style("●", fg="green") + f" The ledger has been migrated to {location}"
+    )
+    logger.info(f"Migrated the ledger from {current_engine} to {engine} at {location}")
+
+
+@click.argument("event", default=None, required=False)
+@ledger.command()
+def validate(event):
+    """
+    Check the description of an EVENT, or of every event, and their analyses.
+    """
+    with current_ledger.reading():
+        problems = current_ledger.validate(event)
+    if not problems:
+        click.echo(click.style("●", fg="green") + " The ledger is valid.")
+        return
+    for name, found in problems.items():
+        for analysis, messages in found.items():
+            label = name if analysis is None else f"{name}/{analysis}"
+            click.echo(click.style("●", fg="red") + f" {label}")
+            for message in messages:
+                click.echo(f"\t{message}")
+    sys.exit(1)
+
+
+@ledger.group()
+def archive():
+    """List and restore previous versions of events."""
+    pass
+
+
+@click.argument("event", default=None, required=False)
+@archive.command(name="list")
+def list_versions(event):
+    """
+    List the archived versions of an EVENT, or of every event.
+    """
+    names = [event] if event else current_ledger.archive.events()
+    for name in names:
+        click.secho(f"{name:30}", bold=True)
+        versions = current_ledger.archive.versions(name)
+        if len(versions) == 0:
+            click.echo("\t<NONE>")
+        for entry in versions:
+            click.echo(
+                f"\t- {entry['version']:12} "
+                + click.style(f"{entry['reason']:10}")
+                + f" {entry['date']}"
+            )
+
+
+@click.argument("version")
+@click.argument("event")
+@archive.command()
+def restore(event, version):
+    """
+    Replace an EVENT in the ledger with one of its archived VERSIONs.
+    """
+    try:
+        current_ledger.restore_event(event, version)
+    except KeyError:
+        click.echo(
+            click.style("●", fg="red")
+            + f" {event} does not have an archived version called {version}."
+        )
+        return
+    click.echo(click.style("●", fg="green") + f" Restored {event} from {version}")
+    logger.info(f"Restored {event} from the archived {version}")
@@ -20,6 +20,37 @@ def manage():
     pass
 
 
+@manage.result_callback()
+def compact(*args, **kwargs):
+    """
+    Fold any changes which were journaled while the commands ran back into the ledger.
+    """
+    if ledger:
+        ledger.compact()
+
+
+def _valid_analyses(event_name, names, logger):
+    """
+    Find the analyses which can be built, leaving out any whose
+    description, or whose event's description, is not valid.
+    """
+    problems = ledger.validate(event_name).get(event_name, {})
+    for name in [None] + list(names):
+        if name not in problems:
+            continue
+        label = event_name if name is None else f"{event_name}/{name}"
+        click.echo(
+            click.style("●", fg="red")
+            + f" {label} will not be built as its description is not valid"
+        )
+        for message in problems[name]:
+            click.echo(f"\t{message}")
+            logger.error(f"{label}: {message}")
+    if None in problems:
+        return []
+    return [name for name in names if name not in problems]
+
+
 @click.option(
     "--event",
     "event",
@@ -42,72 +73,84 @@ def build(event, dryrun):
     """
     logger = asimov.logger.getChild("cli").getChild("manage.build")
     logger.setLevel(LOGGER_LEVEL)
-    for event in ledger.get_event(event):
+    with ledger.transaction(rollback=False):
+        # Only the events which have analyses ready to run are built
+        ready = ledger.dependency_graph.ready_analyses(event)
+        for event_name, names in ready.items():
+            names = _valid_analyses(event_name, names, logger)
+            if not names:
+                continue
+            event = ledger.get_event(event_name)[0]
 
-        click.echo(f"● Working on {event.name}")
-        ready_productions = event.get_all_latest()
-        for production in ready_productions:
-            logger.info(f"{event.name}/{production.name}")
-            click.echo(f"\tWorking on production {production.name}")
-            if production.status in {
-                "running",
-                "stuck",
-                "wait",
-                "finished",
-                "uploaded",
-                "cancelled",
-                "stopped",
-            }:
-                if dryrun:
-                    click.echo(
-                        click.style("●", fg="yellow")
-                        + f" {production.name} is marked as {production.status.lower()} so no action will be performed"
-                    )
-                continue  # I think this test might be unused
-            try:
-                ini_loc = production.event.repository.find_prods(
-                    production.name, production.category
-                )[0]
-                if not os.path.exists(ini_loc):
-                    raise KeyError
-            except KeyError:
+            click.echo(f"● Working on {event.name}")
+            ready_productions = [
+                production
+                for production in event.productions
+                if production.name in names
+            ]
+            for production in ready_productions:
+                logger.info(f"{event.name}/{production.name}")
+                click.echo(f"\tWorking on production {production.name}")
+                if production.status in {
+                    "running",
+                    "stuck",
+                    "wait",
+                    "finished",
+                    "uploaded",
+                    "cancelled",
+                    "stopped",
+                }:
+                    if dryrun:
+                        click.echo(
+                            click.style("●", fg="yellow")
+                            + f" {production.name} is marked as {production.status.lower()}"
+                            + " so no action will be performed"
+                        )
+                    continue  # I think this test might be unused
                 try:
+                    ini_loc = production.event.repository.find_prods(
+                        production.name, production.category
+                    )[0]
+                    if not os.path.exists(ini_loc):
+                        raise KeyError
+                except KeyError:
+                    try:
 
-                    # if production.rundir:
-                    #     path = pathlib.Path(production.rundir)
-                    # else:
-                    #     path = pathlib.Path(config.get("general", "rundir_default"))
+                        # if production.rundir:
+                        #     path = pathlib.Path(production.rundir)
+                        # else:
+                        #     path = pathlib.Path(config.get("general", "rundir_default"))
 
-                    if dryrun:
-                        print(f"Will create {production.name}.ini")
-                    else:
-                        # path.mkdir(parents=True, exist_ok=True)
-                        config_loc = os.path.join(f"{production.name}.ini")
-                        production.pipeline.before_config()
-                        production.make_config(config_loc, dryrun=dryrun)
-                        click.echo(f"Production config {production.name} created.")
-                        try:
-                            event.repository.add_file(
-                                config_loc,
-                                os.path.join(
-                                    f"{production.category}", f"{production.name}.ini"
-                                ),
-                            )
-                            logger.info(
-                                "Configuration committed to event repository.",
-                            )
-                            ledger.update_event(event)
+                        if dryrun:
+                            print(f"Will create {production.name}.ini")
+                        else:
+                            # path.mkdir(parents=True, exist_ok=True)
+                            config_loc = os.path.join(f"{production.name}.ini")
+                            production.pipeline.before_config()
+                            production.make_config(config_loc, dryrun=dryrun)
+                            click.echo(f"Production config {production.name} created.")
+                            try:
+                                event.repository.add_file(
+                                    config_loc,
+                                    os.path.join(
+                                        f"{production.category}", f"{production.name}.ini"
+                                    ),
+                                )
+                                logger.info(
+                                    "Configuration committed to event repository.",
+                                )
+                                ledger.update_event(event)
 
-                        except Exception as e:
-                            logger.error(
-                                f"Configuration could not be committed to repository.\n{e}",
-                            )
-                            logger.exception(e)
-                        os.remove(config_loc)
+                            except Exception as e:
+                                logger.error(
+                                    f"Configuration could not be committed to repository.\n{e}",
+                                )
+                                logger.exception(e)
+                            os.remove(config_loc)
 
-                except DescriptionException as e:
-                    logger.error("Run configuration failed")
-                    logger.exception(e)
+                    except DescriptionException as e:
+                        logger.error("Run configuration failed")
+                        logger.exception(e)
 
 
 @click.option(
@@ -138,87 +181,100 @@ def submit(event, update, dryrun):
     """
     logger = asimov.logger.getChild("cli").getChild("manage.submit")
     logger.setLevel(LOGGER_LEVEL)
-    for event in ledger.get_event(event):
-        ready_productions = event.get_all_latest()
-        for production in ready_productions:
-            logger.info(f"{event.name}/{production.name}")
-            if production.status.lower() in {
-                "running",
-                "stuck",
-                "wait",
-                "processing",
-                "uploaded",
-                "finished",
-                "manual",
-                "cancelled",
-                "stopped",
-            }:
-                if dryrun:
-                    click.echo(
-                        click.style("●", fg="yellow")
-                        + f" {production.name} is marked as {production.status.lower()} so no action will be performed"
-                    )
+    # Jobs which have been submitted to the cluster cannot be recalled,
+    # so the ledger is written even if submission fails part way through.
+    with ledger.transaction(rollback=False):
+        ready = ledger.dependency_graph.ready_analyses(event)
+        for event_name, names in ready.items():
+            names = _valid_analyses(event_name, names, logger)
+            if not names:
                 continue
-            if production.status.lower() == "restart":
-                pipe = production.pipeline
-                try:
-                    pipe.clean(dryrun=dryrun)
-                except PipelineException as e:
-                    logger.error("The pipeline failed to clean up after itself.")
-                    logger.exception(e)
-                pipe.submit_dag(dryrun=dryrun)
-                click.echo(
-                    click.style("●", fg="green")
-                    + f" Resubmitted {production.event.name}/{production.name}"
-                )
-                production.status = "running"
-            else:
-                pipe = production.pipeline
-                try:
-                    pipe.build_dag(dryrun=dryrun)
-                except PipelineException as e:
-                    logger.error(
-                        "The pipeline failed to build a DAG file.",
-                    )
-                    logger.exception(e)
-                    click.echo(
-                        click.style("●", fg="red")
-                        + f" Unable to submit {production.name}"
-                    )
-                except ValueError as e:
-                    print("ERROR", e)
-                    logger.info("Unable to submit an unbuilt production")
+            event = ledger.get_event(event_name)[0]
+            ready_productions = [
+                production
+                for production in event.productions
+                if production.name in names
+            ]
+            for production in ready_productions:
+                logger.info(f"{event.name}/{production.name}")
+                if production.status.lower() in {
+                    "running",
+                    "stuck",
+                    "wait",
+                    "processing",
+                    "uploaded",
+                    "finished",
+                    "manual",
+                    "cancelled",
+                    "stopped",
+                }:
+                    if dryrun:
+                        click.echo(
+                            click.style("●", fg="yellow")
+                            + f" {production.name} is marked as {production.status.lower()}"
+                            + " so no action will be performed"
+                        )
+                    continue
+                if production.status.lower() == "restart":
+                    pipe = production.pipeline
+                    try:
+                        pipe.clean(dryrun=dryrun)
+                    except PipelineException as e:
+                        logger.error("The pipeline failed to clean up after itself.")
+                        logger.exception(e)
+                    pipe.submit_dag(dryrun=dryrun)
                     click.echo(
-                        click.style("●", fg="red")
-                        + f" Unable to submit {production.name} as it hasn't been built yet."
+                        click.style("●", fg="green")
+                        + f" Resubmitted {production.event.name}/{production.name}"
                     )
-                    click.echo("Try running `asimov manage build` first.")
-                try:
-                    pipe.submit_dag(dryrun=dryrun)
-                    if not dryrun:
+                    production.status = "running"
+                else:
+                    pipe = production.pipeline
+                    try:
+                        pipe.build_dag(dryrun=dryrun)
+                    except PipelineException as e:
+                        logger.error(
+                            "The pipeline failed to build a DAG file.",
+                        )
+                        logger.exception(e)
+                        click.echo(
+                            click.style("●", fg="red")
+                            + f" Unable to submit {production.name}"
+                        )
+                    except ValueError as e:
+                        print("ERROR", e)
+                        logger.info("Unable to submit an unbuilt production")
                         click.echo(
-                            click.style("●", fg="green")
-                            + f" Submitted {production.event.name}/{production.name}"
+                            click.style("●", fg="red")
+                            + f" Unable to submit {production.name} as it hasn't been built yet."
                         )
-                        production.status = "running"
+                        click.echo("Try running `asimov manage build` first.")
+                    try:
+                        pipe.submit_dag(dryrun=dryrun)
+                        if not dryrun:
+                            click.echo(
+                                click.style("●", fg="green")
+                                + f" Submitted {production.event.name}/{production.name}"
+                            )
+                            production.status = "running"
 
-                except PipelineException as e:
-                    production.status = "stuck"
-                    click.echo(
-                        click.style("●", fg="red")
-                        + f" Unable to submit {production.name}"
-                    )
-                    logger.exception(e)
-                    ledger.update_event(event)
-                    logger.error(
-                        f"The pipeline failed to submit the DAG file to the cluster. {e}",
-                    )
-                if not dryrun:
-                    # Refresh the job list
-                    job_list = condor.CondorJobList()
-                    job_list.refresh()
-                    # Update the ledger
-                    ledger.update_event(event)
+                    except PipelineException as e:
+                        production.status = "stuck"
+                        click.echo(
+                            click.style("●", fg="red")
+                            + f" Unable to submit {production.name}"
+                        )
+                        logger.exception(e)
+                        ledger.update_event(event)
+                        logger.error(
+                            f"The pipeline failed to submit the DAG file to the cluster. {e}",
+                        )
+                    if not dryrun:
+                        # Refresh the job list
+                        job_list = condor.CondorJobList.for_ledger(ledger)
+                        job_list.refresh()
+                        # Update the ledger
+                        ledger.update_event(event)
 
 
 @click.option(
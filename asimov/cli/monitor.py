@@ -1,13 +1,14 @@
 import shutil
 import configparser
+import inspect
 import os
 import sys
 import click
-from copy import deepcopy
 
-from asimov import condor, config, logger, LOGGER_LEVEL
+from asimov import condor, config, joblog, logger, LOGGER_LEVEL
 from asimov import current_ledger as ledger
 from asimov.cli import ACTIVE_STATES, manage, report
+from asimov.summary import ProductionSummary, latest
 
 logger = logger.getChild("cli").getChild("monitor")
 logger.setLevel(LOGGER_LEVEL)
@@ -73,11 +74,119 @@ def start(dry_run):
 def stop(dry_run):
     """Set up a cron job on condor to monitor the project."""
     cluster = ledger.data["cronjob"]
-    condor.delete_job(cluster)
+    if not condor.delete_job(cluster):
+        click.secho(
+            f"  \t  ● Could not find the asimov cronjob {cluster} on any scheduler",
+            fg="yellow",
+        )
+        logger.warning(f"Could not find the asimov cronjob {cluster} to stop it")
+        return
     click.secho("  \t  ● Asimov has been stopped", fg="red")
     logger.info(f"Stopped asimov cronjob {cluster}")
 
 
+def _progress(tracker, production):
+    """
+    Read the progress of an analysis from its event logs, if they can be used.
+
+    Parameters
+    ----------
+    tracker : `asimov.joblog.JobLogTracker`
+       The tracker, or None if event logs are not being used.
+    production : `asimov.event.Production`
+       The analysis.
+
+    Returns
+    -------
+    `asimov.joblog.JobProgress`
+       The progress of the analysis, or None if it is not known.
+    """
+    if tracker is None or production.status.lower() not in {"running", "stuck"}:
+        return None
+    if not production.rundir:
+        return None
+    return tracker.update(
+        f"{production.event.name}/{production.name}",
+        production.rundir,
+        production.job_id,
+    )
+
+
+def _completed(pipe, progress):
+    """
+    Check whether an analysis has finished.
+
+    An analysis whose DAG is recorded as having failed in its event log
+    has not finished; otherwise the pipeline checks for its results.
+    """
+    if progress is not None and progress.state == joblog.COMPLETED:
+        if not progress.succeeded:
+            return False
+    return pipe.detect_completion()
+
+
+def _show_waiting(summaries):
+    """
+    List the analyses for an event which are waiting on other analyses.
+
+    Parameters
+    ----------
+    summaries : list of `asimov.summary.ProductionSummary`
+       The analyses for the event.
+    """
+    ready = {summary.name for summary in latest(summaries)}
+    others = [
+        summary
+        for summary in summaries
+        if summary.name not in ready and summary.status not in {"finished", "uploaded"}
+    ]
+    if len(others) > 0:
+        click.echo(
+            "The event also has these analyses which are waiting on other analyses to complete:"
+        )
+        for summary in others:
+            needs = ", ".join(summary.dependencies)
+            click.echo(f"\t{summary.name} which needs {needs}")
+
+
+def _run_postmonitor_hooks(ledger):
+    """
+    Run the post-monitor hooks which are listed in the ledger.
+
+    Hooks whose ``run`` method accepts a ``changes`` argument are given
+    the changes which have been made to the ledger since they last ran,
+    from the ledger's change feed, or None if the feed is switched off.
+    A hook which fails is logged, and does not stop the others from running.
+
+    Parameters
+    ----------
+    ledger : `asimov.ledger.Ledger`
+       The project ledger.
+    """
+    if "postmonitor" not in ledger.data.get("hooks", {}):
+        return
+    names = list(ledger.data["hooks"]["postmonitor"].keys())
+    for hook in entry_points(group="asimov.hooks.postmonitor"):
+        if hook.name not in names:
+            continue
+        try:
+            instance = hook.load()(ledger)
+            parameters = inspect.signature(instance.run).parameters
+            if "changes" in parameters and ledger.changes is None:
+                instance.run(changes=None)
+            elif "changes" in parameters:
+                # Hooks which accept the change feed are only
+                # given the changes made since they last ran
+                with ledger.changes.consume(
+                    f"hooks.postmonitor.{hook.name}"
+                ) as changes:
+                    instance.run(changes=changes)
+            else:
+                instance.run()
+        except Exception:
+            logger.exception(f"The {hook.name} post-monitor hook failed")
+
+
 @click.argument("event", default=None, required=False)
 @click.option(
     "--update",
@@ -110,7 +219,7 @@ def monitor(ctx, event, update, dry_run, chain):
 
     try:
         # First pull the condor job listing
-        job_list = condor.CondorJobList()
+        job_list = condor.CondorJobList.for_ledger(ledger)
     except condor.htcondor.HTCondorLocateError:
         click.echo(click.style("Could not find the condor scheduler", bold=True))
         click.echo(
@@ -120,250 +229,261 @@ def monitor(ctx, event, update, dry_run, chain):
         )
         sys.exit()
 
-    for event in sorted(ledger.get_event(event), key=lambda e: e.name):
-        stuck = 0
-        running = 0
-        finish = 0
-        click.secho(f"{event.name}", bold=True)
-        on_deck = [
-            production
-            for production in event.productions
-            if production.status.lower() in ACTIVE_STATES
-        ]
-        for production in on_deck:
-
-            logger.debug(f"Available analyses: {event}/{production.name}")
-
-            click.echo(
-                "\t- "
-                + click.style(f"{production.name}", bold=True)
-                + click.style(f"[{production.pipeline}]", fg="green")
-            )
-
-            # Jobs marked as ready can just be ignored as they've not been stood-up
-            if production.status.lower() == "ready":
-                click.secho(f"  \t  ● {production.status.lower()}", fg="green")
-                logger.debug(f"Ready production: {event}/{production.name}")
+    if config.getboolean("condor", "event_logs", fallback=False) and not dry_run:
+        tracker = joblog.JobLogTracker()
+    else:
+        tracker = None
+
+    # Collect the changes from the whole sweep into a single ledger write.
+    # These record jobs which have been started or stopped on the cluster,
+    # so they are written even if the sweep fails part way through.
+    with ledger.transaction(rollback=False):
+        summaries = ledger.get_summaries(event)
+        for event in sorted(summaries):
+            stuck = 0
+            running = 0
+            finish = 0
+            click.secho(f"{event}", bold=True)
+            if not any(
+                summary.status in ACTIVE_STATES for summary in summaries[event]
+            ):
+                # Nothing needs to be checked on the cluster, so the event
+                # doesn't need to be built.
+                _show_waiting(summaries[event])
                 continue
-
-            # Deal with jobs which need to be stopped first
-            if production.status.lower() == "stop":
-                pipe = production.pipeline
-                logger.debug(f"Stop production: {event}/{production.name}")
-                if not dry_run:
-                    pipe.eject_job()
-                    production.status = "stopped"
-                    click.secho("  \tStopped", fg="red")
-                else:
-                    click.echo("\t\t{production.name} --> stopped")
-                continue
-
-            # Get the condor jobs
-            try:
-                if "job id" in production.meta:
+            event = ledger.get_event(event)[0]
+            on_deck = [
+                production
+                for production in event.productions
+                if production.status.lower() in ACTIVE_STATES
+            ]
+            for production in on_deck:
+
+                logger.debug(f"Available analyses: {event}/{production.name}")
+
+                click.echo(
+                    "\t- "
+                    + click.style(f"{production.name}", bold=True)
+                    + click.style(f"[{production.pipeline}]", fg="green")
+                )
+
+                # Jobs marked as ready can just be ignored as they've not been stood-up
+                if production.status.lower() == "ready":
+                    click.secho(f"  \t  ● {production.status.lower()}", fg="green")
+                    logger.debug(f"Ready production: {event}/{production.name}")
+                    continue
+
+                # Deal with jobs which need to be stopped first
+                if production.status.lower() == "stop":
+                    pipe = production.pipeline
+                    logger.debug(f"Stop production: {event}/{production.name}")
                     if not dry_run:
-                        if production.meta["job id"] in job_list.jobs:
-                            job = job_list.jobs[production.meta["job id"]]
+                        pipe.eject_job()
+                        production.status = "stopped"
+                        click.secho("  \tStopped", fg="red")
+                    else:
+                        click.echo("\t\t{production.name} --> stopped")
+                    continue
+
+                # Get the condor jobs
+                progress = _progress(tracker, production)
+                try:
+                    if "job id" in production.meta:
+                        if not dry_run:
+                            if progress is not None and progress.state not in {
+                                joblog.COMPLETED,
+                                joblog.REMOVED,
+                            }:
+                                job = progress
+                            elif progress is not None:
+                                # The DAG has left the queue
+                                raise ValueError
+                            elif production.meta["job id"] in job_list.jobs:
+                                job = job_list.jobs[production.meta["job id"]]
+                            else:
+                                job = None
                         else:
-                            job = None
+                            logger.debug(
+                                f"Running analysis: {event}/{production.name}, cluster {production.meta['job id']}"
+                            )
+                            click.echo("\t\tRunning under condor")
                     else:
-                        logger.debug(
-                            f"Running analysis: {event}/{production.name}, cluster {production.meta['job id']}"
-                        )
-                        click.echo("\t\tRunning under condor")
-                else:
-                    raise ValueError  # Pass to the exception handler
+                        raise ValueError  # Pass to the exception handler
 
-                if not dry_run:
+                    if not dry_run:
 
-                    if (
-                        job.status.lower() == "running"
-                        and production.status == "processing"
-                    ):
-                        click.echo(
-                            "  \t  "
-                            + click.style("●", "green")
-                            + f" Postprocessing for {production.name} is running"
-                            + f" (condor id: {production.job_id})"
-                        )
+                        if (
+                            job.status.lower() == "running"
+                            and production.status == "processing"
+                        ):
+                            click.echo(
+                                "  \t  "
+                                + click.style("●", "green")
+                                + f" Postprocessing for {production.name} is running"
+                                + f" (condor id: {production.job_id})"
+                            )
 
-                        production.meta["postprocessing"]["status"] = "running"
+                            production.meta["postprocessing"]["status"] = "running"
 
-                    elif job.status.lower() == "idle":
-                        click.echo(
-                            "  \t  "
-                            + click.style("●", "green")
-                            + f" {production.name} is in the queue (condor id: {production.job_id})"
-                        )
+                        elif job.status.lower() == "idle":
+                            click.echo(
+                                "  \t  "
+                                + click.style("●", "green")
+                                + f" {production.name} is in the queue (condor id: {production.job_id})"
+                            )
 
-                    elif job.status.lower() == "running":
-                        click.echo(
-                            "  \t  "
-                            + click.style("●", "green")
-                            + f" {production.name} is running (condor id: {production.job_id})"
-                        )
-                        if "profiling" not in production.meta:
-                            production.meta["profiling"] = {}
-                        production.status = "running"
+                        elif job.status.lower() == "running":
+                            click.echo(
+                                "  \t  "
+                                + click.style("●", "green")
+                                + f" {production.name} is running (condor id: {production.job_id})"
+                            )
+                            if "profiling" not in production.meta:
+                                production.meta["profiling"] = {}
+                            production.status = "running"
 
-                    elif job.status.lower() == "completed":
-                        pipe.after_completion()
-                        click.echo(
-                            "  \t  "
-                            + click.style("●", "green")
-                            + f" {production.name} has finished and post-processing has been started"
-                        )
-                        job_list.refresh()
+                        elif job.status.lower() == "completed":
+                            pipe.after_completion()
+                            click.echo(
+                                "  \t  "
+                                + click.style("●", "green")
+                                + f" {production.name} has finished and post-processing has been started"
+                            )
+                            job_list.refresh()
 
-                    elif job.status.lower() == "held":
-                        click.echo(
-                            "  \t  "
-                            + click.style("●", "yellow")
-                            + f" {production.name} is held on the scheduler"
-                            + f" (condor id: {production.job_id})"
-                        )
-                        production.status = "stuck"
-                        stuck += 1
-                    else:
-                        running += 1
+                        elif job.status.lower() == "held":
+                            click.echo(
+                                "  \t  "
+                                + click.style("●", "yellow")
+                                + f" {production.name} is held on the scheduler"
+                                + f" (condor id: {production.job_id})"
+                            )
+                            production.status = "stuck"
+                            stuck += 1
+                        else:
+                            running += 1
 
-            except (ValueError, AttributeError):
-                if production.pipeline:
+                except (ValueError, AttributeError):
+                    if production.pipeline:
 
-                    pipe = production.pipeline
+                        pipe = production.pipeline
 
-                    if production.status.lower() == "stop":
-                        pipe.eject_job()
-                        production.status = "stopped"
-                        click.echo(
-                            "  \t  "
-                            + click.style("●", "red")
-                            + f" {production.name} has been stopped"
-                        )
-                        job_list.refresh()
-                    elif production.status.lower() == "finished":
-                        pipe.after_completion()
-                        click.echo(
-                            "  \t  "
-                            + click.style("●", "green")
-                            + f" {production.name} has finished and post-processing has been started"
-                        )
-                        job_list.refresh()
-                    elif production.status.lower() == "processing":
-                        # Need to check the upload has completed
-                        if pipe.detect_completion_processing():
-                            try:
-                                pipe.after_processing()
+                        if production.status.lower() == "stop":
+                            pipe.eject_job()
+                            production.status = "stopped"
+                            click.echo(
+                                "  \t  "
+                                + click.style("●", "red")
+                                + f" {production.name} has been stopped"
+                            )
+                            job_list.refresh()
+                        elif production.status.lower() == "finished":
+                            pipe.after_completion()
+                            click.echo(
+                                "  \t  "
+                                + click.style("●", "green")
+                                + f" {production.name} has finished and post-processing has been started"
+                            )
+                            job_list.refresh()
+                        elif production.status.lower() == "processing":
+                            # Need to check the upload has completed
+                            if pipe.detect_completion_processing():
+                                try:
+                                    pipe.after_processing()
+                                    click.echo(
+                                        "  \t  "
+                                        + click.style("●", "green")
+                                        + f" {production.name} has been finalised and stored"
+                                    )
+                                except ValueError as e:
+                                    click.echo(e)
+                            else:
                                 click.echo(
                                     "  \t  "
                                     + click.style("●", "green")
-                                    + f" {production.name} has been finalised and stored"
+                                    + f" {production.name} has finished and post-processing"
+                                    + f" is stuck ({production.job_id})"
                                 )
-                            except ValueError as e:
-                                click.echo(e)
-                        else:
+                                production.meta["postprocessing"]["status"] = "stuck"
+                        elif (
+                            _completed(pipe, progress)
+                            and production.status.lower() == "processing"
+                        ):
                             click.echo(
                                 "  \t  "
                                 + click.style("●", "green")
-                                + f" {production.name} has finished and post-processing"
-                                + f" is stuck ({production.job_id})"
-                            )
-                            production.meta["postprocessing"]["status"] = "stuck"
-                    elif (
-                        pipe.detect_completion()
-                        and production.status.lower() == "processing"
-                    ):
-                        click.echo(
-                            "  \t  "
-                            + click.style("●", "green")
-                            + f" {production.name} has finished and post-processing is running"
-                        )
-                    elif (
-                        pipe.detect_completion()
-                        and production.status.lower() == "running"
-                    ):
-                        # The job has been completed, collect its assets
-                        if "profiling" not in production.meta:
-                            production.meta["profiling"] = {}
-                        try:
-                            config.get("condor", "scheduler")
-                            production.meta["profiling"] = condor.collect_history(
-                                production.job_id
+                                + f" {production.name} has finished and post-processing is running"
                             )
-                            production.meta["job id"] = None
-                        except (
-                            configparser.NoOptionError,
-                            configparser.NoSectionError,
+                        elif (
+                            _completed(pipe, progress)
+                            and production.status.lower() == "running"
                         ):
-                            logger.warning(
-                                "Could not collect condor profiling data as"
-                                " no scheduler was specified in the"
-                                " config file."
+                            # The job has been completed, collect its assets
+                            if "profiling" not in production.meta:
+                                production.meta["profiling"] = {}
+                            try:
+                                config.get("condor", "scheduler")
+                                production.meta["profiling"] = condor.collect_history(
+                                    production.job_id
+                                )
+                                production.meta["job id"] = None
+                            except (
+                                configparser.NoOptionError,
+                                configparser.NoSectionError,
+                            ):
+                                logger.warning(
+                                    "Could not collect condor profiling data as"
+                                    " no scheduler was specified in the"
+                                    " config file."
+                                )
+                            except ValueError as e:
+                                logger.error("Could not collect condor profiling data.")
+                                logger.exception(e)
+                                pass
+
+                            finish += 1
+                            production.status = "finished"
+                            pipe.after_completion()
+                            click.secho(
+                                f"  \t  ● {production.name} - Completion detected",
+                                fg="green",
                             )
-                        except ValueError as e:
-                            logger.error("Could not collect condor profiling data.")
-                            logger.exception(e)
-                            pass
-
-                        finish += 1
-                        production.status = "finished"
-                        pipe.after_completion()
-                        click.secho(
-                            f"  \t  ● {production.name} - Completion detected",
-                            fg="green",
-                        )
-                        job_list.refresh()
-                    else:
-                        # It looks like the job has been evicted from the cluster
+                            job_list.refresh()
+                        else:
+                            # It looks like the job has been evicted from the cluster
+                            click.echo(
+                                "  \t  "
+                                + click.style("●", "yellow")
+                                + f" {production.name} is stuck; attempting a rescue"
+                            )
+                            try:
+                                pipe.resurrect()
+                            except Exception:  # Sorry, but there are many ways the above command can fail
+                                production.status = "stuck"
+                                click.echo(
+                                    "  \t  "
+                                    + click.style("●", "red")
+                                    + f" {production.name} is stuck; automatic rescue was not possible"
+                                )
+
+                    if production.status == "stuck":
                         click.echo(
                             "  \t  "
                             + click.style("●", "yellow")
-                            + f" {production.name} is stuck; attempting a rescue"
+                            + f" {production.name} is stuck"
                         )
-                        try:
-                            pipe.resurrect()
-                        except Exception:  # Sorry, but there are many ways the above command can fail
-                            production.status = "stuck"
-                            click.echo(
-                                "  \t  "
-                                + click.style("●", "red")
-                                + f" {production.name} is stuck; automatic rescue was not possible"
-                            )
 
-                if production.status == "stuck":
-                    click.echo(
-                        "  \t  "
-                        + click.style("●", "yellow")
-                        + f" {production.name} is stuck"
-                    )
-
-            ledger.update_event(event)
-
-        all_productions = set(event.productions)
-        complete = {
-            production
-            for production in event.productions
-            if production.status in {"finished", "uploaded"}
-        }
-        others = all_productions - set(event.get_all_latest()) - complete
-        if len(others) > 0:
-            click.echo(
-                "The event also has these analyses which are waiting on other analyses to complete:"
+                ledger.update_event(event)
+
+            _show_waiting(
+                [
+                    ProductionSummary.from_production(production)
+                    for production in event.productions
+                ]
             )
-            for production in others:
-                needs = ", ".join(production.meta["needs"])
-                click.echo(f"\t{production.name} which needs {needs}")
 
         # Post-monitor hooks
-    if "hooks" in ledger.data:
-        if "postmonitor" in ledger.data["hooks"]:
-            discovered_hooks = entry_points(group="asimov.hooks.postmonitor")
-            for hook in discovered_hooks:
-                if hook.name in list(ledger.data["hooks"]["postmonitor"].keys()):
-                    try:
-                        hook.load()(deepcopy(ledger)).run()
-                    except Exception:
-                        pass
+    _run_postmonitor_hooks(ledger)
 
     if chain:
         ctx.invoke(report.html)
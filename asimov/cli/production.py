@@ -1,4 +1,3 @@
-from copy import copy
 
 import click
 import yaml
@@ -100,9 +99,8 @@ def create(event, pipeline, family, comment, needs, template, status, approximan
         raise NotImplementedError(
             "The Gitlab interface has been removed from this version." ""
         )
-    elif config.get("ledger", "engine") == "yamlfile":
-        ledger.events[event.name] = event.to_dict()
-        ledger.save()
+    else:
+        ledger.update_event(event)
 
 
 @click.option(
@@ -150,15 +148,16 @@ def show(event, production):
     """
     Show the entire metadata for a given production.
     """
-    event = ledger.get_event(event=event)[0]
-    production = [
-        production_o
-        for production_o in event.productions
-        if production_o.name == production
-    ][0]
-
-    meta = copy(production.meta)
-    meta.pop("ledger")
+    with ledger.reading():
+        event = ledger.get_event(event=event)[0]
+        production = [
+            production_o
+            for production_o in event.productions
+            if production_o.name == production
+        ][0]
+
+        meta = production.meta.to_dict()
+    meta.pop("ledger", None)
     output = yaml.dump(meta, default_flow_style=False)
     click.echo_via_pager(output)
 
@@ -3,6 +3,7 @@ Reporting functions
 """
 from datetime import datetime
 
+import json
 import os
 
 import click
@@ -14,6 +15,7 @@ import otter
 import otter.bootstrap as bt
 
 from asimov import config, current_ledger
+from asimov.summary import latest
 
 tz = pytz.timezone("Europe/London")
 
@@ -34,8 +36,16 @@ def html(event, webdir):
     Return the ledger for a given event.
     If no event is specified then the entire production ledger is returned.
     """
+    with current_ledger.reading():
+        _html(event, webdir)
 
-    events = current_ledger.get_event(event)
+
+def _html(event, webdir):
+    if event is None:
+        # Only the events which have changed since the last report need to be built
+        events = None
+    else:
+        events = current_ledger.get_event(event)
 
     if not webdir:
         webdir = config.get("general", "webroot")
@@ -117,12 +127,16 @@ def html(event, webdir):
         )
         report + navbar
 
-    events = sorted(events, key=lambda a: a.name)
+    if events is None:
+        event_cards = _event_cards()
+    else:
+        event_cards = {event.name: event.html() for event in events}
+    names = sorted(event_cards)
     cards = "<div class='container-fluid'><div class='row'><div class='col-12 col-md-3 col-xl-2  asimov-sidebar'>"
 
     toc = """<nav><h6>Subjects</h6><ul class="list-unstyled">"""
-    for event in events:
-        toc += f"""<li><a href="#card-{event.name}">{event.name}</a></li>"""
+    for name in names:
+        toc += f"""<li><a href="#card-{name}">{name}</a></li>"""
 
     toc += "</ul></nav>"
 
@@ -130,10 +144,10 @@ def html(event, webdir):
     cards += """</div><div class='events col-md-9 col-xl-10'
     data-isotope='{ "itemSelector": ".production-item", "layoutMode": "fitRows" }'>"""
 
-    for event in events:
+    for name in names:
         card = ""
         # This is a quick test to try and improve readability
-        card += event.html()
+        card += event_cards[name]
 
         # card += """<p class="card-text">Card text</p>""" #
         card += """
@@ -150,6 +164,53 @@ def html(event, webdir):
         report + time
 
 
+def _event_cards():
+    """
+    Produce the HTML card for every event in the project.
+
+    The cards from the last report are kept in the .asimov directory, and
+    only the events which appear in the ledger's change feed since then
+    are rendered again.
+    """
+    feed = current_ledger.changes
+    cache_location = os.path.join(".asimov", "_cache_report.json")
+    if feed is None:
+        # Cards kept from before the feed was switched off would miss
+        # the changes made since, if it were switched on again
+        if os.path.exists(cache_location):
+            os.remove(cache_location)
+        return {event.name: event.html() for event in current_ledger.get_event()}
+
+    try:
+        with open(cache_location, "r") as cache_file:
+            cached = json.load(cache_file)
+    except (FileNotFoundError, ValueError):
+        cached = {}
+
+    event_cards = {}
+    try:
+        with feed.consume("report html") as changes:
+            changed = {change.event for change in changes}
+            # Every event inherits the project-wide settings
+            everything = None in changed
+            for name in sorted(current_ledger.events):
+                if everything or name in changed or name not in cached:
+                    event_cards[name] = current_ledger.get_event(name)[0].html()
+                else:
+                    event_cards[name] = cached[name]
+
+            with open(cache_location + "_tmp", "w") as cache_file:
+                json.dump(event_cards, cache_file)
+            os.replace(cache_location + "_tmp", cache_location)
+    except OSError:
+        # The cache can't be kept if the project is on a read-only
+        # filesystem, but the report itself can still be produced.
+        if len(event_cards) < len(current_ledger.events):
+            raise
+
+    return event_cards
+
+
 @click.argument("event", default=None, required=False)
 @report.command()
 def status(event):
@@ -162,25 +223,32 @@ def status(event):
        The name of the event.
 
     """
-    for event in sorted(current_ledger.get_event(event), key=lambda e: e.name):
-        click.secho(f"{event.name:30}", bold=True)
-        if len(event.productions) > 0:
+    with current_ledger.reading():
+        _status(event)
+
+
+def _status(event):
+    summaries = current_ledger.get_summaries(event)
+    for name in sorted(summaries):
+        productions = summaries[name]
+        click.secho(f"{name:30}", bold=True)
+        if len(productions) > 0:
             click.secho("\tAnalyses", bold=True)
-            if len(event.productions) == 0:
+            if len(productions) == 0:
                 click.echo("\t<NONE>")
-            for production in event.productions:
+            for production in productions:
                 click.echo(
                     f"\t- {production.name} "
                     + click.style(f"{production.pipeline}")
                     + " "
                     + click.style(f"{production.status}")
                 )
-        if len(event.get_all_latest()) > 0:
+        waiting = latest(productions)
+        if len(waiting) > 0:
             click.secho(
                 "\tAnalyses waiting: ",
                 bold=True,
             )
-            waiting = event.get_all_latest()
             for awaiting in waiting:
                 click.echo(
                     f"{awaiting.name} ",
@@ -199,8 +267,9 @@ def ledger(event, yaml_f):
     If no event is specified then the entire production ledger is returned.
     """
     total = []
-    for event in current_ledger.get_event(event):
-        total.append(yaml.safe_load(event.to_yaml()))
+    with current_ledger.reading():
+        for event in current_ledger.get_event(event):
+            total.append(yaml.safe_load(event.to_yaml()))
 
     click.echo(yaml.dump(total))
 
@@ -70,21 +70,19 @@ def status(event, production):
     """
     Show the review status of an event.
     """
-    for event in current_ledger.get_event(event):
-        click.secho(event.name, bold=True)
+    for name, summaries in current_ledger.get_summaries(event).items():
+        click.secho(name, bold=True)
         if production:
-            productions = [
-                prod for prod in event.productions if prod.name == production
-            ]
-        else:
-            productions = event.productions
-
-        for production in productions:
-            click.secho(f"\t{production.name}", bold=True)
-            if production.review:
-                click.echo(f"\t\t {production.review.status.lower()}")
+            summaries = [summary for summary in summaries if summary.name == production]
+
+        for summary in summaries:
+            click.secho(f"\t{summary.name}", bold=True)
+            if summary.review:
+                click.echo(f"\t\t {summary.review.lower()}")
             else:
-                click.secho("\t\tNo review information exists for this production.")
+                click.secho(
+                    "\t\tNo review information exists for this production."
+                )
 
 
 @click.argument("event", default=None, required=False)
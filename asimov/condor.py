@@ -6,8 +6,14 @@ An important function of asimov is interaction with condor schedulers in order t
 In order to improve performance the code caches results from the query to the scheduler.
 
 """
+import collections.abc
+import concurrent.futures
 import os
+import queue
+import sqlite3
 import datetime
+import threading
+import time
 from dateutil import tz
 import htcondor
 import yaml
@@ -39,107 +45,402 @@ def datetime_from_epoch(dt, tzinfo=UTC):
     return datetime.datetime.utcfromtimestamp(dt).replace(tzinfo=tzinfo)
 
 
-def submit_job(submit_description):
+class SchedulerRegistry:
     """
-    Submit a new job to the condor scheduller
+    Find condor schedulers, and keep handles to them for reuse.
+
+    Looking up a scheduler needs a round-trip to the condor collector, so
+    the classads of the schedulers which are found are kept for
+    ``condor>scheduler_ttl`` seconds, and a single handle to each
+    scheduler is shared by everything which uses it.
+
+    Jobs are sent to the scheduler named in ``condor>scheduler`` if there
+    is one.
+    Otherwise, or if it can't be reached, every scheduler known to the
+    collector is tried in turn; the scheduler which accepted a job is
+    tried first from then on, and a scheduler which fails is only tried
+    again, before the others, once the TTL has passed.
+
+    Parameters
+    ----------
+    ttl : float, optional
+       The number of seconds for which schedulers are remembered.
+       Defaults to the ``condor>scheduler_ttl`` setting.
     """
 
-    hostname_job = htcondor.Submit(submit_description)
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._located = {}
+        self._ads = {}
+        self._handles = {}
+        self._failed = {}
+        self.accepted = None
 
-    try:
-        # There should really be a specified submit node, and if there is, use it.
-        schedulers = htcondor.Collector().locate(
-            htcondor.DaemonTypes.Schedd, config.get("condor", "scheduler")
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return config.getfloat("condor", "scheduler_ttl", fallback=600)
+
+    @property
+    def configured(self):
+        """
+        The name of the scheduler set in the asimov configuration, if any.
+        """
+        return config.get("condor", "scheduler", fallback=None) or None
+
+    def clear(self):
+        """
+        Forget all of the schedulers which have been found.
+        """
+        self._located.clear()
+        self._ads.clear()
+        self._handles.clear()
+        self._failed.clear()
+        self.accepted = None
+
+    def _lookup(self, key, query):
+        now = time.monotonic()
+        if key not in self._located or self._located[key][0] <= now:
+            ads = query()
+            for ad in ads:
+                self._ads[ad["Name"]] = ad
+            self._located[key] = (now + self.ttl, ads)
+        return self._located[key][1]
+
+    def locate(self, name):
+        """
+        Find the classad of a scheduler.
+
+        Parameters
+        ----------
+        name : str
+           The name of the scheduler.
+
+        Raises
+        ------
+        htcondor.HTCondorLocateError
+           If the collector does not know of the scheduler.
+        """
+        return self._lookup(
+            name,
+            lambda: [htcondor.Collector().locate(htcondor.DaemonTypes.Schedd, name)],
+        )[0]
+
+    def locate_all(self):
+        """
+        Find the classads of all of the schedulers known to the collector.
+
+        Raises
+        ------
+        htcondor.HTCondorLocateError
+           If the collector can't be reached.
+        """
+        return self._lookup(
+            None,
+            lambda: list(htcondor.Collector().locateAll(htcondor.DaemonTypes.Schedd)),
         )
-        schedd = htcondor.Schedd(schedulers)
-        logger.info(f"Found scheduler: {schedd}")
-    except:  # NoQA
-        # If you can't find a specified scheduler, try until it works
-        collectors = htcondor.Collector().locateAll(htcondor.DaemonTypes.Schedd)
+
+    def schedd(self, ad):
+        """
+        Get the shared handle for a scheduler.
+
+        Parameters
+        ----------
+        ad : classad.ClassAd
+           The classad of the scheduler.
+        """
+        name = ad["Name"]
+        if name not in self._handles:
+            logger.info(f"Found scheduler: {name}")
+            self._handles[name] = htcondor.Schedd(ad)
+        return self._handles[name]
+
+    def healthy(self, name):
+        """
+        Check that a scheduler has not failed within the last TTL.
+        """
+        return self._failed.get(name, 0) <= time.monotonic()
+
+    def failed(self, name):
+        """
+        Record that a scheduler could not be used, so that it is tried
+        after the others, and is looked up again, until the TTL has passed.
+        """
+        self._failed[name] = time.monotonic() + self.ttl
+        self._handles.pop(name, None)
+        self._located.pop(name, None)
+        self._located.pop(None, None)
+        if self.accepted == name:
+            self.accepted = None
+
+    def _candidates(self):
+        """
+        Find the schedulers to try, in the order in which they should be tried.
+        """
+        tried = set()
+        retry = []
+        names = [self.accepted, self.configured]
+        for name in dict.fromkeys(name for name in names if name):
+            try:
+                ad = self._ads[name] if name == self.accepted else self.locate(name)
+            except (KeyError, htcondor.HTCondorLocateError) as error:
+                logger.info(f"Could not find the scheduler {name}: {error}")
+                continue
+            tried.add(name)
+            if self.healthy(name):
+                yield name, self.schedd(ad)
+            else:
+                retry.append(ad)
+
         logger.info("Searching for a scheduler of any kind")
-        for collector in collectors:
-            logger.info(f"Found {collector}")
-            schedd = htcondor.Schedd(collector)
+        try:
+            ads = self.locate_all()
+        except htcondor.HTCondorLocateError as error:
+            logger.info(f"Could not find any schedulers: {error}")
+            ads = []
+        for ad in ads:
+            if ad["Name"] in tried:
+                continue
+            tried.add(ad["Name"])
+            if self.healthy(ad["Name"]):
+                yield ad["Name"], self.schedd(ad)
+            else:
+                retry.append(ad)
+
+        for ad in retry:
+            yield ad["Name"], self.schedd(ad)
+
+        if not tried:
+            # Fall back to the scheduler on this machine
+            yield None, htcondor.Schedd()
+
+    def run(self, action, remember=False, until=None):
+        """
+        Use the first scheduler which works.
+
+        Parameters
+        ----------
+        action : callable
+           A function which is passed a `htcondor.Schedd`, and which
+           raises `htcondor.HTCondorIOError` if it can't use it.
+        remember : bool, optional
+           If true the scheduler which works is tried first next time,
+           for example because it has accepted jobs.
+        until : callable, optional
+           A function which is passed the value returned by ``action``,
+           and returns false if the next scheduler should be tried as
+           well, for example because the jobs which the action was
+           looking for are not held by this one.
+
+        Returns
+        -------
+        object
+           The value returned by ``action``; if no value was accepted by
+           ``until`` this is the value from the last scheduler which
+           could be used.
+
+        Raises
+        ------
+        htcondor.HTCondorIOError
+           If none of the schedulers could be used.
+        """
+        error = None
+        used = False
+        for name, schedd in self._candidates():
             try:
-                with schedd.transaction() as txn:
-                    cluster_id = hostname_job.queue(txn)
-                    break
-            except htcondor.HTCondorIOError:
-                logger.info(f"{collector} cannot receive jobs")
+                result = action(schedd)
+            except htcondor.HTCondorIOError as failure:
+                logger.info(f"{name} cannot be used: {failure}")
+                if name is not None:
+                    self.failed(name)
+                error = failure
+                continue
+            self._failed.pop(name, None)
+            used = True
+            if until is not None and not until(result):
+                continue
+            if remember and name is not None:
+                self.accepted = name
+            return result
+        if used:
+            return result
+        if error is None:
+            error = htcondor.HTCondorIOError("Could not find a condor scheduler")
+        raise error
+
+
+schedulers = SchedulerRegistry()
+
+
+def submit_job(submit_description):
+    """
+    Submit a new job to the condor scheduller
+    """
+
+    hostname_job = htcondor.Submit(submit_description)
+
+    def queue(schedd):
+        with schedd.transaction() as txn:
+            return hostname_job.queue(txn)
 
-    return cluster_id
+    return schedulers.run(queue, remember=True)
 
 
 def delete_job(cluster_id):
-    try:
-        # There should really be a specified submit node, and if there is, use it.
-        schedulers = htcondor.Collector().locate(
-            htcondor.DaemonTypes.Schedd, config.get("condor", "scheduler")
-        )
-        schedd = htcondor.Schedd(schedulers)
-    except:  # NoQA
-        # If you can't find a specified scheduler, use the first one you find
-        schedd = htcondor.Schedd()
-    schedd.act(htcondor.JobAction.Remove, f"ClusterId == {cluster_id}")
+    """
+    Remove a job from the condor scheduler which holds it.
 
+    Removing a job which a scheduler doesn't hold is not an error, so each
+    scheduler is asked in turn until one of them finds the job, and the
+    scheduler on this machine is asked if none of them do, or none of them
+    can be used.
+
+    Parameters
+    ----------
+    cluster_id : int
+       The cluster of the job.
+
+    Returns
+    -------
+    bool
+       True if a scheduler found the job.
+    """
+
+    def remove(schedd):
+        result = schedd.act(htcondor.JobAction.Remove, f"ClusterId == {cluster_id}")
+        return result.get("TotalJobAds", 0) > 0
 
-def collect_history(cluster_id):
     try:
-        # There should really be a specified submit node, and if there is, use it.
-        schedulers = htcondor.Collector().locate(
-            htcondor.DaemonTypes.Schedd, config.get("condor", "scheduler")
+        if schedulers.run(remove, until=bool):
+            return True
+    except htcondor.HTCondorIOError as error:
+        logger.info(f"Could not use any of the schedulers: {error}")
+    return remove(htcondor.Schedd())
+
+
+JOB_CLASSADS = [
+    "ClusterId",
+    "Cmd",
+    "CurrentHosts",
+    "HoldReason",
+    "JobStatus",
+    "DAG_Status",
+    "JobBatchName",
+    "DAGManJobId",
+]
+
+
+def cluster_constraints(clusters, batch_size=None):
+    """
+    Build the constraints which select a set of jobs and their DAG nodes.
+
+    Each constraint matches the jobs in a batch of clusters, and the
+    nodes of any DAG which one of those clusters runs, so that long
+    lists of clusters are split into several queries of a sensible size.
+
+    Parameters
+    ----------
+    clusters : iterable of int
+       The cluster ids.
+    batch_size : int, optional
+       The largest number of clusters in a single constraint.
+       Defaults to the ``condor>constraint_batch`` setting.
+
+    Returns
+    -------
+    list of str
+       The constraints, which are empty if there are no clusters.
+    """
+    if batch_size is None:
+        batch_size = config.getint("condor", "constraint_batch", fallback=200)
+    batch_size = max(int(batch_size), 1)
+    clusters = sorted({int(float(cluster)) for cluster in clusters})
+    constraints = []
+    for start in range(0, len(clusters), batch_size):
+        constraints.append(
+            " || ".join(
+                f"ClusterId == {cluster} || DAGManJobId == {cluster}"
+                for cluster in clusters[start:start + batch_size]
+            )
         )
-        schedd = htcondor.Schedd(schedulers)
-    except:  # NoQA
-        # If you can't find a specified scheduler, use the first one you find
-        collectors = htcondor.Collector().locateAll(htcondor.DaemonTypes.Schedd)
-        logger.info("Searching for a scheduler of any kind")
-        for collector in collectors:
-            logger.info(f"Found {collector}")
-            schedd = htcondor.Schedd(collector)
-            HISTORY_CLASSADS = [
-                    "CompletionDate",
-                    "CpusProvisioned",
-                    "GpusProvisioned",
-                    "CumulativeSuspensionTime",
-                    "EnteredCurrentStatus",
-                    "MaxHosts",
-                    "RemoteWallClockTime",
-                    "RequestCpus",
-                ]
+    return constraints
+
+
+def tracked_clusters(ledger, event=None):
+    """
+    Find the condor clusters of the unfinished analyses in a ledger.
+
+    Parameters
+    ----------
+    ledger : `asimov.ledger.Ledger`
+       The ledger.
+    event : str, optional
+       Only find the clusters for this event.
+
+    Returns
+    -------
+    set of int
+       The cluster ids.
+    """
+    clusters = set()
+    for summaries in ledger.get_summaries(event).values():
+        for summary in summaries:
+            if summary.finished or summary.job_id in (None, ""):
+                continue
             try:
-                jobs = schedd.history(
-                    f"ClusterId == {cluster_id}", projection=HISTORY_CLASSADS
+                clusters.add(int(float(summary.job_id)))
+            except (TypeError, ValueError):
+                logger.warning(
+                    f"{summary.event}/{summary.name} has an invalid job id: {summary.job_id}"
                 )
-                logger.info(f"Jobs found: {jobs}")
-                break
-            except htcondor.HTCondorIOError:
-                logger.info(f"{collector} cannot receive jobs")
-        if len(list(jobs)) == 0:
-            raise ValueError
-        output = {}
-        for job in jobs:
-            end = float(job["CompletionDate"]) or float(job["EnteredCurrentStatus"])
-            output["end"] = datetime_from_epoch(end).strftime("%Y-%m-%d")
-            # get cpus and gpus
-            try:
-                cpus = float(job["CpusProvisioned"])
-            except (KeyError, ValueError):
-                cpus = float(job.get("RequestCpus", 1))
-            try:
-                gpus = float(job["GpusProvisioned"])
-            except (KeyError, ValueError):
-                gpus = float(job.get("RequestGpus", 1))
-            output["cpus"] = cpus
-            output["gpus"] = gpus
-            # get total job time (seconds)
-            runtime = float(job["RemoteWallClockTime"]) - float(
-                job["CumulativeSuspensionTime"]
-            )
-            # if the job didn't get assigned a MATCH_GLIDEIN_Site,
-            # then it ran in the local pool
-            output["runtime"] = runtime
-        return output
+    return clusters
+
+
+HISTORY_CLASSADS = [
+    "CompletionDate",
+    "CpusProvisioned",
+    "GpusProvisioned",
+    "CumulativeSuspensionTime",
+    "EnteredCurrentStatus",
+    "MaxHosts",
+    "RemoteWallClockTime",
+    "RequestCpus",
+]
+
+
+def collect_history(cluster_id):
+    jobs = schedulers.run(
+        lambda schedd: list(
+            schedd.history(f"ClusterId == {cluster_id}", projection=HISTORY_CLASSADS)
+        )
+    )
+    logger.info(f"Jobs found: {jobs}")
+    if len(jobs) == 0:
+        raise ValueError
+    output = {}
+    for job in jobs:
+        end = float(job["CompletionDate"]) or float(job["EnteredCurrentStatus"])
+        output["end"] = datetime_from_epoch(end).strftime("%Y-%m-%d")
+        # get cpus and gpus
+        try:
+            cpus = float(job["CpusProvisioned"])
+        except (KeyError, ValueError):
+            cpus = float(job.get("RequestCpus", 1))
+        try:
+            gpus = float(job["GpusProvisioned"])
+        except (KeyError, ValueError):
+            gpus = float(job.get("RequestGpus", 1))
+        output["cpus"] = cpus
+        output["gpus"] = gpus
+        # get total job time (seconds)
+        runtime = float(job["RemoteWallClockTime"]) - float(
+            job["CumulativeSuspensionTime"]
+        )
+        # if the job didn't get assigned a MATCH_GLIDEIN_Site,
+        # then it ran in the local pool
+        output["runtime"] = runtime
+    return output
 
 
 class CondorJob(yaml.YAMLObject):
@@ -265,91 +566,418 @@ class CondorJob(yaml.YAMLObject):
         return statuses[self._status]
 
 
+class JobCache(collections.abc.Mapping):
+    """
+    The jobs found on the condor schedulers, stored in an SQLite database.
+
+    Each job is stored in its own row, indexed by its cluster id, so a
+    job can be looked up without reading the rest of the cache.
+    The nodes of a DAG record the cluster of the DAG which runs them, and
+    are attached to it as its subjobs when it is looked up.
+
+    The jobs from each scheduler are replaced in a single transaction,
+    along with the time at which they were fetched and the time for which
+    they should be used, so a cache which is being written is never seen
+    half-finished, and the jobs from a scheduler which could not be
+    reached are kept until it can be.
+
+    The cache behaves as a read-only dictionary of `CondorJob` objects,
+    keyed by the cluster id of each job which is not a node of a DAG in
+    the cache.
+
+    Parameters
+    ----------
+    location : str, optional
+       The path to the database file.
+       Defaults to ``.asimov/_cache_jobs.sqlite``.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS schedulers (
+        name TEXT PRIMARY KEY,
+        updated REAL NOT NULL,
+        ttl REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS jobs (
+        schedd TEXT NOT NULL,
+        cluster INTEGER NOT NULL,
+        dag INTEGER,
+        name TEXT,
+        command TEXT,
+        hosts INTEGER,
+        status INTEGER,
+        PRIMARY KEY (schedd, cluster)
+    );
+    CREATE INDEX IF NOT EXISTS job_cluster ON jobs (cluster);
+    CREATE INDEX IF NOT EXISTS job_dag ON jobs (schedd, dag);
+    """
+
+    # Jobs which are not run by a DAG in the cache
+    _TOP_LEVEL = """
+    (jobs.dag IS NULL OR NOT EXISTS (
+        SELECT 1 FROM jobs AS parent
+        WHERE parent.schedd = jobs.schedd AND parent.cluster = jobs.dag
+    ))
+    """
+
+    def __init__(self, location=None):
+        if not location:
+            location = os.path.join(".asimov", "_cache_jobs.sqlite")
+        directory = os.path.dirname(location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.location = location
+        self.connection = sqlite3.connect(location, timeout=30)
+        with self.connection:
+            self.connection.executescript(self.schema)
+
+    @staticmethod
+    def _job(row):
+        schedd, cluster, dag, name, command, hosts, status = row
+        job = CondorJob.from_dict(
+            dict(id=cluster, command=command, hosts=hosts, status=status)
+        )
+        job.name = name if name is not None else job.name
+        job.dag = dag
+        job.schedd = schedd
+        return job
+
+    def __getitem__(self, cluster):
+        try:
+            cluster = int(float(cluster))
+        except (TypeError, ValueError):
+            raise KeyError(cluster)
+        row = self.connection.execute(
+            f"SELECT * FROM jobs WHERE cluster = ? AND {self._TOP_LEVEL} LIMIT 1",
+            (cluster,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(cluster)
+        job = self._job(row)
+        job.subjobs = [
+            self._job(node)
+            for node in self.connection.execute(
+                "SELECT * FROM jobs WHERE schedd = ? AND dag = ? ORDER BY cluster",
+                (job.schedd, cluster),
+            )
+        ]
+        return job
+
+    def __iter__(self):
+        rows = self.connection.execute(
+            f"SELECT DISTINCT cluster FROM jobs WHERE {self._TOP_LEVEL} ORDER BY cluster"
+        )
+        return (row[0] for row in rows.fetchall())
+
+    def __len__(self):
+        return self.connection.execute(
+            f"SELECT COUNT(DISTINCT cluster) FROM jobs WHERE {self._TOP_LEVEL}"
+        ).fetchone()[0]
+
+    def parent(self, cluster):
+        """
+        Find the cluster of the DAG which runs a job, if there is one.
+        """
+        row = self.connection.execute(
+            "SELECT dag FROM jobs WHERE cluster = ? LIMIT 1", (int(cluster),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def children(self, cluster):
+        """
+        Find the clusters of the nodes of a DAG.
+        """
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT cluster FROM jobs WHERE dag = ? ORDER BY cluster",
+                (int(cluster),),
+            )
+        ]
+
+    def store(self, schedd, jobs, ttl, updated=None):
+        """
+        Replace the jobs from a scheduler.
+
+        Parameters
+        ----------
+        schedd : str
+           The name of the scheduler.
+        jobs : list of `CondorJob`
+           All of the jobs which were found on the scheduler.
+        ttl : float
+           The number of seconds for which the jobs should be used.
+        updated : float, optional
+           The time at which the jobs were found, as a Unix timestamp.
+           Defaults to the current time.
+        """
+        if updated is None:
+            updated = time.time()
+        with self.connection:
+            self.connection.execute("DELETE FROM jobs WHERE schedd = ?", (schedd,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        schedd,
+                        job.idno,
+                        job.dag,
+                        job.name,
+                        job.command,
+                        job.hosts,
+                        job._status,
+                    )
+                    for job in jobs
+                ),
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO schedulers VALUES (?, ?, ?)",
+                (schedd, updated, ttl),
+            )
+
+    def updated(self):
+        """
+        Find when the jobs from each scheduler were fetched.
+
+        Returns
+        -------
+        dict
+           The time at which the jobs were fetched, and the number of
+           seconds for which they should be used, for each scheduler.
+        """
+        return {
+            name: (updated, ttl)
+            for name, updated, ttl in self.connection.execute(
+                "SELECT name, updated, ttl FROM schedulers"
+            )
+        }
+
+    def fresh(self, now=None):
+        """
+        Check that the jobs from every scheduler are still within their TTL.
+
+        A cache which has never been written is not fresh.
+        """
+        if now is None:
+            now = time.time()
+        updated = self.updated()
+        return bool(updated) and all(
+            now < time + ttl for time, ttl in updated.values()
+        )
+
+    def close(self):
+        """
+        Close the connection to the database.
+        """
+        self.connection.close()
+
+
+def _start_daemon_threads(calls, workers):
+    """
+    Make calls on a pool of daemon threads.
+
+    The interpreter waits for the threads of a
+    `concurrent.futures.ThreadPoolExecutor` before it exits, so a query to
+    a scheduler which never replies would stop asimov from exiting.
+    Daemon threads are abandoned instead.
+
+    Parameters
+    ----------
+    calls : list of tuple
+       The function to call, followed by its arguments, for each call.
+    workers : int
+       The largest number of calls to make at once.
+
+    Returns
+    -------
+    list of `concurrent.futures.Future`
+       The result of each call, in the order of the calls.
+       A call which has not started can be cancelled.
+    """
+    pending = queue.SimpleQueue()
+    futures = []
+    for function, *arguments in calls:
+        future = concurrent.futures.Future()
+        futures.append(future)
+        pending.put((future, function, arguments))
+
+    def work():
+        while True:
+            try:
+                future, function, arguments = pending.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*arguments))
+            except BaseException as error:
+                future.set_exception(error)
+
+    for _ in range(max(min(len(calls), workers), 1)):
+        threading.Thread(target=work, daemon=True).start()
+    return futures
+
+
 class CondorJobList:
     """
     Store the list of running condor jobs.
 
-    The list is automatically pulled from the condor scheduller if it is
-    more than 15 minutes old (by default)
+    The list is automatically pulled from the condor scheduller if the
+    jobs from any scheduler are more than 15 minutes old (by default).
+    The jobs are kept in a `JobCache`, which is available as ``jobs``.
+
+    Parameters
+    ----------
+    clusters : iterable of int, optional
+       Only fetch these clusters, and the nodes of the DAGs which they
+       run, from the schedulers, rather than every job owned by the user.
+    cache : `JobCache`, optional
+       The cache to use.
+       Defaults to the cache in the ``.asimov`` directory.
     """
 
-    def __init__(self):
-        self.jobs = {}
-        cache = os.path.join(".asimov", "_cache_jobs.yaml")
-        if not os.path.exists(cache):
-            self.refresh()
+    def __init__(self, clusters=None, cache=None):
+        self.jobs = cache if cache is not None else JobCache()
+        self.failures = {}
+        self.clusters = None if clusters is None else set(clusters)
+        if self.jobs.fresh():
+            logger.info("Using the condor cache")
         else:
-            age = -os.stat(cache).st_mtime + datetime.datetime.now().timestamp()
-            logger.info(f"Condor cache is {age} seconds old")
-            if float(age) < float(config.get("condor", "cache_time")):
-                with open(cache, "r") as f:
-                    self.jobs = yaml.safe_load(f)
-            else:
-                self.refresh()
+            self.refresh()
 
-    def refresh(self):
+    @classmethod
+    def for_ledger(cls, ledger):
         """
-        Poll the schedulers to get the list of running jobs and update the database.
+        Make the list of the jobs for the analyses in a ledger.
+
+        If the ``condor>tracked_jobs_only`` setting is true only the
+        clusters which the ledger tracks are fetched, otherwise every job
+        owned by the user is.
+
+        Parameters
+        ----------
+        ledger : `asimov.ledger.Ledger`
+           The ledger.
+        """
+        if config.getboolean("condor", "tracked_jobs_only", fallback=False):
+            return cls(clusters=tracked_clusters(ledger))
+        return cls()
+
+    @staticmethod
+    def _query(schedd_ad, constraint=None):
+        """
+        Find the jobs on a single scheduler.
+        """
+        schedd = schedulers.schedd(schedd_ad)
+        if constraint is None:
+            return schedd.query(
+                opts=htcondor.htcondor.QueryOpts.DefaultMyJobsOnly,
+                projection=JOB_CLASSADS,
+            )
+        return schedd.query(
+            constraint=constraint,
+            opts=htcondor.htcondor.QueryOpts.DefaultMyJobsOnly,
+            projection=JOB_CLASSADS,
+        )
+
+    def refresh(self, timeout=None, clusters=None):
         """
-        data = []
+        Poll the schedulers to get the list of running jobs and update the database.
 
+        The schedulers are all queried at the same time, using up to
+        ``condor>max_workers`` threads.
+        A scheduler which fails, or which does not reply within the timeout,
+        is recorded in ``failures``, and the jobs from the others are
+        still used.
+        A query which has not replied is left running in the background,
+        and does not stop asimov from exiting.
+        If an empty list of clusters is given the schedulers are not
+        queried, and the cached jobs are left as they are.
+
+        Parameters
+        ----------
+        timeout : float, optional
+           The number of seconds to wait for the schedulers to reply.
+           Defaults to the ``condor>query_timeout`` setting.
+        clusters : iterable of int, optional
+           Only fetch these clusters and their DAG nodes.
+           Defaults to the clusters which the list was made with, or
+           every job owned by the user if it was made without any.
+        """
         logger.info("Updating the condor cache")
+        self.failures = {}
+        if clusters is None:
+            clusters = self.clusters
+        if clusters is None:
+            constraints = [None]
+        else:
+            constraints = cluster_constraints(clusters)
+            if not constraints:
+                # Asking for no jobs would replace the cached jobs with nothing
+                logger.info("No clusters are being tracked, so the cache is unchanged")
+                return
+            logger.info(
+                f"Fetching {len(set(clusters))} clusters in {len(constraints)} queries"
+            )
 
         try:
-            collectors = htcondor.Collector().locateAll(htcondor.DaemonTypes.Schedd)
+            collectors = schedulers.locate_all()
         except htcondor.HTCondorLocateError as e:
             logger.error("Could not find a valid condor scheduler")
             logger.exception(e)
             raise e
 
-        for schedd_ad in collectors:
+        if timeout is None:
+            timeout = config.getfloat("condor", "query_timeout", fallback=60)
+        data = {schedd_ad["Name"]: [] for schedd_ad in collectors}
+        tasks = [
+            (schedd_ad, constraint)
+            for schedd_ad in collectors
+            for constraint in constraints
+        ]
+        max_workers = config.getint("condor", "max_workers", fallback=16)
+        futures = _start_daemon_threads(
+            [(self._query, schedd_ad, constraint) for schedd_ad, constraint in tasks],
+            max_workers,
+        )
+        queries = {
+            query: schedd_ad["Name"] for query, (schedd_ad, _) in zip(futures, tasks)
+        }
+        done, waiting = concurrent.futures.wait(queries, timeout=timeout)
+        for query in waiting:
+            # Don't start the queries which are still waiting for a thread
+            query.cancel()
+        for query in done:
+            name = queries[query]
             try:
-                schedd = htcondor.Schedd(schedd_ad)
-                jobs = schedd.query(
-                    opts=htcondor.htcondor.QueryOpts.DefaultMyJobsOnly,
-                    projection=[
-                        "ClusterId",
-                        "Cmd",
-                        "CurrentHosts",
-                        "HoldReason",
-                        "JobStatus",
-                        "DAG_Status",
-                        "JobBatchName",
-                        "DAGManJobId",
-                    ],
+                data[name] += query.result()
+            except Exception as e:
+                self.failures[name] = str(e)
+        for query in waiting:
+            self.failures[queries[query]] = f"No reply after {timeout} seconds"
+        for name, failure in self.failures.items():
+            logger.warning(f"Could not get the jobs from {name}: {failure}")
+            schedulers.failed(name)
+
+        ttl = config.getfloat("condor", "cache_time", fallback=900)
+        for name, ads in data.items():
+            if name in self.failures:
+                # Keep the jobs from the last time the scheduler replied
+                continue
+            jobs = []
+            for datum in ads:
+                if "ClusterId" not in datum:
+                    continue
+                job = dict(
+                    id=int(float(datum["ClusterId"])),
+                    command=datum["Cmd"],
+                    hosts=datum["CurrentHosts"],
+                    status=datum["JobStatus"],
                 )
-                data += jobs
-            except:  # NoQA
-                pass
-
-            retdat = []
-            for datum in data:
-                if "ClusterId" in datum:
-                    job = dict(
-                        id=int(float(datum["ClusterId"])),
-                        command=datum["Cmd"],
-                        hosts=datum["CurrentHosts"],
-                        status=datum["JobStatus"],
-                    )
-                    if "HoldReason" in datum:
-                        job["hold"] = datum["HoldReason"]
-                    if "JobBatchName" in datum:
-                        job["name"] = datum["JobBatchName"]
-                    if "DAG_Status" not in datum and "DAGManJobID" in datum:
-                        job["dag id"] = int(float(datum["DAGManJobId"]))
-
-                retdat.append(CondorJob.from_dict(job))
-
-        for datum in retdat:
-            if not datum.dag:
-                self.jobs[datum.idno] = datum
-                # # Now search for subjobs
-        for datum in retdat:
-            if datum.dag:
-                if datum.dag in self.jobs:
-                    self.jobs[datum.dag].add_subjob(datum)
-                else:
-                    self.jobs[datum.idno] = datum.to_dict()
-
-        with open(os.path.join(".asimov", "_cache_jobs.yaml"), "w") as f:
-            f.write(yaml.dump(self.jobs))
+                if "JobBatchName" in datum:
+                    job["name"] = datum["JobBatchName"]
+                if "DAG_Status" not in datum and "DAGManJobId" in datum:
+                    job["dag id"] = int(float(datum["DAGManJobId"]))
+                jobs.append(CondorJob.from_dict(job))
+            self.jobs.store(name, jobs, ttl)
@@ -0,0 +1,358 @@
+"""
+Dependency graphs of the analyses in a project.
+
+An analysis is ready to run once none of the analyses which it depends
+on are unfinished.
+Rather than searching the graph for these analyses each time they are
+needed, the graphs here keep a count of the unfinished dependencies of
+every analysis, which is updated as analyses are added, removed, or
+change status, so that the analyses which are ready are always known.
+"""
+
+import collections
+
+# The statuses of analyses which have finished
+FINISHED_STATES = frozenset({"uploaded"})
+
+
+class DependencyGraph:
+    """
+    A graph of analyses and the analyses which they depend on.
+
+    Analyses can be identified by any hashable key.
+    An analysis can depend on an analysis which has not been added to
+    the graph yet; it will be connected to it once it is added.
+    Until then the missing analysis does not block it, in the same way
+    that dependencies on analyses which do not exist are ignored.
+
+    Analyses which depend on each other in a cycle are never ready.
+
+    Examples
+    --------
+    >>> graph = DependencyGraph()
+    >>> graph.add("Prod0")
+    >>> graph.add("Prod1", dependencies=["Prod0"])
+    >>> list(graph.ready)
+    ['Prod0']
+    >>> graph.set_finished("Prod0")
+    >>> list(graph.ready)
+    ['Prod1']
+    """
+
+    def __init__(self):
+        self._dependencies = {}
+        self._dependents = collections.defaultdict(set)
+        self._finished = {}
+        self._blocking = {}
+        # A dictionary is used as an ordered set
+        self._ready = {}
+
+    def __contains__(self, key):
+        return key in self._finished
+
+    def __iter__(self):
+        return iter(self._finished)
+
+    def __len__(self):
+        return len(self._finished)
+
+    @property
+    def ready(self):
+        """
+        The analyses which are unfinished, and which do not depend on any
+        unfinished analysis.
+
+        This is a read-only view, which is kept up to date as the graph
+        changes, so it should be copied before the graph is changed if it
+        is being iterated over.
+        """
+        return self._ready.keys()
+
+    def dependencies(self, key):
+        """
+        The analyses which an analysis depends on.
+        """
+        return frozenset(self._dependencies[key])
+
+    def dependents(self, key):
+        """
+        The analyses in the graph which depend on an analysis.
+        """
+        return frozenset(self._dependents.get(key, ()))
+
+    def blocking(self, key):
+        """
+        The number of unfinished analyses which an analysis is waiting for.
+        """
+        return self._blocking[key]
+
+    def finished(self, key):
+        """
+        Whether an analysis has finished.
+        """
+        return self._finished[key]
+
+    def _update_ready(self, key):
+        if not self._finished[key] and self._blocking[key] == 0:
+            self._ready[key] = None
+        else:
+            self._ready.pop(key, None)
+
+    def _unblock(self, key, change):
+        """
+        Change the number of unfinished dependencies of the analyses
+        which depend on an analysis.
+        """
+        for dependent in self._dependents.get(key, ()):
+            if dependent in self._finished:
+                self._blocking[dependent] += change
+                self._update_ready(dependent)
+
+    def add(self, key, dependencies=(), finished=False):
+        """
+        Add an analysis to the graph.
+
+        Parameters
+        ----------
+        key : hashable
+           The analysis.
+        dependencies : iterable, optional
+           The analyses which it depends on.
+        finished : bool, optional
+           Whether the analysis has finished.
+
+        Raises
+        ------
+        ValueError
+           If the analysis is already in the graph.
+        """
+        if key in self._finished:
+            raise ValueError(f"{key} is already in the dependency graph.")
+        dependencies = set(dependencies)
+        self._dependencies[key] = dependencies
+        self._finished[key] = bool(finished)
+        for dependency in dependencies:
+            self._dependents[dependency].add(key)
+        self._blocking[key] = sum(
+            1
+            for dependency in dependencies
+            if self._finished.get(dependency) is False
+        )
+        self._update_ready(key)
+        if not finished:
+            self._unblock(key, +1)
+
+    def remove(self, key):
+        """
+        Remove an analysis from the graph.
+
+        Analyses which depend on it are no longer blocked by it, but will
+        be connected to it again if it is added back.
+
+        Raises
+        ------
+        KeyError
+           If the analysis is not in the graph.
+        """
+        finished = self._finished.pop(key)
+        if not finished:
+            self._unblock(key, -1)
+        for dependency in self._dependencies.pop(key):
+            dependents = self._dependents[dependency]
+            dependents.discard(key)
+            if not dependents:
+                del self._dependents[dependency]
+        del self._blocking[key]
+        self._ready.pop(key, None)
+
+    def set_finished(self, key, finished=True):
+        """
+        Record that an analysis has finished, or is no longer finished.
+
+        Only the analyses which depend directly on it are updated.
+
+        Raises
+        ------
+        KeyError
+           If the analysis is not in the graph.
+        """
+        finished = bool(finished)
+        if self._finished[key] == finished:
+            return
+        self._finished[key] = finished
+        self._update_ready(key)
+        self._unblock(key, -1 if finished else +1)
+
+
+class ProjectGraph(DependencyGraph):
+    """
+    The dependency graph of every analysis in a ledger.
+
+    Each analysis is identified by a tuple of its event's name and its
+    own name.
+    Within an event an analysis can depend on the analyses which appear
+    before it in the ledger, as in `asimov.event.Event.get_all_latest`.
+    Analyses can also depend on the analyses of other events, which are
+    given as ``<event>/<analysis>`` in their ``needs``.
+    Project analyses, which use the analyses of several events, are
+    identified by ``(None, <analysis>)``, and are added with
+    `update_project_analysis`.
+
+    The graph is built from the dictionary representations of the events,
+    so events do not need to be built to find the analyses which are ready.
+
+    Parameters
+    ----------
+    ledger : `asimov.ledger.Ledger`
+       The ledger.
+    """
+
+    def __init__(self, ledger):
+        super().__init__()
+        self.ledger = ledger
+        self.keys = {}
+        for name in ledger.events:
+            self.update_event(name, ledger.events[name])
+
+    @staticmethod
+    def _resolve(event, dependency, earlier):
+        """
+        Find the key of an analysis which is needed by another analysis.
+        """
+        if "/" in dependency:
+            other, name = dependency.split("/", 1)
+            return other.strip(), name.strip()
+        if dependency in earlier:
+            return event, dependency
+        return None
+
+    def update_event(self, name, event):
+        """
+        Bring the analyses for an event up to date.
+
+        Analyses whose dependencies have not changed are only updated if
+        their status has changed.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        event : dict
+           The dictionary representation of the event.
+        """
+        # The summaries depend on this module, so are imported here
+        from asimov.summary import summarise_event
+
+        pipelines = self.ledger.data.get("pipelines") or {}
+        keys = []
+        earlier = set()
+        for summary in summarise_event(event, pipelines):
+            if summary.name in earlier:
+                # Analysis names are unique within an event
+                continue
+            key = (name, summary.name)
+            dependencies = {
+                resolved
+                for resolved in (
+                    self._resolve(name, str(dependency), earlier)
+                    for dependency in summary.dependencies
+                )
+                if resolved is not None
+            }
+            earlier.add(summary.name)
+            keys.append(key)
+            self._update(key, dependencies, summary.finished)
+        for key in set(self.keys.get(name, ())) - set(keys):
+            self.remove(key)
+        self.keys[name] = keys
+
+    def _update(self, key, dependencies, finished):
+        """
+        Add an analysis, or bring it up to date if it is already in the graph.
+        """
+        if key in self and self._dependencies[key] == dependencies:
+            self.set_finished(key, finished)
+        else:
+            if key in self:
+                self.remove(key)
+            self.add(key, dependencies, finished=finished)
+
+    def update_project_analysis(self, analysis):
+        """
+        Add a project analysis to the graph, or bring it up to date.
+
+        Parameters
+        ----------
+        analysis : `asimov.analysis.ProjectAnalysis`
+           The analysis, whose ``dependencies`` are given as
+           ``<event>/<analysis>``.
+        """
+        dependencies = {
+            resolved
+            for resolved in (
+                self._resolve(None, str(dependency), ())
+                for dependency in analysis.dependencies
+            )
+            if resolved is not None
+        }
+        self._update((None, analysis.name), dependencies, analysis.finished)
+
+    def remove_project_analysis(self, name):
+        """
+        Remove a project analysis from the graph.
+
+        Parameters
+        ----------
+        name : str
+           The name of the analysis.
+        """
+        if (None, name) in self:
+            self.remove((None, name))
+
+    def ready_project_analyses(self):
+        """
+        Find the project analyses which are ready to run.
+
+        Returns
+        -------
+        list
+           The names of the analyses.
+        """
+        return [name for event, name in self.ready if event is None]
+
+    def remove_event(self, name):
+        """
+        Remove the analyses for an event from the graph.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        """
+        for key in self.keys.pop(name, []):
+            self.remove(key)
+
+    def ready_analyses(self, event=None):
+        """
+        Find the analyses which are ready to run, grouped by event.
+
+        Parameters
+        ----------
+        event : str, optional
+           Only find the analyses for this event.
+
+        Returns
+        -------
+        dict
+           The names of the analyses which are ready for each event which
+           has any, in the order in which they appear in the ledger.
+        """
+        names = [event] if event else list(self.keys)
+        ready = collections.defaultdict(set)
+        for event_name, analysis in self.ready:
+            ready[event_name].add(analysis)
+        return {
+            name: [key[1] for key in self.keys[name] if key[1] in ready[name]]
+            for name in names
+            if ready.get(name)
+        }
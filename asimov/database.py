@@ -16,10 +16,55 @@ just because I want something I can work with easily on a laptop.
 MongoDB would be a better long-term solution.
 
 """
+import datetime
+import json
+import os
+import sqlite3
+
+import yaml
 from tinydb import Query, TinyDB
 
 from asimov import config
 
+# Values which JSON cannot represent are stored as an object giving their
+# type, so that they are read back unchanged
+_TYPE_KEY = "__asimov_type__"
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {_TYPE_KEY: "datetime", "value": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {_TYPE_KEY: "date", "value": value.isoformat()}
+    return {_TYPE_KEY: "yaml", "value": yaml.safe_dump(value)}
+
+
+def _decode(value):
+    if set(value) != {_TYPE_KEY, "value"}:
+        return value
+    kind = value[_TYPE_KEY]
+    if kind == "datetime":
+        return datetime.datetime.fromisoformat(value["value"])
+    if kind == "date":
+        return datetime.date.fromisoformat(value["value"])
+    if kind == "yaml":
+        return yaml.safe_load(value["value"])
+    return value
+
+
+def dumps(data):
+    """
+    Encode ledger data as JSON, keeping the types of values such as dates.
+    """
+    return json.dumps(data, default=_encode)
+
+
+def loads(text):
+    """
+    Decode ledger data which was encoded by `dumps`.
+    """
+    return json.loads(text, object_hook=_decode)
+
 
 class AsimovDatabase:
     pass
@@ -59,3 +104,372 @@ class AsimovTinyDatabase(AsimovDatabase):
     def query(self, table, parameter, value):
         pages = self.tables[table].search(Query()[parameter] == value)
         return pages
+
+
+class AsimovSQLiteDatabase(AsimovDatabase):
+    """
+    Store the ledger in an SQLite database.
+
+    Events, productions and review messages are each stored in their own
+    table.
+    The fields which are used to look-up productions (the event name,
+    status, pipeline, and job id) are stored in indexed columns, and the
+    remainder of the metadata is stored as a JSON document.
+
+    Parameters
+    ----------
+    location : str, optional
+       The path to the database file.
+       Defaults to the ledger location in the configuration file.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS project (
+        key TEXT PRIMARY KEY,
+        data TEXT
+    );
+    CREATE TABLE IF NOT EXISTS events (
+        name TEXT PRIMARY KEY,
+        data TEXT
+    );
+    CREATE TABLE IF NOT EXISTS productions (
+        event TEXT NOT NULL,
+        name TEXT NOT NULL,
+        position INTEGER,
+        status TEXT,
+        pipeline TEXT,
+        job_id,
+        data TEXT,
+        PRIMARY KEY (event, name)
+    );
+    CREATE INDEX IF NOT EXISTS production_status ON productions (status);
+    CREATE INDEX IF NOT EXISTS production_pipeline ON productions (pipeline);
+    CREATE INDEX IF NOT EXISTS production_job_id ON productions (job_id);
+    CREATE TABLE IF NOT EXISTS reviews (
+        event TEXT NOT NULL,
+        production TEXT NOT NULL,
+        position INTEGER,
+        timestamp TEXT,
+        status TEXT,
+        message TEXT
+    );
+    CREATE INDEX IF NOT EXISTS review_production ON reviews (event, production);
+    CREATE TABLE IF NOT EXISTS archive (
+        event TEXT NOT NULL,
+        version TEXT NOT NULL,
+        reason TEXT,
+        date TEXT,
+        data TEXT
+    );
+    CREATE INDEX IF NOT EXISTS archive_event ON archive (event);
+    """
+
+    # Map the names of production filters to indexed columns
+    production_columns = {
+        "event": "event",
+        "status": "status",
+        "pipeline": "pipeline",
+        "job id": "job_id",
+    }
+
+    def __init__(self, location=None):
+        if not location:
+            location = config.get("ledger", "location")
+        if not os.path.exists(location):
+            raise FileNotFoundError(f"There is no ledger database at {location}")
+        self.location = location
+        self.connection = sqlite3.connect(location)
+        with self.connection:
+            # Add any tables which are missing from databases made by older versions
+            self.connection.executescript(self.schema)
+
+    @classmethod
+    def _create(cls, location):
+        connection = sqlite3.connect(location)
+        with connection:
+            connection.executescript(cls.schema)
+        connection.close()
+        return cls(location)
+
+    @staticmethod
+    def _dumps(data):
+        return dumps(data)
+
+    @staticmethod
+    def _loads(text):
+        return loads(text)
+
+    @staticmethod
+    def _load_value(text):
+        """
+        Read a single value, allowing for the plain text which was stored
+        by earlier versions.
+        """
+        if text is None:
+            return None
+        try:
+            return loads(text)
+        except ValueError:
+            return text
+
+    def get_project(self):
+        """
+        Retrieve the project-level data.
+        """
+        row = self.connection.execute(
+            "SELECT data FROM project WHERE key = 'project'"
+        ).fetchone()
+        return self._loads(row[0]) if row else {}
+
+    def store_project(self, data):
+        """
+        Store the project-level data.
+
+        Parameters
+        ----------
+        data : dict
+           The project data, excluding the events.
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO project (key, data) VALUES ('project', ?)",
+                (self._dumps(data),),
+            )
+
+    def event_names(self):
+        """
+        List the names of all of the events in the database.
+        """
+        return [
+            row[0]
+            for row in self.connection.execute("SELECT name FROM events ORDER BY rowid")
+        ]
+
+    def get_event(self, name):
+        """
+        Retrieve the data for an event, including its productions.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+
+        Raises
+        ------
+        KeyError
+           If there is no event with this name.
+        """
+        row = self.connection.execute(
+            "SELECT data FROM events WHERE name = ?", (name,)
+        ).fetchone()
+        if not row:
+            raise KeyError(name)
+        event = self._loads(row[0])
+
+        reviews = {}
+        for production, timestamp, status, message in self.connection.execute(
+            "SELECT production, timestamp, status, message FROM reviews "
+            "WHERE event = ? ORDER BY position",
+            (name,),
+        ):
+            reviews.setdefault(production, []).append(
+                {
+                    "message": message,
+                    "timestamp": self._load_value(timestamp),
+                    "status": status,
+                }
+            )
+
+        event["productions"] = []
+        for production, data in self.connection.execute(
+            "SELECT name, data FROM productions WHERE event = ? ORDER BY position",
+            (name,),
+        ):
+            data = self._loads(data)
+            if isinstance(data[production], dict):
+                data[production]["review"] = reviews.get(production, [])
+            event["productions"].append(data)
+
+        return event
+
+    def store_event(self, data):
+        """
+        Store an event, replacing any existing record of it.
+
+        Parameters
+        ----------
+        data : dict
+           The dictionary representation of the event.
+        """
+        self.store_events([data])
+
+    def store_events(self, events):
+        """
+        Store several events in a single database transaction,
+        replacing any existing records of them.
+
+        Parameters
+        ----------
+        events : list of dict
+           The dictionary representations of the events.
+        """
+        with self.connection:
+            for data in events:
+                self._write_event(data)
+
+    def _write_event(self, data):
+        """
+        Write the rows for an event without committing them.
+        """
+        event = dict(data)
+        name = event["name"]
+        productions = event.pop("productions", None) or []
+        self.connection.execute(
+            "INSERT INTO events (name, data) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+            (name, self._dumps(event)),
+        )
+        self.connection.execute("DELETE FROM productions WHERE event = ?", (name,))
+        self.connection.execute("DELETE FROM reviews WHERE event = ?", (name,))
+        for position, entry in enumerate(productions):
+            production = list(entry.keys())[0]
+            entry = dict(entry)
+            details = entry[production]
+            if isinstance(details, dict):
+                details = dict(details)
+                for number, message in enumerate(details.pop("review", None) or []):
+                    self.connection.execute(
+                        "INSERT INTO reviews VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            name,
+                            production,
+                            number,
+                            self._dumps(message.get("timestamp")),
+                            message.get("status"),
+                            message.get("message"),
+                        ),
+                    )
+                entry[production] = details
+            else:
+                details = {}
+            self.connection.execute(
+                "INSERT INTO productions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    name,
+                    production,
+                    position,
+                    details.get("status"),
+                    details.get("pipeline"),
+                    details.get("job id"),
+                    self._dumps(entry),
+                ),
+            )
+
+    def delete_event(self, name):
+        """
+        Remove an event and all of its productions from the database.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        """
+        with self.connection:
+            for table, column in (
+                ("events", "name"),
+                ("productions", "event"),
+                ("reviews", "event"),
+            ):
+                self.connection.execute(
+                    f"DELETE FROM {table} WHERE {column} = ?", (name,)
+                )
+
+    def archived_event_names(self):
+        """
+        List the names of the events which have archived versions.
+        """
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT DISTINCT event FROM archive ORDER BY event"
+            )
+        ]
+
+    def archived_versions(self, name):
+        """
+        Retrieve the archived versions of an event, oldest first.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        """
+        return [
+            {
+                "version": version,
+                "reason": reason,
+                "date": self._load_value(date),
+                "data": self._loads(data),
+            }
+            for version, reason, date, data in self.connection.execute(
+                "SELECT version, reason, date, data FROM archive "
+                "WHERE event = ? ORDER BY rowid",
+                (name,),
+            )
+        ]
+
+    def archive_event(self, name, data, reason, date):
+        """
+        Add a version of an event to the archive table.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        data : dict
+           The dictionary representation of the event.
+        reason : str
+           Why the event was archived.
+        date : datetime
+           When the event was archived.
+
+        Returns
+        -------
+        str
+           The name of the new version.
+        """
+        with self.connection:
+            (count,) = self.connection.execute(
+                "SELECT COUNT(*) FROM archive WHERE event = ?", (name,)
+            ).fetchone()
+            version = f"version-{count + 1}"
+            self.connection.execute(
+                "INSERT INTO archive VALUES (?, ?, ?, ?, ?)",
+                (name, version, reason, self._dumps(date), self._dumps(data)),
+            )
+        return version
+
+    def query_productions(self, **filters):
+        """
+        Find productions using the indexed columns.
+
+        Parameters
+        ----------
+        **filters
+           Values for any of the filters in `production_columns`.
+
+        Returns
+        -------
+        list
+           A list of (event name, production name) tuples.
+        """
+        clauses = []
+        values = []
+        for key, value in filters.items():
+            clauses.append(f"{self.production_columns[key]} = ?")
+            values.append(value)
+        query = "SELECT event, name FROM productions"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY event, position"
+        return [tuple(row) for row in self.connection.execute(query, values)]
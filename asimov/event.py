@@ -17,9 +17,12 @@ from liquid import Liquid
 from asimov import config, logger, LOGGER_LEVEL
 from asimov.pipelines import known_pipelines
 from asimov.storage import Store
-from asimov.utils import update, diff_dict
+from asimov.metadata import LayeredMetadata
+from asimov.utils import MISSING, update
 
-from .git import EventRepo
+from .assets import asset_cache
+from .dag import FINISHED_STATES, DependencyGraph
+from .git import EventRepo, LazyEventRepo
 from .ini import RunConfiguration
 from .review import Review
 
@@ -81,6 +84,9 @@ class Event:
     A specific gravitational wave event or trigger.
     """
 
+    _meta_snapshot = None
+    _meta_generation = 0
+
     def __init__(self, name, repository=None, update=False, **kwargs):
         """
         Parameters
@@ -104,36 +110,30 @@ class Event:
         # fh.setFormatter(formatter)
         # self.logger.addHandler(fh)
 
+        if "ledger" in kwargs:
+            if kwargs["ledger"]:
+                self.ledger = kwargs["ledger"]
+        else:
+            self.ledger = None
+
         if "working_directory" in kwargs:
             self.work_dir = kwargs["working_directory"]
         else:
             self.work_dir = os.path.join(
                 config.get("general", "rundir_default"), self.name
             )
-        if not os.path.exists(self.work_dir):
+        if not self.read_only and not os.path.exists(self.work_dir):
             os.makedirs(self.work_dir)
 
-        if "ledger" in kwargs:
-            if kwargs["ledger"]:
-                self.ledger = kwargs["ledger"]
-        else:
-            self.ledger = None
-
-        if repository:
-            if "git@" in repository or "https://" in repository:
-                self.repository = EventRepo.from_url(
-                    repository, self.name, directory=None, update=update
-                )
-            else:
-                self.repository = EventRepo(repository)
-        elif not repository:
-            # If the repository isn't set you'll need to make one
-            location = config.get("general", "git_default")
-            location = os.path.join(location, self.name)
-            self.repository = EventRepo.create(location)
-
-        else:
-            self.repository = repository
+        # The repository is only opened, cloned, or created when it is first used
+        self._repository_source = repository
+        self._update = update
+        self.repository = LazyEventRepo(
+            self._open_repository, repository or self._default_repository()
+        )
+        if not repository and not self.read_only:
+            # A new event needs its repository made before it is added to the ledger
+            self.repository.open()
 
         if "psds" in kwargs:
             self.psds = kwargs["psds"]
@@ -152,6 +152,7 @@ class Event:
 
         self.productions = []
         self.graph = nx.DiGraph()
+        self.dependency_graph = DependencyGraph()
 
         if "productions" in kwargs:
             for production in kwargs["productions"]:
@@ -166,6 +167,7 @@ class Event:
 
         self.productions = []
         self.graph = nx.DiGraph()
+        self.dependency_graph = DependencyGraph()
 
         if "productions" in kwargs:
             for production in kwargs["productions"]:
@@ -268,19 +270,65 @@ class Event:
         self.productions.append(production)
         self.graph.add_node(production)
 
+        dependencies = []
         if production.dependencies:
-            dependencies = production.dependencies
             dependencies = [
-                production
-                for production in self.productions
-                if production.name in dependencies
+                production_o
+                for production_o in self.productions
+                if production_o.name in production.dependencies
             ]
             for dependency in dependencies:
                 self.graph.add_edge(dependency, production)
+        self.dependency_graph.add(
+            production, dependencies, finished=production.finished
+        )
 
     def __repr__(self):
         return f"<Event {self.name}>"
 
+    def _meta_version(self):
+        """
+        Find the version of the event's metadata, which is increased
+        whenever the metadata has changed since it was last checked.
+
+        The productions of the event use this to tell whether the
+        representations of themselves which they last produced are
+        still up to date.
+        """
+        meta = {
+            key: value
+            for key, value in self.meta.items()
+            if key not in {"ledger", "issue", "productions"}
+        }
+        if meta != self._meta_snapshot:
+            self._meta_snapshot = deepcopy(meta)
+            self._meta_generation += 1
+        return self._meta_generation
+
+    @property
+    def read_only(self):
+        """
+        Whether the event was loaded from a ledger which is open read-only.
+        """
+        return bool(getattr(getattr(self, "ledger", None), "read_only", False))
+
+    def _default_repository(self):
+        location = config.get("general", "git_default")
+        return os.path.join(location, self.name)
+
+    def _open_repository(self):
+        repository = self._repository_source
+        if repository:
+            if "git@" in repository or "https://" in repository:
+                return EventRepo.from_url(
+                    repository, self.name, directory=None, update=self._update
+                )
+            else:
+                return EventRepo(repository)
+        else:
+            # If the repository isn't set you'll need to make one
+            return EventRepo.create(self._default_repository())
+
     @classmethod
     def from_dict(cls, data, issue=None, update=False, ledger=None):
         """
@@ -446,7 +494,10 @@ class Event:
         data = {}
         data["name"] = self.name
 
-        if self.repository.url:
+        if isinstance(self.repository, LazyEventRepo) and not self.repository.opened:
+            # Avoid opening the repository just to record where it is
+            data["repository"] = self.repository.location
+        elif self.repository.url:
             data["repository"] = self.repository.url
         else:
             data["repository"] = self.repository.directory
@@ -509,19 +560,7 @@ class Event:
         set
             A set of independent jobs which are not finished execution.
         """
-        unfinished = self.graph.subgraph(
-            [
-                production
-                for production in self.productions
-                if production.finished is False
-            ]
-        )
-        ends = [
-            x
-            for x in unfinished.reverse().nodes()
-            if unfinished.reverse().out_degree(x) == 0
-        ]
-        return set(ends)  # only want to return one version of each production!
+        return set(self.dependency_graph.ready)
 
     def build_report(self):
         for production in self.productions:
@@ -567,14 +606,19 @@ class Production:
         A comment on this production.
     """
 
+    _serialised = None
+    _meta_snapshot = None
+    _meta_generation = 0
+
     def __init__(self, event, name, status, pipeline, comment=None, **kwargs):
         self.event = event if isinstance(event, Event) else event[0]
         self.subject = self.event
         self.name = name
 
-        pathlib.Path(
-            os.path.join(config.get("logging", "directory"), self.event.name, name)
-        ).mkdir(parents=True, exist_ok=True)
+        if not self.event.read_only:
+            pathlib.Path(
+                os.path.join(config.get("logging", "directory"), self.event.name, name)
+            ).mkdir(parents=True, exist_ok=True)
 
         self.logger = logger.getChild("analysis").getChild(
             f"{self.event.name}/{self.name}"
@@ -594,29 +638,15 @@ class Production:
             self.status_str = "none"
         self.comment = comment
 
-        # Start by adding pipeline defaults
-        if "pipelines" in self.event.ledger.data:
-            if pipeline in self.event.ledger.data["pipelines"]:
-                self.meta = deepcopy(self.event.ledger.data["pipelines"][pipeline])
-            else:
-                self.meta = {}
-        else:
-            self.meta = {}
-
-        if "postprocessing" in self.event.ledger.data:
-            self.meta["postprocessing"] = deepcopy(
-                self.event.ledger.data["postprocessing"]
-            )
-
-        # Update with the event and project defaults
+        # The metadata is looked up through the pipeline defaults, the
+        # project defaults, and the event, without copying them; changes
+        # are only recorded in this production's own settings.
         if "ledger" in self.event.meta:
             self.event.meta.pop("ledger")
-        self.meta = update(self.meta, deepcopy(self.event.meta))
+        self.meta = LayeredMetadata(self._default_layers(pipeline), deepcopy(kwargs))
         if "productions" in self.meta:
             self.meta.pop("productions")
 
-        self.meta = update(self.meta, kwargs)
-
         if "sampler" not in self.meta:
             self.meta["sampler"] = {}
         if "cip jobs" in self.meta:
@@ -733,6 +763,35 @@ class Production:
                     "amplitude order"
                 ]
 
+    def _default_layers(self, pipeline):
+        """
+        Find the layers of defaults which this production's metadata is built on.
+
+        Parameters
+        ----------
+        pipeline : str
+           The name of the production's pipeline.
+
+        Returns
+        -------
+        list of dict
+           The pipeline defaults, project defaults, and event metadata.
+        """
+        data = self.event.ledger.data
+        defaults = (data.get("pipelines") or {}).get(pipeline, {})
+        layers = [defaults]
+        if "postprocessing" in data:
+            # The project's postprocessing settings replace the pipeline's
+            if "postprocessing" in defaults:
+                layers[0] = {
+                    key: value
+                    for key, value in defaults.items()
+                    if key != "postprocessing"
+                }
+            layers.append({"postprocessing": data["postprocessing"]})
+        layers.append(self.event.meta)
+        return layers
+
     def __hash__(self):
         return int(f"{hash(self.name)}{abs(hash(self.event.name))}")
 
@@ -742,7 +801,11 @@ class Production:
     def _process_dependencies(self, needs):
         """
         Process the dependencies list for this production.
+
+        A single dependency can be given without a list.
         """
+        if isinstance(needs, str):
+            return [needs]
         return needs
 
     @property
@@ -812,8 +875,7 @@ class Production:
 
     @property
     def finished(self):
-        finished_states = ["uploaded"]
-        return self.status in finished_states
+        return self.status in FINISHED_STATES
 
     @property
     def status(self):
@@ -822,6 +884,8 @@ class Production:
     @status.setter
     def status(self, value):
         self.status_str = value.lower()
+        if self in self.event.dependency_graph:
+            self.event.dependency_graph.set_finished(self, self.finished)
         self.event.ledger.update_event(self.event)
 
     @property
@@ -847,53 +911,42 @@ class Production:
            If set to True the output is designed to be included nested within an event.
            The event name is not included in the representation, and the production name is provided as a key.
         """
-        dictionary = deepcopy(self.meta)
-        if not event:
-            dictionary["event"] = self.event.name
-            dictionary["name"] = self.name
-
-        dictionary["status"] = self.status
-        dictionary["pipeline"] = self.pipeline.name.lower()
-        dictionary["comment"] = self.comment
-
-        dictionary["review"] = self.review.to_dicts()
-
-        if "data" in self.meta:
-            dictionary["data"] = self.meta["data"]
-        if "likelihood" in self.meta:
-            dictionary["likelihood"] = self.meta["likelihood"]
-        if "quality" in self.meta:
-            dictionary["quality"] = self.meta["quality"]
-        if "priors" in self.meta:
-            dictionary["priors"] = self.meta["priors"]
-        if "waveform" in self.meta:
-            dictionary["waveform"] = self.meta["waveform"]
-        dictionary["needs"] = self.dependencies
-        dictionary["job id"] = self.job_id
-
-        # Remove duplicates of pipeline defaults
-        if self.pipeline.name.lower() in self.event.ledger.data["pipelines"]:
-            defaults = deepcopy(
-                self.event.ledger.data["pipelines"][self.pipeline.name.lower()]
-            )
-        else:
-            defaults = {}
-
-        if "postprocessing" in self.event.ledger.data:
-            defaults["postprocessing"] = deepcopy(
-                self.event.ledger.data["postprocessing"]
-            )
-
         if "ledger" in self.event.meta:
             self.event.meta.pop("ledger")
 
-        defaults = update(defaults, deepcopy(self.event.meta))
-
-        dictionary = diff_dict(defaults, dictionary)
+        fields = {}
+        if not event:
+            fields["event"] = self.event.name
+            fields["name"] = self.name
+        fields["status"] = self.status
+        fields["pipeline"] = self.pipeline.name.lower()
+        fields["comment"] = self.comment
+        fields["review"] = self.review.to_dicts()
+        needs = self.meta.lookup("needs", MISSING)
+        fields["needs"] = None if needs is MISSING else self._process_dependencies(needs)
+        fields["job id"] = self.meta.lookup("job id")
+
+        # The representation is only worked out again if this production,
+        # its event, or the defaults it inherits from have changed.
+        key = (self._meta_version(), self.event._meta_version(), event)
+        cached = self._serialised
+        if (
+            cached is not None
+            and cached["key"] == key
+            and cached["fields"] == fields
+            and cached["defaults"] == self.meta.layers[:-1]
+        ):
+            return self._wrap(deepcopy(cached["dictionary"]), event)
+
+        # Only the settings which differ from the pipeline, project and
+        # event defaults are included.
+        dictionary = self.meta.overrides()
+        for field, value in fields.items():
+            if self.meta.inherited(field, MISSING) != value:
+                dictionary[field] = value
+            else:
+                dictionary.pop(field, None)
 
-        for key, value in self.meta.items():
-            if key == "operations":
-                continue
         if "repository" in self.meta:
             dictionary["repository"] = self.repository.url
         if "ledger" in dictionary:
@@ -904,11 +957,33 @@ class Production:
         if "productions" in dictionary:
             dictionary.pop("productions")
 
+        self._serialised = {
+            "key": key,
+            "fields": deepcopy(fields),
+            "defaults": deepcopy(self.meta.layers[:-1]),
+            "dictionary": deepcopy(dictionary),
+        }
+        return self._wrap(dictionary, event)
+
+    def _meta_version(self):
+        """
+        Find the version of the settings given for this production, which
+        is increased whenever they have changed since they were last checked.
+
+        The settings are compared with a copy of them, rather than relying
+        on the version of the metadata, since a dictionary or list which
+        was read from the metadata can still be changed afterwards.
+        """
+        meta = self.meta.top_layer()
+        if meta != self._meta_snapshot:
+            self._meta_snapshot = deepcopy(meta)
+            self._meta_generation += 1
+        return self._meta_generation
+
+    def _wrap(self, dictionary, event):
         if not event:
-            output = dictionary
-        else:
-            output = {self.name: dictionary}
-        return output
+            return dictionary
+        return {self.name: dictionary}
 
     @property
     def rundir(self):
@@ -1116,11 +1191,10 @@ class Production:
             for previous_job in self.dependencies:
                 try:
                     # Check if the job provides PSDs as an asset and were produced with compatible settings
-                    if keyword in productions[previous_job].pipeline.collect_assets():
+                    assets = asset_cache.get(productions[previous_job])
+                    if keyword in assets:
                         if self._check_compatible(productions[previous_job]):
-                            psds = productions[previous_job].pipeline.collect_assets()[
-                                keyword
-                            ]
+                            psds = assets[keyword]
                             break
                         else:
                             self.logger.info(
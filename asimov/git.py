@@ -19,6 +19,95 @@ class AsimovFileNotFound(FileNotFoundError):
     pass
 
 
+# Open git repositories, keyed by their real path, so that each is only
+# opened once however many events and analyses use it.
+_repositories = {}
+
+
+def open_repository(directory):
+    """
+    Open a git repository, reusing the handle for it if it is already open.
+
+    Parameters
+    ----------
+    directory : str
+       The path to the git repository on the filesystem.
+
+    Returns
+    -------
+    `git.Repo`
+       The repository.
+    """
+    path = os.path.realpath(directory)
+    try:
+        status = os.stat(os.path.join(path, ".git"))
+        identity = (status.st_ino, status.st_ctime_ns)
+    except FileNotFoundError:
+        identity = None
+    repo, opened = _repositories.get(path, (None, None))
+    if repo is None or identity is None or opened != identity:
+        # The repository has not been opened, or has been replaced since
+        repo = git.Repo(directory)
+        _repositories[path] = (repo, identity)
+    return repo
+
+
+class LazyEventRepo:
+    """
+    Stand in for an event's `EventRepo` until it is used.
+
+    Opening a repository can involve cloning it, or creating a new one,
+    so this is only done the first time one of the repository's attributes
+    is looked up.
+
+    Parameters
+    ----------
+    opener : callable
+       A function which returns the `EventRepo`.
+    location : str
+       Where the repository is, as either a path or a URL.
+    """
+
+    def __init__(self, opener, location):
+        self._opener = opener
+        self._repository = None
+        # Relative paths are relative to where the event was loaded
+        self._cwd = os.getcwd()
+        self.location = location
+
+    def __repr__(self):
+        if self._repository is None:
+            return self.location
+        return repr(self._repository)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            # Avoid opening the repository when the proxy is copied or pickled
+            raise AttributeError(name)
+        return getattr(self.open(), name)
+
+    @property
+    def opened(self):
+        """
+        Whether the repository has been opened.
+        """
+        return self._repository is not None
+
+    def open(self):
+        """
+        Open the repository, if it hasn't been opened already.
+
+        Returns
+        -------
+        `EventRepo`
+           The repository.
+        """
+        if self._repository is None:
+            with set_directory(self._cwd):
+                self._repository = self._opener()
+        return self._repository
+
+
 class EventRepo:
     """
     Read a git repository containing event PE information.
@@ -38,7 +127,7 @@ class EventRepo:
         self.event = directory.split("/")[-1]
         self.directory = directory
         self.update_needed = update
-        self.repo = git.Repo(directory)
+        self.repo = open_repository(directory)
         self.url = url
 
         self.logger = logger
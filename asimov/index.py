@@ -0,0 +1,358 @@
+"""
+In-memory indexes of the analyses in the project ledger.
+
+The indexes are built from the dictionary representations of the events
+in the ledger, so that analyses can be found by, for example, their
+status or pipeline without constructing every event in the project.
+"""
+
+import bisect
+import collections
+import collections.abc
+import itertools
+
+DEFAULT_FIELDS = ("status", "pipeline", "job id", "review status")
+
+
+class Range:
+    """
+    A range of values which can be used to filter analyses.
+
+    Both limits are inclusive, and either may be omitted.
+
+    Parameters
+    ----------
+    minimum : float, optional
+       The smallest value in the range.
+    maximum : float, optional
+       The largest value in the range.
+
+    Examples
+    --------
+    >>> ledger.get_productions(filters={"event time": Range(1126259462, 1126259463)})
+    """
+
+    def __init__(self, minimum=None, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __repr__(self):
+        return f"<Range {self.minimum} to {self.maximum}>"
+
+    def __contains__(self, value):
+        if not _numeric(value):
+            return False
+        if self.minimum is not None and value < self.minimum:
+            return False
+        if self.maximum is not None and value > self.maximum:
+            return False
+        return True
+
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def split_path(path):
+    """
+    Split a metadata path into its keys.
+
+    Nested keys are separated with a ``/``, so ``quality/minimum frequency``
+    refers to ``meta["quality"]["minimum frequency"]``.
+    """
+    if isinstance(path, tuple):
+        return path
+    return tuple(key.strip() for key in path.split("/"))
+
+
+def _walk(data, keys):
+    for key in keys:
+        if not isinstance(data, collections.abc.Mapping) or key not in data:
+            raise KeyError(key)
+        data = data[key]
+    return data
+
+
+def review_status(messages):
+    """
+    Find the review status of an analysis from its review messages.
+
+    This follows `asimov.review.Review.status`, with the latest message
+    which sets a status determining the status of the analysis.
+    """
+    status = None
+    for message in sorted(messages or [], key=lambda m: str(m.get("timestamp"))):
+        if message.get("status"):
+            status = message["status"].upper()
+    return status
+
+
+def production_value(production, parameter):
+    """
+    Find the value of a parameter for a production object.
+
+    Parameters
+    ----------
+    production : `asimov.event.Production`
+       The production.
+    parameter : str
+       The parameter; either a key (or ``/`` separated path) in the
+       production's metadata, an attribute of the production, or
+       ``review status``.
+
+    Raises
+    ------
+    KeyError
+       If the production does not have the parameter.
+    """
+    if parameter == "review status":
+        return production.review.status
+    if parameter == "pipeline":
+        return production.pipeline.name.lower()
+    if parameter in production.meta:
+        return production.meta[parameter]
+    try:
+        return _walk(production.meta, split_path(parameter))
+    except KeyError:
+        pass
+    if isinstance(parameter, str) and hasattr(production, parameter):
+        return getattr(production, parameter)
+    raise KeyError(parameter)
+
+
+def matches(value, target):
+    """
+    Check if a value satisfies a filter, which may be a `Range`.
+    """
+    if isinstance(target, Range):
+        return value in target
+    return value == target
+
+
+class FieldIndex:
+    """
+    An inverted index between the values of a single field and the
+    analyses which have them.
+
+    Numeric values are also kept in order, so that the analyses with
+    values in a range can be found without checking every value.
+    """
+
+    def __init__(self):
+        self.entries = collections.defaultdict(set)
+        self.values = {}
+        self.ordered = []
+
+    def add(self, key, value):
+        if not _hashable(value):
+            return
+        self.values[key] = value
+        if _numeric(value) and not self.entries.get(value):
+            bisect.insort(self.ordered, value)
+        self.entries[value].add(key)
+
+    def remove(self, key):
+        if key not in self.values:
+            return
+        value = self.values.pop(key)
+        self.entries[value].discard(key)
+        if not self.entries[value]:
+            del self.entries[value]
+            if _numeric(value):
+                del self.ordered[bisect.bisect_left(self.ordered, value)]
+
+    def lookup(self, target):
+        """
+        Find the analyses which have a value, or a value within a `Range`.
+        """
+        if isinstance(target, Range):
+            start = (
+                0
+                if target.minimum is None
+                else bisect.bisect_left(self.ordered, target.minimum)
+            )
+            end = (
+                len(self.ordered)
+                if target.maximum is None
+                else bisect.bisect_right(self.ordered, target.maximum)
+            )
+            found = set()
+            for value in self.ordered[start:end]:
+                found |= self.entries[value]
+            return found
+        # 1 == 1.0 == True, so make sure that booleans and numbers are kept apart
+        return {
+            key
+            for key in self.entries.get(target, ())
+            if isinstance(self.values[key], bool) == isinstance(target, bool)
+        }
+
+
+class LedgerIndex:
+    """
+    Indexes of the analyses in a ledger.
+
+    Each analysis is identified by a tuple of its event's name and its own
+    name.
+    The status, pipeline, job id, and review status of every analysis are
+    indexed, along with any additional metadata paths which are registered.
+
+    Parameters
+    ----------
+    ledger : `asimov.ledger.Ledger`
+       The ledger to index.
+    paths : list of str, optional
+       Additional metadata paths to index.
+    """
+
+    def __init__(self, ledger, paths=()):
+        self.ledger = ledger
+        self.fields = {field: FieldIndex() for field in DEFAULT_FIELDS}
+        for path in paths:
+            self.fields.setdefault(path, FieldIndex())
+        self.order = {}
+        self.keys = {}
+        self._counter = itertools.count()
+        for name in ledger.events:
+            self.update_event(name, ledger.events[name])
+
+    def __contains__(self, parameter):
+        return parameter in self.fields
+
+    def can_query(self, parameter, value):
+        """
+        Check if a filter can be answered using the indexes.
+        """
+        return parameter in self.fields and (
+            isinstance(value, Range) or _hashable(value)
+        )
+
+    def register(self, path):
+        """
+        Start indexing a metadata path.
+
+        Parameters
+        ----------
+        path : str
+           The path, with nested keys separated by ``/``.
+        """
+        if path in self.fields:
+            return
+        self.fields[path] = FieldIndex()
+        for name in self.ledger.events:
+            self.update_event(name, self.ledger.events[name])
+
+    def _values(self, event, details):
+        """
+        Find the value of each indexed field for a single analysis.
+        """
+        pipeline = str(details.get("pipeline", "")).lower()
+        status = details.get("status")
+        values = {
+            "status": str(status).lower() if status else "none",
+            "pipeline": pipeline,
+            "job id": details.get("job id"),
+            "review status": review_status(details.get("review")),
+        }
+        # Analyses inherit metadata from their event and from the pipeline defaults
+        defaults = self.ledger.data.get("pipelines", {}).get(pipeline, {})
+        for path in self.fields:
+            if path in values:
+                continue
+            for source in (details, event, defaults):
+                if path in source:
+                    values[path] = source[path]
+                    break
+                try:
+                    values[path] = _walk(source, split_path(path))
+                    break
+                except KeyError:
+                    continue
+        return values
+
+    def update_event(self, name, event):
+        """
+        Re-index all of the analyses for an event.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        event : dict
+           The dictionary representation of the event.
+        """
+        order = self.order.get(name)
+        self.remove_event(name)
+        self.order[name] = next(self._counter) if order is None else order
+        keys = []
+        for position, entry in enumerate(event.get("productions") or []):
+            production = list(entry.keys())[0]
+            details = entry[production] or {}
+            key = (name, production)
+            keys.append(key)
+            for field, value in self._values(event, details).items():
+                self.fields[field].add(key, value)
+        self.keys[name] = keys
+
+    def remove_event(self, name):
+        """
+        Remove the analyses for an event from the indexes.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        """
+        self.order.pop(name, None)
+        for key in self.keys.pop(name, []):
+            for field in self.fields.values():
+                field.remove(key)
+
+    def query(self, filters, event=None):
+        """
+        Find the analyses which match all of a set of filters.
+
+        Parameters
+        ----------
+        filters : dict
+           A dictionary of fields and the values, or `Range` of values,
+           which they must have.
+           Every field must be indexed.
+        event : str, optional
+           Only find analyses for this event.
+
+        Returns
+        -------
+        list
+           A list of ``(event, analysis)`` tuples, in the order in which
+           they appear in the ledger.
+        """
+        if event is not None:
+            found = set(self.keys.get(event, []))
+        else:
+            found = None
+        # Start with the most selective filter, so that the intersection stays small
+        matches = sorted(
+            (self.fields[field].lookup(value) for field, value in filters.items()),
+            key=len,
+        )
+        for keys in matches:
+            found = set(keys) if found is None else found & keys
+            if not found:
+                return []
+        if found is None:
+            found = {key for keys in self.keys.values() for key in keys}
+
+        positions = {}
+        for name in {key[0] for key in found}:
+            for position, key in enumerate(self.keys[name]):
+                positions[key] = (self.order[name], position)
+        return sorted(found, key=positions.__getitem__)
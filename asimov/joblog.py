@@ -0,0 +1,325 @@
+"""
+Following the progress of analyses through the event logs written by condor.
+
+Rather than asking the schedulers for the state of every job, and
+searching run directories for the files which a finished job leaves
+behind, the progress of an analysis can be read from the logs which
+DAGMan writes as its jobs change state: the ``*.dagman.log`` for the DAG
+itself, and the ``*.nodes.log`` for the jobs which it runs.
+
+Only the events which have been written since a log was last read are
+read, so checking an analysis costs a few bytes of log.
+The position in each log is kept between runs of asimov by storing the
+`htcondor.JobEventLog` which reads it, which remembers how far it has
+read when it is pickled.
+"""
+
+import glob
+import json
+import os
+import pickle
+import sqlite3
+import time
+from typing import NamedTuple, Optional
+
+import htcondor
+
+from asimov import logger, LOGGER_LEVEL
+
+logger = logger.getChild("joblog")
+logger.setLevel(LOGGER_LEVEL)
+
+SUBMITTED = "submitted"
+RUNNING = "running"
+HELD = "held"
+EVICTED = "evicted"
+COMPLETED = "completed"
+REMOVED = "removed"
+
+# The state which a job is in after each kind of event
+TRANSITIONS = {
+    htcondor.JobEventType.SUBMIT: SUBMITTED,
+    htcondor.JobEventType.EXECUTE: RUNNING,
+    htcondor.JobEventType.JOB_HELD: HELD,
+    htcondor.JobEventType.JOB_RELEASED: SUBMITTED,
+    htcondor.JobEventType.JOB_EVICTED: EVICTED,
+    htcondor.JobEventType.JOB_TERMINATED: COMPLETED,
+    htcondor.JobEventType.JOB_ABORTED: REMOVED,
+}
+
+# The status which the scheduler would report for a job in each state
+_STATUSES = {
+    SUBMITTED: "Idle",
+    RUNNING: "Running",
+    HELD: "Held",
+    EVICTED: "Idle",
+    COMPLETED: "Completed",
+    REMOVED: "Removed",
+}
+
+
+def apply_events(jobs, events):
+    """
+    Update the states of some jobs from the events in a log.
+
+    Parameters
+    ----------
+    jobs : dict
+       The state of each job, and its return value once it has completed,
+       keyed by ``<cluster>.<proc>``.
+       This is changed in place.
+    events : iterable of `htcondor.JobEvent`
+       The events, in the order in which they happened.
+
+    Returns
+    -------
+    dict
+       The jobs.
+    """
+    for event in events:
+        state = TRANSITIONS.get(event.type)
+        if state is None:
+            continue
+        job = f"{event.cluster}.{event.proc}"
+        returned = event.get("ReturnValue") if state == COMPLETED else None
+        jobs[job] = [state, returned]
+    return jobs
+
+
+class JobProgress(NamedTuple):
+    """
+    The progress of an analysis, as recorded in its event logs.
+
+    Attributes
+    ----------
+    cluster : int
+       The cluster of the DAGMan job.
+    state : str
+       The state of the DAGMan job, or ``held`` if any of its nodes are held.
+    returned : int
+       The return value of the DAGMan job, once it has completed.
+    nodes : dict
+       The number of the nodes of the DAG in each state.
+    """
+
+    cluster: int
+    state: str
+    returned: Optional[int]
+    nodes: dict
+
+    @property
+    def succeeded(self):
+        """
+        Whether the DAG has completed without any errors.
+        """
+        return self.state == COMPLETED and self.returned == 0
+
+    @property
+    def status(self):
+        """
+        The status which the scheduler would report for the DAGMan job,
+        in the form used by `asimov.condor.CondorJob`.
+        """
+        return _STATUSES[self.state]
+
+
+class JobLogTracker:
+    """
+    Keep track of how far the event logs of each analysis have been read.
+
+    The logs for an analysis are found by searching its run directory
+    until both its DAGMan log and the log of its nodes have been found,
+    and again if its job is not in any of the logs which have been found
+    already.
+    The state of every job in each log is stored along with the position
+    in the log, in an SQLite database, so only new events need to be
+    read.
+
+    Parameters
+    ----------
+    location : str, optional
+       The path to the database file.
+       Defaults to ``.asimov/_cache_logs.sqlite``.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS logs (
+        production TEXT NOT NULL,
+        path TEXT NOT NULL,
+        reader BLOB,
+        jobs TEXT NOT NULL,
+        updated REAL,
+        PRIMARY KEY (production, path)
+    );
+    """
+
+    def __init__(self, location=None):
+        if not location:
+            location = os.path.join(".asimov", "_cache_logs.sqlite")
+        directory = os.path.dirname(location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.location = location
+        self.connection = sqlite3.connect(location, timeout=30)
+        with self.connection:
+            self.connection.executescript(self.schema)
+
+    @staticmethod
+    def find_logs(rundir):
+        """
+        Find the DAGMan logs in a run directory.
+
+        Parameters
+        ----------
+        rundir : str
+           The run directory of the analysis.
+
+        Returns
+        -------
+        list of str
+           The paths to the logs.
+        """
+        logs = []
+        for pattern in ("*.dagman.log", "*.nodes.log"):
+            logs += glob.glob(os.path.join(rundir, "**", pattern), recursive=True)
+        return sorted(logs)
+
+    def logs(self, production):
+        """
+        List the logs which are being followed for an analysis.
+        """
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT path FROM logs WHERE production = ? ORDER BY path",
+                (production,),
+            )
+        ]
+
+    def read(self, production, path):
+        """
+        Read the new events in a log.
+
+        Parameters
+        ----------
+        production : str
+           The name of the analysis, as ``<event>/<analysis>``.
+        path : str
+           The path to the log.
+
+        Returns
+        -------
+        dict
+           The state of each job in the log; see `apply_events`.
+        """
+        row = self.connection.execute(
+            "SELECT reader, jobs FROM logs WHERE production = ? AND path = ?",
+            (production, path),
+        ).fetchone()
+        jobs = json.loads(row[1]) if row is not None else {}
+        reader = None
+        try:
+            if row is not None and row[0] is not None:
+                reader = pickle.loads(row[0])
+            else:
+                reader = htcondor.JobEventLog(path)
+            apply_events(jobs, reader.events(stop_after=0))
+            state = pickle.dumps(reader)
+        except (OSError, htcondor.HTCondorException) as error:
+            # Keep the position from the last time the log could be read
+            logger.warning(f"Could not read the event log {path}: {error}")
+            return jobs
+        finally:
+            if reader is not None:
+                reader.close()
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO logs VALUES (?, ?, ?, ?, ?)",
+                (production, path, state, json.dumps(jobs), time.time()),
+            )
+        return jobs
+
+    def _read_all(self, production, paths):
+        dagman, nodes = {}, {}
+        for path in paths:
+            jobs = self.read(production, path)
+            (dagman if path.endswith(".dagman.log") else nodes).update(jobs)
+        return dagman, nodes
+
+    def update(self, production, rundir, job_id=None):
+        """
+        Find the progress of an analysis from the new events in its logs.
+
+        Parameters
+        ----------
+        production : str
+           The name of the analysis, as ``<event>/<analysis>``.
+        rundir : str
+           The run directory of the analysis.
+        job_id : int, optional
+           The cluster of the analysis' DAGMan job.
+           If it is not given the most recently submitted DAG is used.
+
+        Returns
+        -------
+        `JobProgress`
+           The progress of the analysis, or None if none of its logs
+           record its DAGMan job.
+        """
+        cluster = None
+        if job_id not in (None, ""):
+            try:
+                cluster = int(float(job_id))
+            except (TypeError, ValueError):
+                pass
+        key = None if cluster is None else f"{cluster}.0"
+
+        paths = self.logs(production)
+        dagman, nodes = self._read_all(production, paths)
+        searched = (
+            dagman
+            and (key is None or key in dagman)
+            and any(path.endswith(".nodes.log") for path in paths)
+        )
+        if not searched:
+            # The DAG may have been started or resubmitted since the run
+            # directory was last searched
+            new = [path for path in self.find_logs(rundir) if path not in paths]
+            if new:
+                found, found_nodes = self._read_all(production, new)
+                dagman.update(found)
+                nodes.update(found_nodes)
+
+        if key is None and dagman:
+            key = next(reversed(dagman))
+        if key not in dagman:
+            return None
+
+        state, returned = dagman[key]
+        counts = {}
+        for node_state, _ in nodes.values():
+            counts[node_state] = counts.get(node_state, 0) + 1
+        if state in (SUBMITTED, RUNNING) and counts.get(HELD):
+            state = HELD
+        return JobProgress(
+            cluster=int(key.split(".")[0]),
+            state=state,
+            returned=returned,
+            nodes=counts,
+        )
+
+    def forget(self, production):
+        """
+        Stop following the logs of an analysis.
+        """
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM logs WHERE production = ?", (production,)
+            )
+
+    def close(self):
+        """
+        Close the connection to the database.
+        """
+        self.connection.close()
@@ -0,0 +1,127 @@
+"""
+An append-only journal of changes to the project ledger.
+
+Rather than re-writing the whole ledger file each time a single event
+changes, the ledger appends a small record describing the change to a
+journal which sits next to the ledger file.
+When the ledger is loaded the journal is replayed over the last full
+snapshot, and the journal is periodically folded back into the
+snapshot (compacted) once it grows beyond a threshold.
+
+Each record is stored as a single, explicitly terminated YAML document,
+so that a record which was only partially written (for example if the
+process was killed part way through an append) can be detected and
+ignored when the journal is replayed.
+"""
+
+import os
+
+import yaml
+
+from asimov.cache import Dumper, Loader
+
+
+class LedgerJournal:
+    """
+    An append-only journal of ledger changes.
+
+    Parameters
+    ----------
+    location : str
+       The path to the journal file.
+    """
+
+    terminator = "\n...\n"
+
+    def __init__(self, location):
+        self.location = location
+        self.length = 0
+        # The position in the file just after the last record which
+        # has been read or written
+        self.position = 0
+
+    def __len__(self):
+        return self.length
+
+    def records(self, new=False):
+        """
+        Read the complete records from the journal.
+
+        Parameters
+        ----------
+        new : bool, optional
+           If true only the records which have been added since the
+           journal was last read or appended to are read, so that the
+           earlier records are not parsed again.
+           The whole journal is read if it has been truncated since then.
+
+        Returns
+        -------
+        list
+           A list of the records in the order in which they were written.
+        """
+        try:
+            with open(self.location, "rb") as journal_file:
+                start = self.position if new else 0
+                if os.fstat(journal_file.fileno()).st_size < start:
+                    # The journal has been truncated by another process
+                    start = 0
+                journal_file.seek(start)
+                text = journal_file.read().decode("utf-8")
+        except FileNotFoundError:
+            self.length = 0
+            self.position = 0
+            return []
+        if start == 0:
+            self.length = 0
+            self.position = 0
+
+        # Discard anything after the last complete record
+        end = text.rfind(self.terminator)
+        if end == -1:
+            return []
+        text = text[: end + len(self.terminator)]
+        self.position = start + len(text.encode("utf-8"))
+
+        records = [record for record in yaml.load_all(text, Loader=Loader) if record]
+        self.length += len(records)
+        return records
+
+    def append(self, *records):
+        """
+        Append records to the journal.
+
+        All of the records are written together, with a single write to
+        the journal file.
+        This should only be done once every earlier record has been read,
+        as later reads of new records start from the end of these ones.
+
+        Parameters
+        ----------
+        *records : dict
+           The records to be added.
+        """
+        text = "".join(
+            yaml.dump(
+                record,
+                default_flow_style=False,
+                explicit_start=True,
+                explicit_end=True,
+                Dumper=Dumper,
+            )
+            for record in records
+        )
+        with open(self.location, "ab") as journal_file:
+            journal_file.write(text.encode("utf-8"))
+            journal_file.flush()
+            self.position = journal_file.tell()
+        self.length += len(records)
+
+    def truncate(self):
+        """
+        Remove all of the records from the journal.
+        """
+        if os.path.exists(self.location):
+            os.remove(self.location)
+        self.length = 0
+        self.position = 0
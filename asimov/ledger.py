@@ -3,17 +3,48 @@ Code for the project ledger.
 """
 import yaml
 
+import collections
+import contextlib
+import copy
 import os
 import shutil
 
 import asimov
 import asimov.database
-from asimov import config
+from asimov import config, logger, LOGGER_LEVEL
+from asimov.archive import SQLiteArchive, YAMLArchive, copy_archive
+from asimov.cache import Dumper, LedgerCache, Loader
+from asimov.changes import ChangeFeed, diff_event, diff_project
+from asimov.dag import ProjectGraph
 from asimov.event import Event, Production
-from asimov.utils import update, set_directory
+from asimov.index import LedgerIndex, matches, production_value
+from asimov.journal import LedgerJournal
+from asimov.lock import FileLock
+from asimov.merge import merge
+from asimov.schema import validate_event
+from asimov.summary import ProductionSummary, summarise_event
+from asimov.utils import MISSING, merge_three_way, update, set_directory
+
+logger = logger.getChild("ledger")
+logger.setLevel(LOGGER_LEVEL)
+
+
+class ReadOnlyLedgerError(PermissionError):
+    """
+    An attempt was made to change a ledger which is open read-only.
+    """
 
 
 class Ledger:
+    read_only = False
+    _transaction_depth = 0
+    _index = None
+    _graph = None
+    _changes = None
+    _archive = None
+    # Changes made to the ledger data in place, which are published when it is saved
+    _unpublished = ()
+
     @classmethod
     def create(cls, name=None, engine=None, location=None):
         """
@@ -26,6 +57,12 @@ class Ledger:
         if engine == "yamlfile":
             YAMLLedger.create(location=location, name=name)
 
+        elif engine == "sqlite":
+            SQLiteLedger.create(location=location, name=name)
+
+        elif engine == "sharded":
+            ShardedYAMLLedger.create(location=location, name=name)
+
         elif engine in {"tinydb", "mongodb"}:
             DatabaseLedger.create()
         elif engine == "gitlab":
@@ -38,95 +75,454 @@ class Ledger:
                 "This hasn't been ported to the new interface yet. Stay tuned!"
             )
 
+    @classmethod
+    def from_ledger(cls, source, location=None):
+        """
+        Create a ledger containing a copy of the contents of another ledger.
 
-class YAMLLedger(Ledger):
-    def __init__(self, location=None):
-        if not location:
-            location = os.path.join(".asimov", "ledger.yml")
-        self.location = location
-        with open(location, "r") as ledger_file:
-            self.data = yaml.safe_load(ledger_file)
+        Parameters
+        ----------
+        source : `asimov.ledger.Ledger`
+           The ledger to copy.
+        location : str, optional
+           The location of the new ledger.
 
-        self.data["events"] = [
-            update(self.get_defaults(), event, inplace=False)
-            for event in self.data["events"]
-        ]
-        self.events = {ev["name"]: ev for ev in self.data["events"]}
-        self._all_events = [
-            Event(**self.events[event], ledger=self)
-            for event in self.events.keys()
-            ]
-        self.data.pop("events")
+        Returns
+        -------
+        `asimov.ledger.Ledger`
+           The new ledger.
+        """
+        ledger = cls.create(name=source.data["project"]["name"], location=location)
+        ledger.data = dict(source.data)
+        ledger.data.pop("events", None)
+        ledger.save()
+        for name in source.events:
+            ledger.events[name] = source.events[name]
+        copy_archive(source.archive, ledger.archive)
+        return ledger
 
-    @classmethod
-    def create(cls, name, location=None):
-        if not location:
-            location = os.path.join(".asimov", "ledger.yml")
-        data = {}
-        data["asimov"] = {}
-        data["asimov"]["version"] = asimov.__version__
-        data["events"] = []
-        data["project"] = {}
-        data["project"]["name"] = name
+    def to_yaml(self, location):
+        """
+        Write the contents of this ledger to a YAML ledger file.
+
+        Parameters
+        ----------
+        location : str
+           The path to the YAML file.
+        """
+        data = dict(self.data)
+        data["events"] = [self.events[name] for name in self.events]
         with open(location, "w") as ledger_file:
-            ledger_file.write(yaml.dump(data, default_flow_style=False))
+            ledger_file.write(yaml.dump(data, default_flow_style=False, Dumper=Dumper))
+        copy_archive(
+            self.archive,
+            YAMLArchive(
+                os.path.join(os.path.dirname(os.path.abspath(location)), "archive")
+            ),
+        )
+
+    @property
+    def archive(self):
+        """
+        The archive of previous versions of the events in the ledger.
+        """
+        if self._archive is None:
+            self._archive = self._open_archive()
+        return self._archive
+
+    def _open_archive(self):
+        return YAMLArchive(
+            os.path.join(os.path.dirname(os.path.abspath(self.location)), "archive")
+        )
+
+    def _move_to_archive(self):
+        """
+        Move the history and trash which older versions of asimov kept
+        in the ledger itself into the archive.
+        """
+        for name, versions in (self.data.pop("history", None) or {}).items():
+            for version in sorted(versions, key=lambda v: int(v.split("-")[-1])):
+                data = dict(versions[version])
+                date = data.pop("date changed", None)
+                self.archive.add(name, data, "updated", date)
+        trash = self.data.pop("trash", None) or {}
+        for name, data in (trash.get("events") or {}).items():
+            self.archive.add(name, data, "deleted")
+
+    def restore_event(self, event_name, version):
+        """
+        Replace an event with one of its archived versions.
+
+        If the event is still in the ledger its current version is
+        archived first, so that restoring can itself be undone.
+
+        Parameters
+        ----------
+        event_name : str
+           The name of the event.
+        version : str
+           The name of the archived version, for example ``version-1``.
+
+        Returns
+        -------
+        `asimov.event.Event`
+           The restored event.
+        """
+        self._check_writable()
+        data = copy.deepcopy(self.archive.get(event_name, version))
+        if event_name in self.events:
+            self.archive.add(event_name, self.events[event_name], "replaced")
+        data.pop("ledger", None)
+        self._all_events.discard(event_name)
+        # The archived version replaces any changes to the event, rather
+        # than being merged with them.
+        getattr(self, "_bases", {}).pop(event_name, None)
+        getattr(self, "_edits", {}).pop(event_name, None)
+        event = Event(**data, ledger=self)
+        self.update_event(event)
+        return event
+
+    @property
+    def changes(self):
+        """
+        The feed of changes which have been made to the ledger.
+
+        This is None unless the feed has been switched on using the
+        ``ledger>change feed`` setting.
+        """
+        if not config.getboolean("ledger", "change feed", fallback=False):
+            return None
+        if self._changes is None:
+            self._changes = ChangeFeed(
+                os.path.join(
+                    os.path.dirname(os.path.abspath(self.location)), "changes.jsonl"
+                ),
+                compact_size=config.getint(
+                    "ledger", "change feed size", fallback=1048576
+                ),
+            )
+        return self._changes
+
+    def _publish(self, changes):
+        """
+        Add changes to the ledger's change feed.
+
+        Parameters
+        ----------
+        changes : list
+           A list of ``(event, production, field, old, new)`` tuples,
+           as produced by `asimov.changes.diff_event`.
+        """
+        if changes and self.changes is not None:
+            self.changes.append(changes)
+
+    def _publish_saved(self):
+        """
+        Publish the changes which were made to the ledger data in place,
+        once they have been saved.
+        """
+        changes, self._unpublished = list(self._unpublished), ()
+        self._publish(changes)
+
+    def _trash_event(self, event_name, archived=False):
+        """
+        Move an event from the ledger to the archive.
+
+        Parameters
+        ----------
+        event_name : str
+           The name of the event.
+        archived : bool, optional
+           True if the event has already been archived, for example by
+           the process which deleted it.
+        """
+        event = self.events.pop(event_name)
+        if not archived:
+            self.archive.add(event_name, event, "deleted")
+        self._all_events.discard(event_name)
+        self._reindex_event(event_name)
+
+    def compact(self):
+        """
+        Fold any pending changes into the main storage for the ledger.
+
+        Ledgers which write every change directly to their storage
+        have nothing to do here.
+        """
+        pass
+
+    @contextlib.contextmanager
+    def reading(self):
+        """
+        Use the ledger read-only.
+
+        Events and analyses which are loaded while the ledger is read-only
+        do not create their working and log directories, or initialise
+        their git repositories, until these are actually used, so the
+        ledger can be read quickly, and from a read-only filesystem.
+        Any attempt to change the ledger raises a `ReadOnlyLedgerError`.
+
+        The events which were loaded are dropped from the event cache when
+        the context closes, so that they are loaded again in full if they
+        are later changed.
+
+        Examples
+        --------
+        >>> with ledger.reading():
+        ...     for event in ledger.get_event():
+        ...         print(event.name)
+        """
+        if self.read_only:
+            yield self
+            return
+        loaded = set(self._all_events.names())
+        self.read_only = True
+        try:
+            yield self
+        finally:
+            self.read_only = False
+            for name in set(self._all_events.names()) - loaded:
+                self._all_events.discard(name)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyLedgerError("The ledger is open read-only.")
+
+    @contextlib.contextmanager
+    def transaction(self, rollback=True):
+        """
+        Group a number of changes to the ledger so that they are written together.
+
+        While the transaction is open, updated events are only marked as
+        changed, and calls to ``save`` are deferred.
+        When the outermost transaction closes, each changed event is
+        serialised once, and the ledger's storage is written once.
+
+        Parameters
+        ----------
+        rollback : bool, optional
+           If true (the default), the changes made inside the transaction
+           are discarded if an exception is raised within it, and any
+           cached event objects which were changed are rebuilt from the
+           ledger data the next time that they are requested.
+           If false, the changes are written before the exception is
+           re-raised; this should be used where the changes record
+           actions, such as job submissions, which cannot be undone.
+
+        Examples
+        --------
+        >>> with ledger.transaction():
+        ...     for event in ledger.get_event():
+        ...         event.meta["interesting"] = True
+        ...         ledger.update_event(event)
+        """
+        outermost = self._transaction_depth == 0
+        if outermost:
+            self._dirty = collections.OrderedDict()
+            self._save_pending = False
+            self._snapshot = copy.deepcopy(self.data) if rollback else None
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if outermost:
+                self._transaction_depth = 0
+                if self._snapshot is not None:
+                    self._rollback()
+                else:
+                    self._flush()
+            raise
+        finally:
+            if outermost:
+                self._transaction_depth = 0
+            else:
+                self._transaction_depth -= 1
+        if outermost:
+            self._flush()
+
+    def _flush(self):
+        """
+        Write the changes which were made inside a transaction.
+        """
+        events = list(self._dirty.values())
+        self._dirty.clear()
+        self._snapshot = None
+        if events:
+            self._store_events(events)
+        if self._save_pending:
+            self._save_pending = False
+            self._save()
+            self._publish_saved()
+
+    def _rollback(self):
+        """
+        Discard the changes which were made inside a transaction.
+        """
+        for name in self._dirty:
+            self._all_events.discard(name)
+        self._dirty.clear()
+        self._save_pending = False
+        self._unpublished = ()
+        self.data.clear()
+        self.data.update(self._snapshot)
+        self._snapshot = None
 
     def update_event(self, event):
         """
         Update an event in the ledger with a changed event object.
+
+        Parameters
+        ----------
+        event : `asimov.event.Event`
+           The changed event.
+        """
+        self._check_writable()
+        if self._transaction_depth:
+            self._dirty[event.name] = event
+            self._dirty.move_to_end(event.name)
+            self._cache_event(event)
+        else:
+            self._store_events([event])
+
+    def save(self):
         """
-        self.events[event.name] = event.to_dict()
+        Write the ledger to its storage.
+
+        If a transaction is open the ledger is written when it closes.
+        """
+        self._check_writable()
+        if self._transaction_depth:
+            self._save_pending = True
+        else:
+            self._save()
+            self._publish_saved()
+
+    def update_project(self, settings):
+        """
+        Change the project-wide settings, and save the ledger.
+
+        The settings are merged into the existing ones, and the changes
+        are added to the change feed with an ``event`` of None.
+
+        Parameters
+        ----------
+        settings : dict
+           The settings to change.
+        """
+        self._check_writable()
+        previous = copy.deepcopy(self.data)
+        update(self.data, settings)
+        self._unpublished += tuple(diff_project(previous, self.data))
+        # Analyses inherit project-wide settings, so their indexes may be stale
+        self.reindex()
         self.save()
 
-    def delete_event(self, event_name):
+    def _cache_event(self, event):
         """
-        Remove an event from the ledger.
+        Keep the object for an event which has just been updated, so that
+        it is returned the next time the event is requested.
+        """
+        if getattr(event, "ledger", None) is self:
+            self._all_events.add(event)
+        else:
+            self._all_events.discard(event.name)
+
+    def invalidate(self, event_name, previous=None):
+        """
+        Discard any cached object for an event, so that it is rebuilt
+        from the ledger data the next time that it is requested.
 
         Parameters
         ----------
         event_name : str
-           The name of the event to remove from the ledger.
+           The name of the event.
+        previous : dict, optional
+           The event's data before it was changed in place.
+           If it is given the changes are added to the change feed when
+           the ledger is next saved.
         """
-        event = self.events.pop(event_name)
-        if "trash" not in self.data:
-            self.data["trash"] = {}
-        if "events" not in self.data["trash"]:
-            self.data["trash"]["events"] = {}
-        self.data["trash"]["events"][event_name] = event
-        self.save()
+        self._all_events.discard(event_name)
+        self._reindex_event(event_name)
+        if previous is not None:
+            self._unpublished += tuple(
+                diff_event(event_name, previous, self.events.get(event_name))
+            )
 
-    def save(self):
+    @property
+    def index(self):
         """
-        Update the ledger YAML file with the data from the various events.
+        The indexes of the analyses in the ledger.
 
-        Notes
-        -----
-        The save function checks the difference between the default values for each production and event
-        before saving them, in order to attempt to reduce the duplication within the ledger.
+        These are built when they are first needed, and are then kept up
+        to date as events are changed.
+        The metadata paths listed in the ``ledger>indexes`` setting are
+        indexed in addition to the status, pipeline, job id, and review
+        status of each analysis.
+        """
+        if self._index is None:
+            paths = [
+                path.strip()
+                for path in config.get("ledger", "indexes").split(",")
+                if path.strip()
+            ]
+            self._index = LedgerIndex(self, paths=paths)
+        return self._index
 
+    @property
+    def dependency_graph(self):
+        """
+        The dependency graph of all of the analyses in the ledger.
 
+        This is built when it is first needed, and is then kept up to date
+        as events are changed, so the analyses which are ready to run can
+        be found without building any events; see
+        `asimov.dag.ProjectGraph.ready_analyses`.
         """
-        self.data["events"] = list(self.events.values())
-        with set_directory(config.get("project", "root")):
-            # First produce a backup of the ledger
-            shutil.copy(self.location, self.location + ".bak")
-            with open(self.location + "_tmp", "w") as ledger_file:
-                ledger_file.write(yaml.dump(self.data, default_flow_style=False))
-                ledger_file.flush()
-                # os.fsync(ledger_file.fileno())
-            os.replace(self.location + "_tmp", self.location)
+        if self._graph is None:
+            self._graph = ProjectGraph(self)
+        return self._graph
 
-    def add_event(self, event):
-        if "events" not in self.data:
-            self.data["events"] = []
+    def register_index(self, path):
+        """
+        Index a metadata path, so that analyses can be filtered on it quickly.
 
-        self.events[event.name] = event.to_dict()
-        self.save()
+        Parameters
+        ----------
+        path : str
+           The path, with nested keys separated by ``/``,
+           for example ``quality/minimum frequency``.
+        """
+        self.index.register(path)
+
+    def reindex(self):
+        """
+        Discard the indexes, so that they are rebuilt when they are next needed.
+
+        This is needed if project-wide settings, such as pipeline defaults,
+        which analyses inherit are changed.
+        """
+        self._index = None
+        self._graph = None
+
+    def _reindex_event(self, event_name):
+        """
+        Bring the indexes and the dependency graph up to date after the
+        data for an event has changed.
+        """
+        for index in (self._index, self._graph):
+            if index is None:
+                continue
+            if event_name in self.events:
+                index.update_event(event_name, self.events[event_name])
+            else:
+                index.remove_event(event_name)
+
+    def add_event(self, event):
+        self.update_event(event)
 
     def add_production(self, event, production):
         event.add_production(production)
-        self.events[event.name] = event.to_dict()
-        self.save()
+        self.update_event(event)
 
     def get_defaults(self):
         """
@@ -147,13 +543,87 @@ class YAMLLedger(Ledger):
             defaults["scheduler"] = self.data["scheduler"]
         return defaults
 
+    def _with_defaults(self, data):
+        """
+        Add the project-level defaults to an event which has just been read.
+
+        The event's own data is reused rather than copied, so it must not
+        be used anywhere else.
+        """
+        return merge(self.get_defaults(), data, owned=True)
+
     def get_event(self, event=None):
         if event:
-            kwargs = self.events[event]
-            kwargs.pop("ledger", None)
-            return [Event(**kwargs, ledger=self)]
+            return [self._all_events[event]]
         else:
-            return self._all_events
+            return list(self._all_events.values())
+
+    def get_summaries(self, event=None):
+        """
+        Summarise the analyses for one or all of the events in the ledger,
+        without building the events.
+
+        Parameters
+        ----------
+        event : str, optional
+           The name of the event.
+           If no event is given every event is summarised.
+
+        Returns
+        -------
+        dict
+           A list of `asimov.summary.ProductionSummary` for each event,
+           keyed by the name of the event.
+
+        Raises
+        ------
+        KeyError
+           If there is no such event in the ledger.
+        """
+        names = [event] if event else list(self.events)
+        pipelines = self.data.get("pipelines") or {}
+        dirty = self._dirty if self._transaction_depth else {}
+        summaries = {}
+        for name in names:
+            if name in dirty:
+                # Changes which have not been written yet are only in the event object
+                summaries[name] = [
+                    ProductionSummary.from_production(production)
+                    for production in dirty[name].productions
+                ]
+            else:
+                summaries[name] = summarise_event(self.events[name], pipelines)
+        return summaries
+
+    def validate(self, event=None):
+        """
+        Check one or all of the events in the ledger, and their analyses,
+        against the schema in `asimov.schema`.
+
+        Parameters
+        ----------
+        event : str, optional
+           The name of the event.
+           If no event is given every event is checked.
+
+        Returns
+        -------
+        dict
+           The problems found with each event which has any, keyed by the
+           name of the event; see `asimov.schema.validate_event`.
+
+        Raises
+        ------
+        KeyError
+           If there is no such event in the ledger.
+        """
+        names = [event] if event else list(self.events)
+        problems = {}
+        for name in names:
+            found = validate_event(self.events[name])
+            if found:
+                problems[name] = found
+        return problems
 
     def get_productions(self, event=None, filters=None):
         """Get a list of productions either for a single event or for all events.
@@ -167,31 +637,92 @@ class YAMLLedger(Ledger):
 
         filters : dict
            A dictionary of parameters to filter on.
+           Values can be an `asimov.index.Range` in order to select
+           a range of numeric values.
 
         Examples
         --------
-        FIXME: Add docs.
+        Find all of the running bilby analyses for events in the first
+        day of O3
+
+        >>> from asimov.index import Range
+        >>> ledger.get_productions(
+        ...     filters={
+        ...         "status": "running",
+        ...         "pipeline": "bilby",
+        ...         "event time": Range(1238166018, 1238252418),
+        ...     }
+        ... )
 
+        Notes
+        -----
+        Filters on indexed fields (see `Ledger.index`) are looked up in the
+        indexes, and only the events which contain matching analyses are
+        loaded; any other filters are then checked for each of these analyses.
         """
+        filters = dict(filters) if filters else {}
+        indexed = {}
+        if filters:
+            indexed = {
+                parameter: filters.pop(parameter)
+                for parameter in list(filters.keys())
+                if self.index.can_query(parameter, filters[parameter])
+            }
 
-        if event:
-            productions = self.get_event(event).productions
-        else:
-            productions = []
-            for event_i in self.get_event():
-                for production in event_i.productions:
-                    productions.append(production)
+        if not indexed:
+            if event:
+                productions = self.get_event(event)[0].productions
+            else:
+                productions = []
+                for event_i in self.get_event():
+                    for production in event_i.productions:
+                        productions.append(production)
+            return self._filter_productions(productions, filters)
+
+        if event and event not in self.events:
+            raise KeyError(event)
+
+        dirty = self._dirty if self._transaction_depth else {}
+        names = collections.defaultdict(set)
+        for event_name, name in self.index.query(indexed, event=event or None):
+            if event_name not in dirty:
+                names[event_name].add(name)
+        # Events with changes which have not been written yet are not
+        # reflected in the indexes, so are checked directly.
+        for event_name, event_o in dirty.items():
+            if not event or event_name == event:
+                names[event_name] = {
+                    production.name
+                    for production in self._filter_productions(
+                        event_o.productions, indexed
+                    )
+                }
+
+        productions = []
+        for event_name in sorted(
+            names, key=lambda name: self.index.order.get(name, len(self.index.order))
+        ):
+            productions += [
+                production
+                for production in self._all_events[event_name].productions
+                if production.name in names[event_name]
+            ]
+        return self._filter_productions(productions, filters)
+
+    @staticmethod
+    def _filter_productions(productions, filters):
+        """
+        Select the productions which match all of a set of filters.
+        """
 
         def apply_filter(productions, parameter, value):
-            productions = filter(
-                lambda x: x.meta[parameter] == value
-                if (parameter in x.meta)
-                else (
-                    getattr(x, parameter) == value if hasattr(x, parameter) else False
-                ),
-                productions,
-            )
-            return productions
+            def check(production):
+                try:
+                    return matches(production_value(production, parameter), value)
+                except KeyError:
+                    return False
+
+            return filter(check, productions)
 
         if filters:
             for parameter, value in filters.items():
@@ -199,6 +730,821 @@ class YAMLLedger(Ledger):
         return list(productions)
 
 
+class EventCache(collections.abc.Mapping):
+    """
+    A mapping between event names and event objects, where each event
+    object is only constructed from the ledger data when it is first
+    requested.
+
+    Parameters
+    ----------
+    ledger : `asimov.ledger.Ledger`
+       The ledger which the events belong to.
+    size : int, optional
+       The maximum number of event objects to keep.
+       Once this is exceeded the least recently used event is discarded,
+       and will be rebuilt from the ledger data if it is requested again.
+       If this is 0 or None the number of objects is not limited.
+    """
+
+    def __init__(self, ledger, size=None):
+        self.ledger = ledger
+        self.size = size
+        self._events = collections.OrderedDict()
+
+    def __getitem__(self, name):
+        if name in self._events:
+            self._events.move_to_end(name)
+            return self._events[name]
+        # An event changed inside an open transaction must not be
+        # rebuilt from the ledger data until the change is written.
+        if name in getattr(self.ledger, "_dirty", {}):
+            event = self.ledger._dirty[name]
+            self.add(event)
+            return event
+        kwargs = dict(self.ledger.events[name])
+        kwargs.pop("ledger", None)
+        event = Event(**kwargs, ledger=self.ledger)
+        # The new object is built from the current ledger data
+        getattr(self.ledger, "_bases", {}).pop(name, None)
+        self.add(event)
+        return event
+
+    def __iter__(self):
+        return iter(self.ledger.events)
+
+    def __len__(self):
+        return len(self.ledger.events)
+
+    def add(self, event):
+        """
+        Store an event object, discarding the least recently used
+        event if the cache is full.
+
+        Parameters
+        ----------
+        event : `asimov.event.Event`
+           The event to store.
+        """
+        self._events[event.name] = event
+        self._events.move_to_end(event.name)
+        while self.size and len(self._events) > self.size:
+            self._events.popitem(last=False)
+
+    def loaded(self, name):
+        """
+        Check if an object has been built for an event.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        """
+        return name in self._events
+
+    def names(self):
+        """
+        List the events which have had objects built for them.
+        """
+        return list(self._events)
+
+    def discard(self, name):
+        """
+        Remove an event object from the cache if it is present.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        """
+        self._events.pop(name, None)
+
+
+class YAMLLedger(Ledger):
+    """
+    A ledger which is stored in a YAML file.
+
+    Changes to individual events are appended to a journal next to the
+    ledger file, which is replayed over the ledger file when it is
+    loaded, and folded back into it once it contains more than
+    ``ledger>journal threshold`` records, or when the ledger is saved.
+
+    Several asimov processes can safely use the same ledger.
+    Each write to the ledger takes an advisory lock for just long enough
+    to read any changes which other processes have written since the
+    ledger was loaded, merge them with this process's changes, and append
+    the result.
+    Every write increases the ledger's version, which is stored in the
+    ledger file and in each journal record, so that changes which have
+    already been read are not applied twice.
+    """
+
+    def __init__(self, location=None):
+        if not location:
+            location = os.path.join(".asimov", "ledger.yml")
+        self.location = location
+        self.cache = LedgerCache(
+            location, enabled=config.getboolean("ledger", "parsed cache")
+        )
+        self.lock = FileLock(
+            os.path.abspath(location + ".lock"),
+            timeout=config.getfloat("ledger", "lock timeout"),
+        )
+        # The versions of events which were changed by other processes
+        # after this process built an object for them
+        self._bases = {}
+        # The versions of events which this process has changed in place,
+        # from before they were changed, until the changes are written
+        self._edits = {}
+
+        self.data = self.cache.load()
+        self._file_stat = self._stat()
+        self.version = self._version(self.data)
+
+        self.data["events"] = [
+            self._with_defaults(event) for event in self.data["events"]
+        ]
+        self.events = {ev["name"]: ev for ev in self.data["events"]}
+        self._all_events = EventCache(
+            self, size=config.getint("ledger", "event cache")
+        )
+        self.data.pop("events")
+        self._data_base = copy.deepcopy(self.data)
+
+        self.journal = LedgerJournal(self.location + ".journal")
+        for record in self.journal.records():
+            self._apply_record(record)
+
+    @classmethod
+    def create(cls, name, location=None):
+        if not location:
+            location = os.path.join(".asimov", "ledger.yml")
+        data = {}
+        data["asimov"] = {}
+        data["asimov"]["version"] = asimov.__version__
+        data["events"] = []
+        data["project"] = {}
+        data["project"]["name"] = name
+        with open(location, "w") as ledger_file:
+            ledger_file.write(yaml.dump(data, default_flow_style=False, Dumper=Dumper))
+
+    @staticmethod
+    def _version(data):
+        """
+        Find the version of a ledger file's contents.
+        """
+        return data.get("asimov", {}).get("ledger version", 0)
+
+    def _stat(self):
+        """
+        Identify the current version of the ledger file on disk.
+        """
+        status = os.stat(self.location)
+        return status.st_size, status.st_mtime_ns, status.st_ino
+
+    def _replace_event(self, name, data):
+        """
+        Replace an event with a version written by another process.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        data : dict
+           The new dictionary representation of the event, or None
+           if the event has been removed.
+        """
+        if self._all_events.loaded(name) and name not in self._bases:
+            self._bases[name] = self.events.get(name)
+        if name in self._edits:
+            data = self._merge_edits(name, data)
+        if data is None:
+            if name in self.events:
+                self._trash_event(name, archived=True)
+        else:
+            self.events[name] = data
+            self._reindex_event(name)
+
+    def _merge_edits(self, name, data):
+        """
+        Combine the changes which this process has made to an event in
+        place with a version of it which was written by another process.
+
+        Parameters
+        ----------
+        name : str
+           The name of the event.
+        data : dict
+           The version written by the other process, or None if the
+           event has been removed.
+
+        Returns
+        -------
+        dict
+           The combined representation of the event, or None if it was
+           removed by the other process and has not been changed by this one.
+        """
+        base = self._edits[name]
+        merged, conflicts = merge_three_way(
+            MISSING if base is None else base,
+            self.events.get(name, MISSING),
+            MISSING if data is None else data,
+        )
+        if conflicts:
+            logger.warning(
+                f"{name} was also changed by another process; "
+                f"keeping this process's values of {self._paths(conflicts)}"
+            )
+        # Later versions from other processes are merged with this one
+        self._edits[name] = data
+        return None if merged is MISSING else merged
+
+    def invalidate(self, event_name, previous=None):
+        """
+        Discard any cached object for an event, so that it is rebuilt
+        from the ledger data the next time that it is requested.
+
+        Parameters
+        ----------
+        event_name : str
+           The name of the event.
+        previous : dict, optional
+           The event's data before it was changed in place.
+           If it is given the changes are added to the change feed when
+           the ledger is next saved, and are merged with any changes
+           which other processes write to the event before then.
+        """
+        if previous is not None:
+            self._edits.setdefault(event_name, previous)
+        super().invalidate(event_name, previous=previous)
+
+    def _apply_record(self, record):
+        """
+        Apply a journal record to the in-memory copy of the ledger.
+
+        Records which are older than the ledger's version have already
+        been applied, and are skipped.
+
+        Parameters
+        ----------
+        record : dict
+           The journal record.
+        """
+        if "version" in record:
+            if record["version"] <= self.version:
+                return
+            self.version = record["version"]
+        if record["action"] == "update":
+            self._replace_event(
+                record["event"],
+                self._with_defaults(record["data"]),
+            )
+        elif record["action"] == "delete":
+            self._replace_event(record["event"], None)
+
+    def _refresh(self):
+        """
+        Bring the in-memory copy of the ledger up to date with any changes
+        which other processes have written since it was loaded.
+
+        This should only be called while the ledger is locked.
+        """
+        rewritten = self._stat() != self._file_stat
+        if rewritten:
+            # Another process has re-written the ledger file
+            data = self.cache.load()
+            self._file_stat = self._stat()
+            events = data.pop("events", None) or []
+            merged, conflicts = merge_three_way(self._data_base, self.data, data)
+            if conflicts:
+                logger.warning(
+                    "The project settings were also changed by another process; "
+                    f"keeping this process's values of {self._paths(conflicts)}"
+                )
+            self._data_base = copy.deepcopy(data)
+            self.data.clear()
+            self.data.update(merged)
+            self.version = self._version(data)
+
+            events = {
+                event["name"]: self._with_defaults(event) for event in events
+            }
+            for name in list(self.events.keys()) + list(events.keys()):
+                if self.events.get(name) != events.get(name):
+                    self._replace_event(name, events.get(name))
+
+        # Re-writing the ledger file empties the journal, so it must then be
+        # read from the start; otherwise only the new records are read
+        for record in self.journal.records(new=not rewritten):
+            self._apply_record(record)
+
+    @staticmethod
+    def _paths(conflicts):
+        return ", ".join("/".join(str(key) for key in path) for path in conflicts)
+
+    def _merge_event(self, event):
+        """
+        Find the dictionary representation of an event which should be
+        written to the ledger, combining the changes made to it by this
+        process with those made by any other process.
+
+        Parameters
+        ----------
+        event : `asimov.event.Event`
+           The event.
+
+        Returns
+        -------
+        dict
+           The representation of the event, or `MISSING` if the event
+           was deleted by another process and has not been changed by
+           this one.
+        """
+        ours = event.to_dict()
+        if event.name not in self._bases:
+            return ours
+        base = self._bases.pop(event.name)
+        merged, conflicts = merge_three_way(
+            MISSING if base is None else base,
+            ours,
+            self.events.get(event.name, MISSING),
+        )
+        if conflicts:
+            logger.warning(
+                f"{event.name} was also changed by another process; "
+                f"keeping this process's values of {self._paths(conflicts)}"
+            )
+        if merged != ours:
+            # The event object does not have the other process's changes
+            self._bases[event.name] = ours
+        return merged
+
+    def _record(self, *records):
+        """
+        Add records to the ledger's journal, and compact the journal
+        if it has grown too long.
+
+        This should only be called while the ledger is locked.
+
+        Parameters
+        ----------
+        *records : dict
+           The journal records.
+        """
+        for record in records:
+            self.version += 1
+            record["version"] = self.version
+        with set_directory(config.get("project", "root")):
+            self.journal.append(*records)
+        if len(self.journal) >= config.getint("ledger", "journal threshold"):
+            self.save()
+
+    def _store_events(self, events):
+        """
+        Journal the changes to a list of events in a single append.
+        """
+        with self.lock:
+            self._refresh()
+            records = []
+            changes = []
+            for event in events:
+                data = self._merge_event(event)
+                if data is MISSING:
+                    self._all_events.discard(event.name)
+                    continue
+                changes += diff_event(event.name, self.events.get(event.name), data)
+                self.events[event.name] = data
+                self._edits.pop(event.name, None)
+                self._cache_event(event)
+                self._reindex_event(event.name)
+                records.append(
+                    {
+                        "action": "update",
+                        "event": event.name,
+                        "data": data,
+                    }
+                )
+            if records:
+                self._record(*records)
+            self._publish(changes)
+
+    def delete_event(self, event_name):
+        """
+        Remove an event from the ledger.
+
+        Parameters
+        ----------
+        event_name : str
+           The name of the event to remove from the ledger.
+        """
+        self._check_writable()
+        with self.lock:
+            self._refresh()
+            self._bases.pop(event_name, None)
+            self._edits.pop(event_name, None)
+            changes = diff_event(event_name, self.events[event_name], None)
+            self._trash_event(event_name)
+            self._record({"action": "delete", "event": event_name})
+            self._publish(changes)
+
+    def _save(self):
+        """
+        Update the ledger YAML file with the data from the various events.
+
+        Notes
+        -----
+        The save function checks the difference between the default values for each production and event
+        before saving them, in order to attempt to reduce the duplication within the ledger.
+
+        Saving the ledger writes a complete copy of the project, and so
+        any records in the journal are discarded once it has been written.
+        """
+        with self.lock:
+            self._refresh()
+            self._move_to_archive()
+            self.version += 1
+            self.data.setdefault("asimov", {})["ledger version"] = self.version
+            data = dict(self.data)
+            data["events"] = list(self.events.values())
+            with set_directory(config.get("project", "root")):
+                # First produce a backup of the ledger
+                shutil.copy(self.location, self.location + ".bak")
+                text = yaml.dump(data, default_flow_style=False, Dumper=Dumper)
+                with open(self.location + "_tmp", "w") as ledger_file:
+                    ledger_file.write(text)
+                    ledger_file.flush()
+                    # os.fsync(ledger_file.fileno())
+                os.replace(self.location + "_tmp", self.location)
+                self.cache.store(data, text)
+                self.journal.truncate()
+                self._file_stat = self._stat()
+            self._data_base = copy.deepcopy(self.data)
+            self._edits.clear()
+
+    def compact(self):
+        """
+        Fold the journal back into the ledger file if it contains any records.
+        """
+        if len(self.journal) > 0:
+            self.save()
+
+
+class ShardedEvents(collections.abc.MutableMapping):
+    """
+    A mapping between event names and the dictionary representations of
+    events in a sharded ledger.
+
+    Each event is read from its file when it is first requested, and is
+    written to its file as soon as it is assigned.
+
+    Parameters
+    ----------
+    ledger : `asimov.ledger.ShardedYAMLLedger`
+       The ledger which the events belong to.
+    """
+
+    suffix = ".yml"
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.loaded = {}
+
+    def path(self, name):
+        """
+        The path to the file for an event.
+        """
+        return os.path.join(self.ledger.directory, f"{name}{self.suffix}")
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            try:
+                with open(self.path(name), "r") as shard:
+                    data = yaml.load(shard, Loader=Loader)
+            except FileNotFoundError:
+                raise KeyError(name)
+            self.loaded[name] = self.ledger._with_defaults(data)
+        return self.loaded[name]
+
+    def __setitem__(self, name, data):
+        path = self.path(name)
+        with open(path + "_tmp", "w") as shard:
+            shard.write(yaml.dump(data, default_flow_style=False, Dumper=Dumper))
+        os.replace(path + "_tmp", path)
+        self.loaded[name] = data
+
+    def __delitem__(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            raise KeyError(name)
+        self.loaded.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self.loaded or os.path.exists(self.path(name))
+
+    def __iter__(self):
+        return iter(
+            sorted(
+                filename[: -len(self.suffix)]
+                for filename in os.listdir(self.ledger.directory)
+                if filename.endswith(self.suffix)
+            )
+        )
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+class ShardedYAMLLedger(Ledger):
+    """
+    A ledger which stores each event in its own YAML file.
+
+    The project-wide data is kept in a small manifest file, and each event
+    is kept in a file named after it in the ``events`` directory next to
+    the manifest.
+    Changing an event only re-writes that event's file, and events are
+    only read when they are first requested.
+
+    Parameters
+    ----------
+    location : str, optional
+       The path to the manifest file.
+       Defaults to ``.asimov/project.yml``.
+    """
+
+    def __init__(self, location=None):
+        if not location:
+            location = os.path.join(".asimov", "project.yml")
+        self.location = os.path.abspath(location)
+        self.directory = os.path.join(os.path.dirname(self.location), "events")
+        with open(self.location, "r") as manifest:
+            self.data = yaml.load(manifest, Loader=Loader)
+        self.events = ShardedEvents(self)
+        self._all_events = EventCache(
+            self, size=config.getint("ledger", "event cache")
+        )
+
+    @classmethod
+    def create(cls, name, location=None):
+        if not location:
+            location = os.path.join(".asimov", "project.yml")
+        data = {}
+        data["asimov"] = {}
+        data["asimov"]["version"] = asimov.__version__
+        data["project"] = {}
+        data["project"]["name"] = name
+        os.makedirs(
+            os.path.join(os.path.dirname(os.path.abspath(location)), "events"),
+            exist_ok=True,
+        )
+        with open(location, "w") as manifest:
+            manifest.write(yaml.dump(data, default_flow_style=False, Dumper=Dumper))
+        return cls(location)
+
+    @classmethod
+    def from_yaml(cls, yaml_location, location=None):
+        """
+        Split a single-file YAML ledger into a sharded ledger.
+
+        Parameters
+        ----------
+        yaml_location : str
+           The path to the YAML ledger.
+        location : str, optional
+           The path to the new manifest file.
+           Defaults to ``.asimov/project.yml``.
+
+        Returns
+        -------
+        `asimov.ledger.ShardedYAMLLedger`
+           The new ledger.
+        """
+        return cls.from_ledger(YAMLLedger(yaml_location), location=location)
+
+    def _write_manifest(self):
+        with open(self.location + "_tmp", "w") as manifest:
+            manifest.write(
+                yaml.dump(self.data, default_flow_style=False, Dumper=Dumper)
+            )
+        os.replace(self.location + "_tmp", self.location)
+
+    def _store_events(self, events):
+        """
+        Re-write the files for a list of changed events.
+        """
+        changes = []
+        for event in events:
+            data = event.to_dict()
+            changes += diff_event(event.name, self.events.get(event.name), data)
+            self.events[event.name] = data
+            self._cache_event(event)
+            self._reindex_event(event.name)
+        self._publish(changes)
+
+    def delete_event(self, event_name):
+        """
+        Remove an event from the ledger.
+
+        Parameters
+        ----------
+        event_name : str
+           The name of the event to remove from the ledger.
+        """
+        self._check_writable()
+        changes = diff_event(event_name, self.events[event_name], None)
+        self._trash_event(event_name)
+        self._publish(changes)
+
+    def _save(self):
+        """
+        Write the manifest, and any events which have been read, to their files.
+        """
+        self._move_to_archive()
+        self._write_manifest()
+        for name, event in list(self.events.loaded.items()):
+            self.events[name] = event
+
+
+class SQLiteEvents(collections.abc.MutableMapping):
+    """
+    A mapping between event names and the dictionary representations of
+    events in an SQLite ledger.
+
+    Events are read from the database when they are first requested, and
+    are written to the database as soon as they are assigned.
+
+    Parameters
+    ----------
+    ledger : `asimov.ledger.SQLiteLedger`
+       The ledger which the events belong to.
+    """
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            self.loaded[name] = self.ledger._with_defaults(
+                self.ledger.db.get_event(name)
+            )
+        return self.loaded[name]
+
+    def __setitem__(self, name, data):
+        self.ledger.db.store_event(data)
+        self.loaded[name] = data
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.ledger.db.delete_event(name)
+        self.loaded.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self.loaded or name in self.ledger.db.event_names()
+
+    def __iter__(self):
+        return iter(self.ledger.db.event_names())
+
+    def __len__(self):
+        return len(self.ledger.db.event_names())
+
+
+class SQLiteLedger(Ledger):
+    """
+    A ledger which is stored in an SQLite database.
+
+    Productions are stored in their own table, so that they can be found by
+    their event, status, pipeline, or job id without loading every event in
+    the project.
+
+    Parameters
+    ----------
+    location : str, optional
+       The path to the database file.
+       Defaults to ``.asimov/ledger.db``.
+    """
+
+    def __init__(self, location=None):
+        if not location:
+            location = os.path.join(".asimov", "ledger.db")
+        self.location = location
+        self.db = asimov.database.AsimovSQLiteDatabase(location)
+        self.data = self.db.get_project()
+        self.events = SQLiteEvents(self)
+        self._all_events = EventCache(
+            self, size=config.getint("ledger", "event cache")
+        )
+
+    @classmethod
+    def create(cls, name, location=None):
+        if not location:
+            location = os.path.join(".asimov", "ledger.db")
+        database = asimov.database.AsimovSQLiteDatabase._create(location)
+        data = {}
+        data["asimov"] = {}
+        data["asimov"]["version"] = asimov.__version__
+        data["project"] = {}
+        data["project"]["name"] = name
+        database.store_project(data)
+        return cls(location)
+
+    @classmethod
+    def from_yaml(cls, yaml_location, location=None):
+        """
+        Create an SQLite ledger containing the contents of a YAML ledger.
+
+        Parameters
+        ----------
+        yaml_location : str
+           The path to the YAML ledger.
+        location : str, optional
+           The path to the new database file.
+           Defaults to ``.asimov/ledger.db``.
+
+        Returns
+        -------
+        `asimov.ledger.SQLiteLedger`
+           The new ledger.
+        """
+        return cls.from_ledger(YAMLLedger(yaml_location), location=location)
+
+    def _store_events(self, events):
+        """
+        Write a list of changed events to the database in a single transaction.
+        """
+        data = [event.to_dict() for event in events]
+        changes = []
+        for event, event_data in zip(events, data):
+            changes += diff_event(event.name, self.events.get(event.name), event_data)
+        self.db.store_events(data)
+        for event, event_data in zip(events, data):
+            self.events.loaded[event.name] = event_data
+            self._cache_event(event)
+            self._reindex_event(event.name)
+        self._publish(changes)
+
+    def delete_event(self, event_name):
+        """
+        Remove an event from the ledger.
+
+        Parameters
+        ----------
+        event_name : str
+           The name of the event to remove from the ledger.
+        """
+        self._check_writable()
+        changes = diff_event(event_name, self.events[event_name], None)
+        self._trash_event(event_name)
+        self._publish(changes)
+
+    def _open_archive(self):
+        return SQLiteArchive(self.db)
+
+    def _save(self):
+        """
+        Write the project data, and any events which have been read, to the database.
+        """
+        self._move_to_archive()
+        self.db.store_project(self.data)
+        self.db.store_events(list(self.events.loaded.values()))
+
+    def get_productions(self, event=None, filters=None):
+        """Get a list of productions either for a single event or for all events.
+
+        Filters on the event, status, pipeline, or job id of a production
+        are looked-up in the database, and only the events which contain
+        matching productions are loaded.
+
+        Parameters
+        ----------
+        event : str
+           The name of the event to pull productions from.
+           Optional; if no event is specified then all of the productions are
+           returned.
+
+        filters : dict
+           A dictionary of parameters to filter on.
+        """
+        filters = dict(filters) if filters else {}
+        indexed = {
+            key: filters.pop(key)
+            for key in list(filters.keys())
+            if key in self.db.production_columns
+        }
+        if event:
+            indexed["event"] = event
+
+        productions = []
+        for event_name, name in self.db.query_productions(**indexed):
+            productions += [
+                production
+                for production in self._all_events[event_name].productions
+                if production.name == name
+            ]
+        return self._filter_productions(productions, filters)
+
+
 class DatabaseLedger(Ledger):
     """
     Use a document database to store the ledger.
@@ -0,0 +1,103 @@
+"""
+Advisory locks for files which are shared between asimov processes.
+
+The locks are held using ``flock``, so they are released automatically if
+the process holding them exits, and they are only respected by other
+processes which also use them.
+"""
+
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Locking is not available on this platform
+    fcntl = None
+
+
+class LockTimeout(Exception):
+    """
+    The lock could not be acquired within the timeout.
+    """
+
+
+class FileLock:
+    """
+    An exclusive advisory lock on a file.
+
+    The lock is re-entrant, so code which already holds the lock can
+    acquire it again without blocking itself.
+
+    Parameters
+    ----------
+    location : str
+       The path to the lock file.
+       This is created if it does not exist.
+    timeout : float, optional
+       The number of seconds to wait for the lock before raising
+       `LockTimeout`.
+       If this is None, wait indefinitely.
+
+    Examples
+    --------
+    >>> with FileLock(".asimov/ledger.yml.lock"):
+    ...     ledger.save()
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, location, timeout=None):
+        self.location = location
+        self.timeout = timeout
+        self.depth = 0
+        self._handle = None
+
+    def acquire(self):
+        """
+        Acquire the lock, waiting for other processes to release it.
+        """
+        if self.depth == 0:
+            handle = open(self.location, "a")
+            if fcntl:
+                start = time.monotonic()
+                while True:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if (
+                            self.timeout is not None
+                            and time.monotonic() - start > self.timeout
+                        ):
+                            handle.close()
+                            raise LockTimeout(
+                                f"Could not lock {self.location} within {self.timeout} seconds"
+                            )
+                        time.sleep(self.poll_interval)
+            self._handle = handle
+        self.depth += 1
+
+    def release(self):
+        """
+        Release the lock.
+        """
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl:
+                fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+
+    @property
+    def locked(self):
+        """
+        True if this process holds the lock.
+        """
+        return self.depth > 0
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
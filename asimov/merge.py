@@ -0,0 +1,152 @@
+"""
+Merging and comparing the nested dictionaries which make up the ledger.
+
+The ledger is made up of plain data: dictionaries, lists, strings and
+numbers.
+The functions here make use of this, rather than relying on
+`copy.deepcopy`, which has to allow for any kind of object, and they
+avoid visiting parts of the data which cannot have changed.
+
+When the same object appears in two versions of the data, as happens when
+an analysis has not changed since the ledger was last written, it is
+known to be unchanged without having to compare its contents.
+Data which has just been read from a file is not used anywhere else, so
+its branches can be reused in a merged result by reference rather than
+being copied; see the ``owned`` argument of `merge`.
+"""
+
+import collections.abc
+import datetime
+from copy import deepcopy
+
+# Values of these types can't be changed, so they never need to be copied
+_IMMUTABLE = (
+    str,
+    bytes,
+    int,
+    float,
+    complex,
+    bool,
+    type(None),
+    datetime.date,
+    datetime.time,
+    datetime.timedelta,
+)
+
+_ABSENT = object()
+
+
+def copy_tree(value):
+    """
+    Copy a nested structure of plain data.
+
+    This gives the same result as `copy.deepcopy` for dictionaries, lists
+    and scalars, but is several times faster; any other objects are copied
+    using `copy.deepcopy`.
+
+    Parameters
+    ----------
+    value : object
+       The data to copy.
+    """
+    if isinstance(value, _IMMUTABLE):
+        return value
+    if type(value) is dict:
+        return {key: copy_tree(item) for key, item in value.items()}
+    if type(value) is list:
+        return [copy_tree(item) for item in value]
+    return deepcopy(value)
+
+
+def _merged(lower, value, copy, owned):
+    if isinstance(value, collections.abc.Mapping):
+        if not isinstance(lower, collections.abc.Mapping):
+            if owned:
+                # Nothing needs to be merged into it, so it can be reused
+                return value
+            lower = {}
+        return merge(lower, value, copy=copy, owned=owned)
+    return copy_tree(value) if copy and not owned else value
+
+
+def merge(base, changes, copy=True, owned=False):
+    """
+    Recursively merge one dictionary into another, producing a new dictionary.
+
+    This gives the same result as ``asimov.utils.update(base, changes,
+    inplace=False)``: dictionaries which appear in both are merged, and any
+    other value in ``changes`` replaces the one in ``base``.
+    Neither input is changed.
+
+    Parameters
+    ----------
+    base : dict
+       The dictionary to merge into.
+    changes : dict
+       The dictionary to merge.
+    copy : bool, optional
+       If true, the default, the result is independent of the inputs.
+       If false, values which are only in one of the inputs are not copied,
+       so the result shares them with the inputs and should not be changed
+       in place; only the dictionaries which appear in both inputs are
+       visited.
+    owned : bool, optional
+       If true, ``changes`` is not used anywhere else, for example
+       because it has just been read from a file, and the result takes
+       it over: values which are only in ``changes`` are reused by
+       reference instead of being copied, so only the dictionaries which
+       appear in both inputs and the values from ``base`` are visited.
+       ``changes`` should not be used again afterwards.
+
+    Returns
+    -------
+    dict
+       The merged dictionary.
+    """
+    merged = {}
+    for key, value in base.items():
+        if key in changes:
+            merged[key] = _merged(value, changes[key], copy, owned)
+        else:
+            merged[key] = copy_tree(value) if copy else value
+    for key, value in changes.items():
+        if key not in merged:
+            merged[key] = _merged(_ABSENT, value, copy, owned)
+    return merged
+
+
+def diff(old, new):
+    """
+    Find the values in a dictionary which have been added or changed.
+
+    This gives the same result as `asimov.utils.diff_dict`, but values
+    which are the same object in both dictionaries are skipped without
+    being compared.
+
+    Parameters
+    ----------
+    old : dict
+       The original dictionary.
+    new : dict
+       The changed dictionary.
+
+    Returns
+    -------
+    dict
+       The values in ``new`` which are not in ``old``, or which differ
+       from it, with nested dictionaries only containing the keys which
+       differ.
+       Keys which have been removed are not included.
+    """
+    changes = {}
+    for key, value in new.items():
+        before = old.get(key, _ABSENT)
+        if before is value or (before is not _ABSENT and before == value):
+            continue
+        if isinstance(before, dict) and isinstance(value, dict):
+            nested = diff(before, value)
+            if nested:
+                changes[key] = nested
+        else:
+            changes[key] = value
+    return changes
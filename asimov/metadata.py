@@ -0,0 +1,310 @@
+"""
+Layered views of the metadata for an analysis.
+
+The metadata for an analysis is built up from several layers: the
+defaults for its pipeline, the project-wide settings, the metadata for
+its event, and finally the settings given for the analysis itself.
+Rather than copying and merging all of these for every analysis, a
+`LayeredMetadata` looks keys up through the layers, and only records
+changes in the analysis's own layer, so that the settings which belong
+to the analysis can be written back to the ledger without having to
+separate them from the defaults again.
+"""
+
+import collections.abc
+from copy import deepcopy
+
+from asimov.utils import MISSING
+
+
+class _Deleted:
+    """
+    Marks a key which has been removed from the analysis, but which is
+    still present in one of the lower layers.
+    """
+
+    def __repr__(self):
+        return "DELETED"
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return "DELETED"
+
+
+DELETED = _Deleted()
+
+
+class LayeredMetadata(collections.abc.MutableMapping):
+    """
+    A dictionary which looks up keys through a stack of layers.
+
+    Values in higher layers take precedence over those in lower layers.
+    Where the value of a key is a dictionary in more than one layer, the
+    dictionaries are merged, so that, for example, the ``quality``
+    settings for an event can add to those from the pipeline defaults.
+    Changes are only ever made to the top layer, so the lower layers,
+    which are shared with the ledger, are never modified.
+
+    Lists which are read from a lower layer are copied into the top
+    layer, so that they can be changed safely.
+
+    The ``version`` of the metadata is increased whenever it is changed,
+    or a list or dictionary which could be changed is read from it, so
+    that anything derived from the metadata can tell when it needs to be
+    worked out again.
+    A list or dictionary which is kept after it has been read can still
+    be changed without the version increasing, so an unchanged version
+    does not guarantee that the metadata is unchanged.
+
+    Parameters
+    ----------
+    layers : list of dict
+       The lower layers, starting with the lowest.
+    overrides : dict, optional
+       The top layer.
+    """
+
+    def __init__(self, layers=(), overrides=None, parent=None, key=None):
+        self.layers = list(layers)
+        self._overrides = {} if overrides is None and parent is None else overrides
+        self._parent = parent
+        self._key = key
+        self.version = 0
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def _changed(self):
+        """
+        Record that the metadata may have been changed.
+        """
+        root = self
+        while root._parent is not None:
+            root = root._parent
+        root.version += 1
+
+    def _top(self, create=False):
+        """
+        Find the top layer, creating it in the parent if needed.
+        """
+        if self._parent is None:
+            return self._overrides
+        parent = self._parent._top(create)
+        if parent is None:
+            return None
+        value = parent.get(self._key, MISSING)
+        if isinstance(value, dict):
+            return value
+        if create:
+            parent[self._key] = {}
+            return parent[self._key]
+        return None
+
+    def _resolve(self, key, lower=False):
+        """
+        Find the values of a key in each layer, starting with the highest,
+        which contribute to its value.
+        """
+        values = []
+        top = None if lower else self._top()
+        sources = ([top] if top is not None else []) + self.layers[::-1]
+        for source in sources:
+            value = source.get(key, MISSING)
+            if value is MISSING:
+                continue
+            if value is DELETED:
+                break
+            if values and not isinstance(value, dict):
+                # Values beneath a dictionary which are not dictionaries are hidden
+                break
+            values.append(value)
+            if not isinstance(value, dict):
+                break
+        return values
+
+    def _get(self, key, lower=False, copy=True):
+        values = self._resolve(key, lower)
+        if not values:
+            raise KeyError(key)
+        value = values[0]
+        top = None if lower else self._top()
+        owned = top is not None and top.get(key, MISSING) is value
+        if isinstance(value, dict):
+            if owned and len(values) == 1:
+                if copy:
+                    self._changed()
+                return value
+            if lower:
+                return LayeredMetadata(values[::-1], overrides={})
+            layers = values[:0:-1] if owned else values[::-1]
+            return LayeredMetadata(layers, parent=self, key=key)
+        if copy and isinstance(value, (list, set)):
+            if not owned:
+                value = deepcopy(value)
+                self._top(create=True)[key] = value
+            self._changed()
+        return value
+
+    def __getitem__(self, key):
+        return self._get(key)
+
+    def __setitem__(self, key, value):
+        if isinstance(value, LayeredMetadata):
+            value = value.to_dict()
+        if isinstance(value, dict):
+            # Assigning a dictionary replaces the one in the lower layers,
+            # rather than being merged with it.
+            value = _mask(value, self.inherited(key))
+        self._top(create=True)[key] = value
+        self._changed()
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._changed()
+        top = self._top(create=True)
+        if any(key in layer for layer in self.layers):
+            top[key] = DELETED
+        else:
+            top.pop(key)
+
+    def pop(self, key, default=MISSING):
+        try:
+            value = self._get(key, copy=False)
+        except KeyError:
+            if default is MISSING:
+                raise
+            return default
+        if isinstance(value, LayeredMetadata):
+            value = value.to_dict()
+        elif isinstance(value, (list, set)):
+            # The value may still belong to a lower layer
+            value = type(value)(value)
+        del self[key]
+        return value
+
+    def __contains__(self, key):
+        return bool(self._resolve(key))
+
+    def __iter__(self):
+        top = self._top() or {}
+        keys = dict.fromkeys(key for layer in self.layers + [top] for key in layer)
+        return (key for key in keys if key in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def top_layer(self):
+        """
+        Find the top layer, which holds the values set for the analysis.
+
+        The layer is returned without being copied, and must not be changed.
+
+        Returns
+        -------
+        dict
+           The top layer, or an empty dictionary if it does not exist yet.
+        """
+        top = self._top()
+        return {} if top is None else top
+
+    def lookup(self, key, default=None):
+        """
+        Find the value of a key without copying it into the top layer.
+
+        Unlike looking the key up directly this does not change the
+        ``version`` of the metadata, so the value must not be changed.
+
+        Parameters
+        ----------
+        key : str
+           The key.
+        default : optional
+           The value to return if the key is not present.
+        """
+        try:
+            return self._get(key, copy=False)
+        except KeyError:
+            return default
+
+    def inherited(self, key, default=None):
+        """
+        Find the value which a key would have without the top layer.
+
+        Parameters
+        ----------
+        key : str
+           The key.
+        default : optional
+           The value to return if no lower layer contains the key.
+        """
+        try:
+            return self._get(key, lower=True, copy=False)
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """
+        Produce a dictionary with the merged contents of every layer.
+        """
+        output = {}
+        for key in self:
+            value = self._get(key, copy=False)
+            if isinstance(value, LayeredMetadata):
+                output[key] = value.to_dict()
+            else:
+                output[key] = deepcopy(value)
+        return output
+
+    def overrides(self):
+        """
+        Produce a dictionary of the values in the top layer which differ
+        from those in the lower layers.
+
+        Returns
+        -------
+        dict
+           The overridden values, with nested dictionaries only containing
+           the keys which differ.
+        """
+        top = self._top()
+        if not top:
+            return {}
+        output = {}
+        for key, value in top.items():
+            if value is DELETED:
+                continue
+            if isinstance(value, dict):
+                nested = self._get(key, copy=False)
+                if isinstance(nested, LayeredMetadata):
+                    # Only keep the parts of the dictionary which differ
+                    changes = nested.overrides()
+                    if changes:
+                        output[key] = changes
+                else:
+                    output[key] = deepcopy(value)
+                continue
+            lower = self.inherited(key, MISSING)
+            if lower is MISSING or value != lower:
+                output[key] = deepcopy(value)
+        return output
+
+
+def _mask(value, lower):
+    """
+    Hide the keys in the lower layers which are not in a new dictionary.
+    """
+    if not isinstance(lower, LayeredMetadata):
+        return value
+    masked = dict(value)
+    for key in lower:
+        if key not in masked:
+            masked[key] = DELETED
+        elif isinstance(masked[key], dict):
+            masked[key] = _mask(masked[key], lower._get(key, copy=False))
+    return masked
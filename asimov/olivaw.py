@@ -18,6 +18,7 @@ from asimov.cli import (  # NoQA
     application,
     configuration,
     event,
+    ledger,
     manage,
     monitor,
     production,
@@ -64,3 +65,5 @@ olivaw.add_command(production.production)
 # Review commands
 olivaw.add_command(review.review)
 olivaw.add_command(application.apply)
+# Ledger management commands
+olivaw.add_command(ledger.ledger)
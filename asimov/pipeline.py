@@ -11,7 +11,7 @@ warnings.filterwarnings("ignore", module="htcondor")
 
 import htcondor  # NoQA
 
-from asimov import utils  # NoQA
+from asimov import condor, utils  # NoQA
 from asimov import config, logger, logging, LOGGER_LEVEL  # NoQA
 
 import otter  # NoQA
@@ -152,6 +152,15 @@ class Pipeline:
         for asset in self.assets:
             repo.add_file(asset[0], asset[1])
 
+    def asset_locations(self):
+        """
+        List the directories in which this job's assets are found.
+
+        The assets are only collected again once one of these directories
+        has changed; see `asimov.assets.AssetCache`.
+        """
+        return [self.production.rundir]
+
     def collect_logs(self):
         return {}
 
@@ -483,17 +492,7 @@ class PESummaryPipeline(PostPipeline):
                 with open("pesummary.sub", "w") as subfile:
                     subfile.write(hostname_job.__str__())
 
-            try:
-                # There should really be a specified submit node, and if there is, use it.
-                schedulers = htcondor.Collector().locate(
-                    htcondor.DaemonTypes.Schedd, config.get("condor", "scheduler")
-                )
-                schedd = htcondor.Schedd(schedulers)
-            except:  # NoQA
-                # If you can't find a specified scheduler, use the first one you find
-                schedd = htcondor.Schedd()
-            with schedd.transaction() as txn:
-                cluster_id = hostname_job.queue(txn)
+            cluster_id = condor.submit_job(submit_description)
 
         else:
             cluster_id = 0
@@ -476,6 +476,25 @@ class BayesWave(Pipeline):
 
         return outputs
 
+    def asset_locations(self):
+        """
+        List the directories in which this job's assets are found.
+        """
+        locations = [self.production.rundir]
+        locations += [
+            os.path.join(results_dir, "post", "clean")
+            for results_dir in sorted(glob.glob(f"{self.production.rundir}/trigtime_*"))
+        ]
+        locations.append(
+            os.path.join(
+                self.production.event.repository.directory,
+                self.production.category,
+                "psds",
+                f"{self.production.meta['likelihood']['sample rate']}",
+            )
+        )
+        return locations
+
     def supress_psd(self, ifo, fmin, fmax):
         """
         Suppress portions of a PSD.
@@ -264,6 +264,12 @@ class Bilby(Pipeline):
         """
         return {"samples": self.samples()}
 
+    def asset_locations(self):
+        """
+        List the directories in which this job's assets are found.
+        """
+        return [self.production.rundir, os.path.join(self.production.rundir, "result")]
+
     def samples(self, absolute=False):
         """
         Collect the combined samples file for PESummary.
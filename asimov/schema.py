@@ -0,0 +1,403 @@
+"""
+Checks of the structure of the event and analysis descriptions in a project.
+
+The settings which asimov relies on are described by a declarative
+schema, which is compiled once into a set of validators, so that an
+entire document can be checked in a single pass.
+This allows broken descriptions to be rejected when they are applied to
+the project, or before analyses are built, rather than causing a failure
+part way through building or submitting a job.
+
+The results for each document are cached against a hash of its contents,
+so documents which have not changed since they were last checked are not
+checked again.
+"""
+
+import collections
+import collections.abc
+import hashlib
+import numbers
+
+_TYPE_NAMES = {
+    str: "a string",
+    numbers.Number: "a number",
+    collections.abc.Mapping: "a mapping",
+    list: "a list",
+    int: "an integer",
+    type(None): "empty",
+}
+
+
+class ValidationError(ValueError):
+    """
+    A description of an event or analysis does not match the schema.
+
+    Parameters
+    ----------
+    name : str
+       The name of the event or analysis.
+    errors : list of str
+       The problems which were found.
+    """
+
+    def __init__(self, name, errors):
+        self.name = name
+        self.errors = list(errors)
+        super().__init__(f"{name} is not valid: " + "; ".join(self.errors))
+
+
+class Field:
+    """
+    The description of a single setting.
+
+    Parameters
+    ----------
+    types : type or tuple of types
+       The types which the value may have.
+       ``numbers.Number`` accepts integers and floats, but not booleans.
+    required : bool, optional
+       Whether the setting must be present.
+    fields : dict, optional
+       The `Field` for each key of a mapping.
+       Keys which are not listed are not checked.
+    values : `Field`, optional
+       The field which every value of a mapping must match.
+    items : `Field`, optional
+       The field which every item of a list must match.
+    choices : callable, optional
+       A function returning the allowed values, which is called when the
+       field is checked, so that the choices can change at runtime.
+       Strings are compared with the choices regardless of case.
+    minimum : number, optional
+       The smallest value allowed for a number.
+    """
+
+    def __init__(
+        self,
+        types,
+        required=False,
+        fields=None,
+        values=None,
+        items=None,
+        choices=None,
+        minimum=None,
+    ):
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.required = required
+        self.fields = fields or {}
+        self.values = values
+        self.items = items
+        self.choices = choices
+        self.minimum = minimum
+
+    def compile(self, path):
+        """
+        Build a function which checks a value against this field.
+
+        Parameters
+        ----------
+        path : str
+           The location of the field in the document, used in the messages.
+
+        Returns
+        -------
+        callable
+           A function which takes a value and a list, and adds a message
+           to the list for each problem which it finds.
+        """
+        types = self.types
+        allows_numbers = numbers.Number in types
+        expected = " or ".join(_TYPE_NAMES.get(kind, kind.__name__) for kind in types)
+        checks = []
+
+        if self.fields:
+            fields = [
+                (key, field.required, field.compile(f"{path}/{key}"))
+                for key, field in self.fields.items()
+            ]
+
+            def check_fields(value, errors):
+                if not isinstance(value, collections.abc.Mapping):
+                    return
+                for key, required, check in fields:
+                    if key in value:
+                        check(value[key], errors)
+                    elif required:
+                        errors.append(f"{path}/{key} is required")
+
+            checks.append(check_fields)
+
+        if self.values:
+            check_value = self.values.compile(f"{path}/*")
+
+            def check_values(value, errors):
+                if not isinstance(value, collections.abc.Mapping):
+                    return
+                for item in value.values():
+                    check_value(item, errors)
+
+            checks.append(check_values)
+
+        if self.items:
+            check_item = self.items.compile(f"{path}[]")
+
+            def check_items(value, errors):
+                if not isinstance(value, list):
+                    return
+                for item in value:
+                    check_item(item, errors)
+
+            checks.append(check_items)
+
+        if self.choices:
+            choices = self.choices
+
+            def check_choices(value, errors):
+                allowed = choices()
+                if isinstance(value, str):
+                    found = value.lower() in {choice.lower() for choice in allowed}
+                else:
+                    found = value in allowed
+                if not found:
+                    errors.append(
+                        f"{path} must be one of {', '.join(sorted(allowed))}, "
+                        f"not {value}"
+                    )
+
+            checks.append(check_choices)
+
+        if self.minimum is not None:
+            minimum = self.minimum
+
+            def check_minimum(value, errors):
+                if isinstance(value, numbers.Number) and value < minimum:
+                    errors.append(f"{path} must be at least {minimum}, not {value}")
+
+            checks.append(check_minimum)
+
+        def check(value, errors):
+            if isinstance(value, bool) and allows_numbers and bool not in types:
+                matched = False
+            else:
+                matched = isinstance(value, types)
+            if not matched:
+                errors.append(
+                    f"{path} should be {expected}, not {type(value).__name__}"
+                )
+                return
+            for nested in checks:
+                nested(value, errors)
+
+        return check
+
+
+class Schema:
+    """
+    A compiled description of a kind of document.
+
+    Parameters
+    ----------
+    name : str
+       The kind of document, used in the messages.
+    fields : dict
+       The `Field` for each setting in the document.
+    cache_size : int, optional
+       The number of documents whose results are kept.
+    """
+
+    def __init__(self, name, fields, cache_size=4096):
+        self.name = name
+        self.fields = fields
+        self.cache_size = cache_size
+        self._check = Field(collections.abc.Mapping, fields=fields).compile(name)
+        self._results = collections.OrderedDict()
+
+    def extend(self, name, fields):
+        """
+        Make a new schema with some of the fields of this one replaced.
+
+        Parameters
+        ----------
+        name : str
+           The kind of document.
+        fields : dict
+           The fields to add or replace.
+        """
+        return Schema(name, dict(self.fields, **fields), cache_size=self.cache_size)
+
+    @staticmethod
+    def _digest(document):
+        return hashlib.sha1(repr(document).encode()).hexdigest()
+
+    def validate(self, document):
+        """
+        Find all of the problems with a document.
+
+        Parameters
+        ----------
+        document : dict
+           The document.
+
+        Returns
+        -------
+        list of str
+           A description of each problem; the list is empty if the
+           document is valid.
+        """
+        digest = self._digest(document)
+        if digest in self._results:
+            self._results.move_to_end(digest)
+            return list(self._results[digest])
+        errors = []
+        self._check(document, errors)
+        self._results[digest] = tuple(errors)
+        if len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+        return errors
+
+    def check(self, document, name=None):
+        """
+        Check a document, raising an exception if it is not valid.
+
+        Parameters
+        ----------
+        document : dict
+           The document.
+        name : str, optional
+           The name of the event or analysis, for the exception.
+           Defaults to the ``name`` in the document.
+
+        Raises
+        ------
+        ValidationError
+           If there are any problems with the document.
+        """
+        errors = self.validate(document)
+        if errors:
+            raise ValidationError(name or document.get("name", self.name), errors)
+
+
+def _pipelines():
+    from asimov.pipelines import known_pipelines
+
+    return known_pipelines.keys()
+
+
+_NUMBER = Field(numbers.Number)
+_STRING = Field(str)
+_MAPPING = Field(collections.abc.Mapping)
+_FREQUENCIES = Field(collections.abc.Mapping, values=Field(numbers.Number, minimum=0))
+_CHANNELS = Field(collections.abc.Mapping, values=_STRING)
+
+# Settings which can be given for an event, or overridden for an analysis
+SHARED_FIELDS = {
+    "event time": _NUMBER,
+    "interferometers": Field(list, items=_STRING),
+    "data": Field(
+        collections.abc.Mapping,
+        fields={
+            "calibration": _CHANNELS,
+            "channels": _CHANNELS,
+            "frame types": _CHANNELS,
+            "segment length": Field(numbers.Number, minimum=0),
+            "data files": _MAPPING,
+        },
+    ),
+    "quality": Field(
+        collections.abc.Mapping,
+        fields={
+            "minimum frequency": _FREQUENCIES,
+            "maximum frequency": _FREQUENCIES,
+            "state vector": _CHANNELS,
+        },
+    ),
+    "likelihood": Field(
+        collections.abc.Mapping,
+        fields={
+            "sample rate": Field(numbers.Number, minimum=1),
+            "roll off time": Field(numbers.Number, minimum=0),
+            "marginalization": _MAPPING,
+        },
+    ),
+    "priors": _MAPPING,
+    "waveform": _MAPPING,
+    "sampler": _MAPPING,
+    "scheduler": _MAPPING,
+    "psds": _MAPPING,
+}
+
+EVENT = Schema(
+    "event",
+    dict(
+        SHARED_FIELDS,
+        name=Field(str, required=True),
+        repository=Field((str, type(None))),
+        **{
+            "working directory": _STRING,
+            "productions": Field(list, items=_MAPPING),
+        },
+    ),
+)
+"""The schema for an event, as it is applied to a project."""
+
+ANALYSIS = Schema(
+    "analysis",
+    dict(
+        SHARED_FIELDS,
+        name=Field(str, required=True),
+        event=_STRING,
+        pipeline=Field(str, required=True, choices=_pipelines),
+        status=_STRING,
+        comment=Field((str, type(None))),
+        # A single analysis can be given without a list
+        needs=Field((list, str, type(None)), items=_STRING),
+        review=Field((list, type(None)), items=_MAPPING),
+        rundir=_STRING,
+        **{"job id": Field((int, str, type(None)))},
+    ),
+)
+"""The schema for an analysis, as it is applied to a project."""
+
+LEDGER_ANALYSIS = ANALYSIS.extend(
+    "analysis",
+    {"name": Field(str), "status": Field(str, required=True)},
+)
+"""The schema for an analysis in the ledger, where its name is the key of its entry."""
+
+
+def validate_event(event):
+    """
+    Check an event from the ledger, and each of its analyses.
+
+    Parameters
+    ----------
+    event : dict
+       The dictionary representation of the event.
+
+    Returns
+    -------
+    dict
+       The problems which were found with the event, under None, and with
+       each analysis, under its name.
+       Only the event and analyses with problems are included.
+    """
+    problems = {}
+    details = {key: value for key, value in event.items() if key != "productions"}
+    errors = EVENT.validate(details)
+    productions = event.get("productions") or []
+    if not isinstance(productions, list):
+        errors.append("event/productions should be a list")
+        productions = []
+    if errors:
+        problems[None] = errors
+    for entry in productions:
+        if not isinstance(entry, collections.abc.Mapping) or not entry:
+            problems.setdefault(None, []).append(
+                "event/productions should only contain analyses"
+            )
+            continue
+        name, analysis = next(iter(entry.items()))
+        errors = LEDGER_ANALYSIS.validate(analysis or {})
+        if errors:
+            problems[name] = errors
+    return problems
@@ -0,0 +1,148 @@
+"""
+Brief summaries of the analyses in the project ledger.
+
+Commands which only list analyses need their names, pipelines, and
+statuses, rather than fully built `asimov.event.Production` objects, which
+also set up their pipelines and look up their PSDs.
+These summaries are built directly from the dictionary representations of
+the events in the ledger.
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+from asimov.dag import FINISHED_STATES, DependencyGraph
+from asimov.index import review_status
+
+
+class ProductionSummary(NamedTuple):
+    """
+    The fields of an analysis which are needed to list it.
+    """
+
+    event: str
+    name: str
+    pipeline: str
+    status: str
+    job_id: Optional[int]
+    review: Optional[str]
+    dependencies: Tuple[str, ...]
+
+    @property
+    def finished(self):
+        """
+        Whether the analysis has finished; see `asimov.event.Production.finished`.
+        """
+        return self.status in FINISHED_STATES
+
+    @classmethod
+    def from_dict(cls, event, entry, pipelines=None):
+        """
+        Summarise an analysis from its entry in the ledger.
+
+        Parameters
+        ----------
+        event : dict
+           The dictionary representation of the event.
+        entry : dict
+           The entry for the analysis in the event's ``productions`` list.
+        pipelines : dict, optional
+           The project's pipeline defaults, which analyses inherit from.
+        """
+        name, details = list(entry.items())[0]
+        if not isinstance(details, dict):
+            name, details = entry.get("name", name), entry
+        details = details or {}
+        pipeline = str(details.get("pipeline", "")).lower()
+        sources = (details, event, (pipelines or {}).get(pipeline) or {})
+
+        def inherited(key):
+            for source in sources:
+                if key in source:
+                    return source[key]
+            return None
+
+        status = details.get("status")
+        needs = inherited("needs") or ()
+        if isinstance(needs, str):
+            needs = (needs,)
+        return cls(
+            event=event["name"],
+            name=name,
+            pipeline=pipeline,
+            status=str(status).lower() if status else "none",
+            job_id=inherited("job id"),
+            review=review_status(details.get("review")),
+            dependencies=tuple(needs),
+        )
+
+    @classmethod
+    def from_production(cls, production):
+        """
+        Summarise an analysis which has already been built.
+
+        Parameters
+        ----------
+        production : `asimov.event.Production`
+           The analysis.
+        """
+        return cls(
+            event=production.event.name,
+            name=production.name,
+            pipeline=production.pipeline.name.lower(),
+            status=production.status,
+            job_id=production.job_id,
+            review=production.review.status,
+            dependencies=tuple(production.dependencies or ()),
+        )
+
+
+def summarise_event(event, pipelines=None):
+    """
+    Summarise all of the analyses for an event.
+
+    Parameters
+    ----------
+    event : dict
+       The dictionary representation of the event.
+    pipelines : dict, optional
+       The project's pipeline defaults, which analyses inherit from.
+
+    Returns
+    -------
+    list of `ProductionSummary`
+       The analyses, in the order they appear in the ledger.
+    """
+    return [
+        ProductionSummary.from_dict(event, entry, pipelines)
+        for entry in event.get("productions") or []
+    ]
+
+
+def latest(summaries):
+    """
+    Find the analyses which are not blocked by an unfinished analysis
+    that they depend on.
+
+    This follows `asimov.event.Event.get_all_latest`, where an analysis can
+    only depend on analyses which appear before it in the ledger.
+
+    Parameters
+    ----------
+    summaries : list of `ProductionSummary`
+       The analyses for a single event.
+
+    Returns
+    -------
+    list of `ProductionSummary`
+       The unfinished analyses which are not waiting on another analysis.
+    """
+    graph = DependencyGraph()
+    analyses = []
+    for summary in summaries:
+        if summary.name in graph:
+            # Analysis names are unique within an event
+            continue
+        dependencies = [name for name in summary.dependencies if name in graph]
+        graph.add(summary.name, dependencies, finished=summary.finished)
+        analyses.append(summary)
+    return [summary for summary in analyses if summary.name in graph.ready]
@@ -2,12 +2,12 @@ import collections
 import glob
 import os
 from contextlib import contextmanager
-from copy import deepcopy
 from pathlib import Path
 
 import numpy as np
 
 from asimov import logger
+from asimov.merge import diff, merge
 
 
 @contextmanager
@@ -67,10 +67,13 @@ def find_calibrations(time):
 
 
 def update(d, u, inplace=True):
-    """Recursively update a dictionary."""
+    """Recursively update a dictionary.
+
+    If ``inplace`` is False a new dictionary is returned, and neither
+    input is changed; see `asimov.merge.merge`.
+    """
     if not inplace:
-        d = deepcopy(d)
-        u = deepcopy(u)
+        return merge(d, u)
     for k, v in u.items():
         if isinstance(v, collections.abc.Mapping):
             d[k] = update(d.get(k, {}), v)
@@ -79,16 +82,13 @@ def update(d, u, inplace=True):
     return d
 
 
-# The following function adapted from https://stackoverflow.com/a/69908295
 def diff_dict(d1, d2):
-    d1_keys = set(d1.keys())
-    d2_keys = set(d2.keys())
-    shared_keys = d1_keys.intersection(d2_keys)
-    shared_deltas = {o: (d1[o], d2[o]) for o in shared_keys if d1[o] != d2[o]}
-    added_keys = d2_keys - d1_keys
-    added_deltas = {o: (None, d2[o]) for o in added_keys}
-    deltas = {**shared_deltas, **added_deltas}
-    return parse_deltas(deltas)
+    """
+    Find the values in ``d2`` which are not in ``d1``, or which differ from it.
+
+    See `asimov.merge.diff`.
+    """
+    return diff(d1, d2)
 
 
 # The following function adapted from https://stackoverflow.com/a/69908295
@@ -96,9 +96,102 @@ def parse_deltas(deltas: dict):
     res = {}
     for k, v in deltas.items():
         if isinstance(v[0], dict):
-            tmp = diff_dict(v[0], v[1])
+            tmp = diff(v[0], v[1])
             if tmp:
                 res[k] = tmp
         else:
             res[k] = v[1]
     return res
+
+
+MISSING = object()
+
+
+def _named_list(value):
+    """
+    Check if a value is a list of dictionaries whose first keys are distinct,
+    such as the list of productions for an event.
+    """
+    if not isinstance(value, list):
+        return False
+    keys = []
+    for item in value:
+        if not (isinstance(item, dict) and item):
+            return False
+        keys.append(next(iter(item)))
+    return len(set(keys)) == len(keys)
+
+
+def merge_three_way(base, ours, theirs, path=()):
+    """
+    Combine two sets of changes which were made independently to the same data.
+
+    Dictionaries are merged key-by-key, and lists of dictionaries with
+    distinct first keys (such as the productions of an event) are merged
+    by those keys.
+    Where both sets of changes alter the same value differently our value
+    is kept, and the change is reported as a conflict.
+
+    Parameters
+    ----------
+    base : object
+       The data which both sets of changes were made to.
+    ours : object
+       The data with our changes.
+    theirs : object
+       The data with their changes.
+
+    Any of these may be `MISSING` if the data does not exist in that version.
+
+    Returns
+    -------
+    merged : object
+       The combined data, or `MISSING` if the data has been removed.
+    conflicts : list
+       The paths of the values which both sets of changes altered.
+    """
+    if ours is theirs or theirs is base:
+        return ours, []
+    if ours is base:
+        return theirs, []
+    if ours == theirs or theirs == base:
+        return ours, []
+    if ours == base:
+        return theirs, []
+
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged = {}
+        conflicts = []
+        for key in list(ours.keys()) + [key for key in theirs if key not in ours]:
+            value, found = merge_three_way(
+                base.get(key, MISSING),
+                ours.get(key, MISSING),
+                theirs.get(key, MISSING),
+                path + (key,),
+            )
+            conflicts += found
+            if value is not MISSING:
+                merged[key] = value
+        return merged, conflicts
+
+    if _named_list(ours) and _named_list(theirs):
+        base = base if _named_list(base) else []
+        base, ours, theirs = (
+            {next(iter(item)): item for item in items} for items in (base, ours, theirs)
+        )
+        merged = []
+        conflicts = []
+        for key in list(ours.keys()) + [key for key in theirs if key not in ours]:
+            value, found = merge_three_way(
+                base.get(key, MISSING),
+                ours.get(key, MISSING),
+                theirs.get(key, MISSING),
+                path,
+            )
+            conflicts += found
+            if value is not MISSING:
+                merged.append(value)
+        return merged, conflicts
+
+    return ours, [path]
@@ -0,0 +1,205 @@
+"""
+Micro-benchmarks of merging and comparing ledger data.
+
+Compares `asimov.merge` with the recursive update and diff functions
+which it replaced, using data shaped like the events in a large ledger.
+
+Usage:
+
+    python scripts/benchmark_merge.py [--productions N] [--repeat N]
+"""
+
+import argparse
+import collections.abc
+import timeit
+from copy import deepcopy
+
+from asimov.merge import diff, merge
+
+
+def reference_update(d, u, inplace=True):
+    """The recursive update from asimov.utils before asimov.merge."""
+    if not inplace:
+        d = deepcopy(d)
+        u = deepcopy(u)
+    for k, v in u.items():
+        if isinstance(v, collections.abc.Mapping):
+            d[k] = reference_update(d.get(k, {}), v)
+        else:
+            d[k] = v
+    return d
+
+
+def reference_diff_dict(d1, d2):
+    """The dictionary diff from asimov.utils before asimov.merge."""
+    d1_keys = set(d1.keys())
+    d2_keys = set(d2.keys())
+    shared_keys = d1_keys.intersection(d2_keys)
+    shared_deltas = {o: (d1[o], d2[o]) for o in shared_keys if d1[o] != d2[o]}
+    added_keys = d2_keys - d1_keys
+    added_deltas = {o: (None, d2[o]) for o in added_keys}
+    deltas = {**shared_deltas, **added_deltas}
+    res = {}
+    for k, v in deltas.items():
+        if isinstance(v[0], dict):
+            tmp = reference_diff_dict(v[0], v[1])
+            if tmp:
+                res[k] = tmp
+        else:
+            res[k] = v[1]
+    return res
+
+
+def defaults():
+    """Project defaults like those in a production ledger."""
+    return {
+        "data": {
+            "channels": {ifo: f"{ifo}:GDS-CALIB_STRAIN_CLEAN" for ifo in "H1 L1 V1".split()},
+            "frame types": {ifo: f"{ifo}_HOFT_C01" for ifo in "H1 L1 V1".split()},
+            "segment length": 4,
+        },
+        "likelihood": {"sample rate": 4096, "roll off time": 0.4},
+        "priors": {
+            name: {"minimum": 0, "maximum": 1, "type": "Uniform"}
+            for name in (
+                "chirp mass",
+                "mass ratio",
+                "luminosity distance",
+                "spin 1",
+                "spin 2",
+                "tilt 1",
+                "tilt 2",
+                "phi 12",
+                "phi jl",
+            )
+        },
+        "quality": {"minimum frequency": {ifo: 20 for ifo in "H1 L1 V1".split()}},
+        "scheduler": {"accounting group": "ligo.dev.o4.cbc.pe.bilby"},
+    }
+
+
+def event(productions):
+    """An event with a number of analyses."""
+    return {
+        "name": "S000000xx",
+        "event time": 1126259462.391,
+        "interferometers": ["H1", "L1", "V1"],
+        "repository": "checkouts/S000000xx",
+        "working directory": "working/S000000xx",
+        "priors": {"luminosity distance": {"maximum": 2000}},
+        "quality": {"minimum frequency": {"V1": 30}},
+        "productions": [
+            {
+                f"Prod{number}": {
+                    "pipeline": "bilby",
+                    "status": "finished",
+                    "comment": "Parameter estimation",
+                    "needs": ["Prod0"] if number else [],
+                    "waveform": {"approximant": "IMRPhenomXPHM"},
+                    "sampler": {"nlive": 1000, "nact": 10},
+                    "review": [
+                        {
+                            "status": "APPROVED",
+                            "message": "Looks good",
+                            "timestamp": "2023-01-01 00:00:00.000",
+                        }
+                    ],
+                }
+            }
+            for number in range(productions)
+        ],
+    }
+
+
+def analyses(data):
+    """The analyses of an event, keyed by name."""
+    return {
+        name: details
+        for production in data["productions"]
+        for name, details in production.items()
+    }
+
+
+def changed(data, share):
+    """
+    Make a new version of the analyses of an event with one analysis
+    changed, either sharing the unchanged analyses with the old version,
+    as the ledger now does, or copying them.
+    """
+    new = dict(data) if share else deepcopy(data)
+    new["Prod0"] = dict(new["Prod0"], status="running")
+    return new
+
+
+def run(statement, repeat, **names):
+    times = timeit.repeat(statement, globals=names, number=1, repeat=repeat)
+    return min(times) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--productions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    base = defaults()
+    data = event(args.productions)
+    nested = analyses(data)
+    shared = changed(nested, share=True)
+    copied = changed(nested, share=False)
+
+    cases = [
+        (
+            "load an event over the defaults",
+            "reference_update(base, data, inplace=False)",
+            "merge(base, data)",
+            {},
+        ),
+        (
+            "load an event which was just read",
+            "reference_update(base, data, inplace=False)",
+            "merge(base, data, owned=True)",
+            {},
+        ),
+        (
+            "merge without copying",
+            "reference_update(base, data, inplace=False)",
+            "merge(base, data, copy=False)",
+            {},
+        ),
+        (
+            "diff, one analysis changed (shared)",
+            "reference_diff_dict(nested, new)",
+            "diff(nested, new)",
+            {"new": shared},
+        ),
+        (
+            "diff, one analysis changed (copied)",
+            "reference_diff_dict(nested, new)",
+            "diff(nested, new)",
+            {"new": copied},
+        ),
+    ]
+
+    print(f"{args.productions} analyses, best of {args.repeat}")
+    print(f"{'case':40} {'before':>10} {'after':>10} {'speed-up':>9}")
+    for name, reference, replacement, extra in cases:
+        names = dict(
+            reference_update=reference_update,
+            reference_diff_dict=reference_diff_dict,
+            merge=merge,
+            diff=diff,
+            base=base,
+            data=data,
+            nested=nested,
+            **extra,
+        )
+        before = run(reference, args.repeat, **names)
+        after = run(replacement, args.repeat, **names)
+        print(
+            f"{name:40} {before:8.3f}ms {after:8.3f}ms {before / after:8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ import shutil
 import git
 import asimov.event
 from asimov.cli.project import make_project
+from asimov import config
 from asimov.cli.application import apply_page
 from asimov.ledger import YAMLLedger
 from asimov.testing import AsimovTestCase
@@ -60,12 +61,15 @@ class EventTests(AsimovTestCase):
             update_page=True
         )
         event = self.ledger.events["S000000"]
-        self.assertTrue("version-1" in self.ledger.data.get("history", {}).get("S000000", {}))
-        history = self.ledger.data['history']['S000000']
-        self.assertEqual(history['version-1']['event time'],
+        versions = self.ledger.archive.versions("S000000")
+        self.assertEqual(versions[0]["version"], "version-1")
+        self.assertEqual(versions[0]["reason"], "updated")
+        history = self.ledger.archive.get("S000000", "version-1")
+        self.assertEqual(history['event time'],
                          900)
-        self.assertEqual(history['version-1']['priors']['luminosity distance']['maximum'], 1000)
-        self.assertTrue("date changed" in history['version-1'])
+        self.assertEqual(history['priors']['luminosity distance']['maximum'], 1000)
+        self.assertTrue("date" in versions[0])
+        self.assertFalse("history" in self.ledger.data)
         
     def test_event_update_not_applied_without_flag(self):
         apply_page(
@@ -89,6 +93,45 @@ class EventTests(AsimovTestCase):
         self.assertEqual(event['priors']['luminosity distance']['maximum'], 1000)
         self.assertEqual(event['priors']['mass ratio']['maximum'], 1.0)
 
+    def test_event_update_published(self):
+        """Check that updating an event adds the changes to the change feed."""
+        self.addCleanup(config.set, "ledger", "change feed", config.get("ledger", "change feed"))
+        config.set("ledger", "change feed", "True")
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        with self.ledger.changes.consume("test"):
+            pass
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event_update.yaml",
+            event="S000000",
+            ledger=self.ledger,
+            update_page=True
+        )
+        with self.ledger.changes.consume("test") as changes:
+            fields = {(change.event, change.field): change.new for change in changes}
+        self.assertEqual(fields[("S000000", "event time")], 909)
+        self.assertEqual(fields[("S000000", "priors/luminosity distance/maximum")], 1010)
+
+    def test_configuration_published(self):
+        """Check that changing the project settings adds them to the change feed."""
+        self.addCleanup(config.set, "ledger", "change feed", config.get("ledger", "change feed"))
+        config.set("ledger", "change feed", "True")
+        with self.ledger.changes.consume("test"):
+            pass
+        apply_page(
+            f"{self.cwd}/tests/test_data/testing_pe.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        with self.ledger.changes.consume("test") as changes:
+            fields = {change.field for change in changes}
+        self.assertTrue(all(change.event is None for change in changes))
+        self.assertIn("quality", fields)
+        self.assertIn("pipelines", fields)
+
         
 class DetcharTests(AsimovTestCase):
     """Tests to ensure that various detector characterisation related
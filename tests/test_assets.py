@@ -0,0 +1,63 @@
+"""
+Tests of the cache of the assets produced by analyses.
+"""
+
+import json
+import os
+from unittest.mock import patch
+
+from asimov.assets import asset_cache
+from asimov.cli.application import apply_page
+from asimov.testing import AsimovTestCase
+
+
+class AssetCacheTests(AsimovTestCase):
+    """
+    Tests that the assets of analyses are only collected when they change.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        self.production = self.ledger.get_event("S000000")[0].productions[0]
+        self.results = os.path.join(self.production.rundir, "result")
+        os.makedirs(self.results)
+        asset_cache.clear()
+
+    def test_collected_once(self):
+        """Check that the assets are only collected once if nothing has changed."""
+        pipeline = self.production.pipeline
+        with patch.object(
+            pipeline, "collect_assets", wraps=pipeline.collect_assets
+        ) as collect:
+            first = asset_cache.get(self.production)
+            second = asset_cache.get(self.production)
+        self.assertEqual(collect.call_count, 1)
+        self.assertEqual(first, {"samples": []})
+        self.assertEqual(first, second)
+
+    def test_collected_again_after_change(self):
+        """Check that new assets are found once the run directory changes."""
+        asset_cache.get(self.production)
+        samples = os.path.join(self.results, "S000000_merge_result.hdf5")
+        with open(samples, "w") as samples_file:
+            samples_file.write("")
+        self.assertEqual(asset_cache.get(self.production), {"samples": [samples]})
+
+    def test_persisted(self):
+        """Check that the cache is kept in the project directory."""
+        asset_cache.get(self.production)
+        with open(os.path.join(".asimov", "_cache_assets.json"), "r") as cache_file:
+            cached = json.load(cache_file)
+        self.assertEqual(
+            [entry["assets"] for entry in cached.values()], [{"samples": []}]
+        )
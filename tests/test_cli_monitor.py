@@ -0,0 +1,120 @@
+"""
+Tests of the monitor command.
+"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from asimov import config
+from asimov.cli.application import apply_page
+from asimov.cli.monitor import _run_postmonitor_hooks, stop
+from asimov.testing import AsimovTestCase
+
+
+class RecordingHook:
+    """A post-monitor hook which keeps the changes it is given."""
+
+    runs = []
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def run(self, changes):
+        self.runs.append(None if changes is None else list(changes))
+
+
+class FailingHook:
+    """A post-monitor hook which always fails."""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def run(self):
+        raise RuntimeError("The hook failed")
+
+
+class PostMonitorHookTests(AsimovTestCase):
+    """
+    Tests of the hooks which are run at the end of the monitor loop.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(config.set, "ledger", "change feed", config.get("ledger", "change feed"))
+        config.set("ledger", "change feed", "True")
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        self.ledger.data["hooks"] = {"postmonitor": {"recorder": {}, "failing": {}}}
+        RecordingHook.runs = []
+        hooks = [
+            SimpleNamespace(name="failing", load=lambda: FailingHook),
+            SimpleNamespace(name="recorder", load=lambda: RecordingHook),
+            SimpleNamespace(name="unused", load=lambda: FailingHook),
+        ]
+        patcher = patch("asimov.cli.monitor.entry_points", return_value=hooks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_changes(self):
+        """Check that a hook is given the changes made since it last ran."""
+        with self.assertLogs("asimov.cli.monitor", level="ERROR"):
+            _run_postmonitor_hooks(self.ledger)
+        self.assertEqual(len(RecordingHook.runs), 1)
+        self.assertIn("S000000", {change.event for change in RecordingHook.runs[0]})
+
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with self.assertLogs("asimov.cli.monitor", level="ERROR"):
+            _run_postmonitor_hooks(self.ledger)
+        self.assertEqual(
+            [(change.field, change.new) for change in RecordingHook.runs[1]],
+            [("status", "running")],
+        )
+
+    def test_without_feed(self):
+        """Check that a hook which accepts changes is given None if the feed is off."""
+        config.set("ledger", "change feed", "False")
+        with self.assertLogs("asimov.cli.monitor", level="ERROR"):
+            _run_postmonitor_hooks(self.ledger)
+        self.assertEqual(RecordingHook.runs, [None])
+
+    def test_failure_logged(self):
+        """Check that a failing hook is logged, and the other hooks still run."""
+        with self.assertLogs("asimov.cli.monitor", level="ERROR") as logs:
+            _run_postmonitor_hooks(self.ledger)
+        self.assertIn("The failing post-monitor hook failed", logs.output[0])
+        self.assertEqual(len(RecordingHook.runs), 1)
+
+
+class StopTests(AsimovTestCase):
+    """
+    Tests of stopping the monitor's cron job.
+    """
+
+    def stop(self, found):
+        self.ledger.data["cronjob"] = 42
+        with patch("asimov.cli.monitor.ledger", self.ledger):
+            with patch("asimov.condor.delete_job", return_value=found) as delete:
+                result = CliRunner().invoke(stop)
+        delete.assert_called_once_with(42)
+        return result.output
+
+    def test_stopped(self):
+        """Check that the cron job is reported as stopped once it is removed."""
+        self.assertIn("Asimov has been stopped", self.stop(True))
+
+    def test_not_found(self):
+        """Check that a cron job which no scheduler holds is not reported as stopped."""
+        output = self.stop(False)
+        self.assertNotIn("Asimov has been stopped", output)
+        self.assertIn("Could not find the asimov cronjob 42", output)
@@ -0,0 +1,59 @@
+"""
+Tests of the commands which handle productions.
+"""
+
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from asimov import config
+from asimov.cli import production
+from asimov.cli.application import apply_page
+from asimov.ledger import ShardedYAMLLedger, SQLiteLedger, YAMLLedger
+from asimov.testing import AsimovTestCase
+
+
+class ProductionCreateTests(AsimovTestCase):
+    """
+    Tests of adding productions from the command line.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        self.ledger.compact()
+        engine = config.get("ledger", "engine")
+        self.addCleanup(config.set, "ledger", "engine", engine)
+
+    def open_ledgers(self):
+        """Open the project's ledger with each of the engines."""
+        SQLiteLedger.from_yaml(".asimov/ledger.yml", location=".asimov/ledger.db")
+        ShardedYAMLLedger.from_yaml(
+            ".asimov/ledger.yml", location=".asimov/project.yml"
+        )
+        return {
+            "yamlfile": (YAMLLedger, ".asimov/ledger.yml"),
+            "sqlite": (SQLiteLedger, ".asimov/ledger.db"),
+            "sharded": (ShardedYAMLLedger, ".asimov/project.yml"),
+        }
+
+    def test_production_saved(self):
+        """Check that a new production is saved by every ledger engine."""
+        for engine, (engine_class, location) in self.open_ledgers().items():
+            with self.subTest(engine=engine):
+                config.set("ledger", "engine", engine)
+                with patch("asimov.cli.production.ledger", engine_class(location)):
+                    result = CliRunner().invoke(
+                        production.create, ["S000000", "bilby"]
+                    )
+                self.assertEqual(result.exit_code, 0, result.output)
+                self.assertIn("Production added to S000000", result.output)
+
+                event = engine_class(location).get_event("S000000")[0]
+                self.assertEqual(
+                    [analysis.name for analysis in event.productions], ["Prod0"]
+                )
@@ -1,7 +1,27 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
 import unittest
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import htcondor
 
 import asimov
 import asimov.condor
+from asimov.condor import (
+    CondorJob,
+    CondorJobList,
+    JobCache,
+    SchedulerRegistry,
+    cluster_constraints,
+    tracked_clusters,
+)
+from asimov.summary import ProductionSummary
 
 class CondorTests(unittest.TestCase):
 
@@ -36,3 +56,408 @@ class CondorTests(unittest.TestCase):
         job = asimov.condor.CondorJob.from_dict(dictionary)
 
         self.assertEqual(job.status, "Idle")
+
+
+class SchedulerRegistryTests(unittest.TestCase):
+    """Tests of finding and reusing condor schedulers."""
+
+    def setUp(self):
+        self.ads = [{"Name": "schedd1"}, {"Name": "schedd2"}]
+        self.collector = MagicMock()
+        self.collector.locate.side_effect = lambda kind, name: {"Name": name}
+        self.collector.locateAll.return_value = self.ads
+        self.local = MagicMock(name="local")
+        patches = [
+            patch("asimov.condor.htcondor.Collector", return_value=self.collector),
+            patch(
+                "asimov.condor.htcondor.Schedd",
+                side_effect=lambda ad=None: MagicMock(name=ad["Name"]) if ad else self.local,
+            ),
+            patch.object(
+                SchedulerRegistry,
+                "configured",
+                new_callable=PropertyMock,
+                return_value=None,
+            ),
+        ]
+        mocks = []
+        for patcher in patches:
+            mocks.append(patcher.start())
+            self.addCleanup(patcher.stop)
+        self.configured = mocks[2]
+        self.registry = SchedulerRegistry(ttl=600)
+
+    def test_located_once(self):
+        """Check that a scheduler is only looked up once within the TTL."""
+        self.configured.return_value = "schedd2"
+        for _ in range(3):
+            self.registry.run(lambda schedd: schedd)
+        self.assertEqual(self.collector.locate.call_count, 1)
+        self.assertEqual(self.collector.locateAll.call_count, 0)
+
+    def test_expired(self):
+        """Check that schedulers are looked up again once the TTL has passed."""
+        self.registry = SchedulerRegistry(ttl=0)
+        self.registry.locate_all()
+        self.registry.locate_all()
+        self.assertEqual(self.collector.locateAll.call_count, 2)
+
+    def test_handles_reused(self):
+        """Check that the same handle is given out for a scheduler."""
+        first = self.registry.schedd(self.ads[0])
+        self.assertIs(self.registry.schedd(self.ads[0]), first)
+
+    def test_fallback_remembered(self):
+        """Check that the scheduler which accepts a job is tried first next time."""
+        used = []
+
+        def action(schedd):
+            used.append(schedd)
+            if schedd is self.registry.schedd(self.ads[0]):
+                raise htcondor.HTCondorIOError("Cannot receive jobs")
+            return 42
+
+        self.assertEqual(self.registry.run(action, remember=True), 42)
+        self.assertEqual(self.registry.accepted, "schedd2")
+        self.assertFalse(self.registry.healthy("schedd1"))
+
+        used.clear()
+        self.registry.run(action, remember=True)
+        self.assertEqual(len(used), 1)
+
+    def test_no_scheduler(self):
+        """Check that an error is raised if no scheduler can be used."""
+
+        def action(schedd):
+            raise htcondor.HTCondorIOError("Cannot receive jobs")
+
+        with self.assertRaises(htcondor.HTCondorIOError):
+            self.registry.run(action)
+
+    def test_until(self):
+        """Check that the next scheduler is tried until a result is accepted."""
+        used = []
+
+        def action(schedd):
+            used.append(schedd)
+            return len(used)
+
+        self.assertEqual(self.registry.run(action, until=lambda result: result > 1), 2)
+        self.assertEqual(self.registry.run(action, until=lambda result: False), 4)
+        self.assertEqual(len(used), 4)
+
+    def removals(self, *found):
+        """Set the number of jobs which each scheduler finds to remove."""
+        for ad, number in zip(self.ads + [None], found):
+            schedd = self.registry.schedd(ad) if ad else self.local
+            schedd.act.return_value = {"TotalJobAds": number, "TotalSuccess": number}
+
+    def test_delete_job(self):
+        """Check that a job is removed from the scheduler which holds it."""
+        self.removals(0, 1, 0)
+        with patch("asimov.condor.schedulers", self.registry):
+            self.assertTrue(asimov.condor.delete_job(42))
+        self.registry.schedd(self.ads[1]).act.assert_called_once_with(
+            htcondor.JobAction.Remove, "ClusterId == 42"
+        )
+        self.local.act.assert_not_called()
+
+    def test_delete_job_local(self):
+        """Check that the local scheduler is asked if no other holds the job."""
+        self.removals(0, 0, 1)
+        with patch("asimov.condor.schedulers", self.registry):
+            self.assertTrue(asimov.condor.delete_job(42))
+        self.local.act.assert_called_once()
+
+        self.removals(0, 0, 0)
+        with patch("asimov.condor.schedulers", self.registry):
+            self.assertFalse(asimov.condor.delete_job(42))
+
+
+class RefreshTests(unittest.TestCase):
+    """Tests of polling several schedulers for jobs."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, ".asimov"))
+        os.chdir(self.directory)
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(os.chdir, self.cwd)
+
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        replies = {
+            "working": [
+                {"ClusterId": 1, "Cmd": "bilby", "CurrentHosts": 1, "JobStatus": 2}
+            ],
+            "broken": htcondor.HTCondorIOError("Connection refused"),
+            "slow": self.release,
+        }
+
+        self.constraints = []
+
+        def query(ad, constraint=None):
+            self.constraints.append((ad["Name"], constraint))
+            reply = replies[ad["Name"]]
+            if isinstance(reply, Exception):
+                raise reply
+            if reply is self.release:
+                self.release.wait(10)
+                return []
+            return reply
+
+        self.registry = SchedulerRegistry(ttl=600)
+        self.registry.locate_all = lambda: [{"Name": name} for name in replies]
+        for patcher in (
+            patch("asimov.condor.schedulers", self.registry),
+            patch.object(CondorJobList, "_query", staticmethod(query)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def job_list(self, clusters=None):
+        """Make a job list without polling the schedulers."""
+        job_list = CondorJobList.__new__(CondorJobList)
+        job_list.jobs = JobCache(os.path.join(self.directory, "jobs.sqlite"))
+        self.addCleanup(job_list.jobs.close)
+        job_list.clusters = clusters
+        return job_list
+
+    def test_partial_results(self):
+        """Check that jobs are found even if some schedulers fail."""
+        job_list = self.job_list(clusters=None)
+        start = time.monotonic()
+        job_list.refresh(timeout=0.5)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(list(job_list.jobs), [1])
+        self.assertEqual(set(job_list.failures), {"broken", "slow"})
+        self.assertEqual(set(job_list.jobs.updated()), {"working"})
+        self.assertFalse(self.registry.healthy("broken"))
+        self.assertTrue(self.registry.healthy("working"))
+
+    def test_hung_scheduler(self):
+        """Check that a scheduler which never replies does not stop asimov from exiting."""
+        script = textwrap.dedent(
+            """
+            import threading
+            from unittest.mock import patch
+
+            from asimov.condor import CondorJobList, JobCache, SchedulerRegistry
+
+            def query(ad, constraint=None):
+                threading.Event().wait()
+
+            registry = SchedulerRegistry(ttl=600)
+            registry.locate_all = lambda: [{"Name": "hung"}]
+            job_list = CondorJobList.__new__(CondorJobList)
+            job_list.jobs = JobCache("jobs.sqlite")
+            job_list.clusters = None
+            with patch("asimov.condor.schedulers", registry), patch.object(
+                CondorJobList, "_query", staticmethod(query)
+            ):
+                job_list.refresh(timeout=0.1)
+            print(sorted(job_list.failures))
+            """
+        )
+        environment = dict(os.environ, PYTHONPATH=self.cwd)
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=self.directory,
+            env=environment,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "['hung']")
+
+    def test_tracked_jobs_only(self):
+        """Check that every job is fetched unless only the tracked jobs are asked for."""
+        with patch.object(CondorJobList, "__init__", return_value=None) as init:
+            CondorJobList.for_ledger(MagicMock())
+        init.assert_called_once_with()
+
+        with patch.object(CondorJobList, "__init__", return_value=None) as init, patch(
+            "asimov.condor.tracked_clusters", return_value={1}
+        ), patch.object(asimov.condor.config, "getboolean", return_value=True):
+            CondorJobList.for_ledger(MagicMock())
+        init.assert_called_once_with(clusters={1})
+
+    def test_failed_scheduler_jobs_kept(self):
+        """Check that the jobs from a scheduler which fails are not forgotten."""
+        job_list = self.job_list()
+        old = CondorJob.from_dict(dict(id=5, command="bilby", hosts=1, status=2))
+        job_list.jobs.store("broken", [old], ttl=900)
+        job_list.jobs.store("working", [old], ttl=900)
+        job_list.refresh(timeout=0.5)
+        self.assertEqual(list(job_list.jobs), [1, 5])
+
+    def test_tracked_clusters(self):
+        """Check that each batch of clusters is asked for from every scheduler."""
+        job_list = self.job_list(clusters={1, 2, 3})
+        self.release.set()
+        # Other tests reload asimov, so patch the configuration which condor uses
+        with patch.object(asimov.condor.config, "getint", return_value=2):
+            job_list.refresh(timeout=5)
+        self.assertEqual(len(self.constraints), 6)
+        for name in ("working", "broken", "slow"):
+            self.assertEqual(
+                sorted(constraint for queried, constraint in self.constraints if queried == name),
+                cluster_constraints([1, 2, 3], batch_size=2),
+            )
+        self.assertEqual(list(job_list.jobs), [1])
+        self.assertEqual(set(job_list.failures), {"broken"})
+
+    def test_no_tracked_clusters(self):
+        """Check that the schedulers are not asked for jobs if none are tracked."""
+        job_list = self.job_list(clusters=None)
+        old = CondorJob.from_dict(dict(id=5, command="bilby", hosts=1, status=2))
+        job_list.jobs.store("working", [old], ttl=900)
+        job_list.refresh(clusters=[])
+        self.assertEqual(self.constraints, [])
+        self.assertEqual(list(job_list.jobs), [5])
+        self.assertEqual(set(job_list.jobs.updated()), {"working"})
+
+    def test_max_workers(self):
+        """Check that no more than the configured number of queries are sent at once."""
+        job_list = self.job_list(clusters={1, 2, 3})
+        self.release.set()
+        running = []
+        peak = []
+        lock = threading.Lock()
+        query = CondorJobList._query
+
+        def counted(ad, constraint=None):
+            with lock:
+                running.append(ad)
+                peak.append(len(running))
+            time.sleep(0.01)
+            try:
+                return query(ad, constraint)
+            finally:
+                with lock:
+                    running.remove(ad)
+
+        settings = {"constraint_batch": 1, "max_workers": 2}
+        with patch.object(CondorJobList, "_query", staticmethod(counted)), patch.object(
+            asimov.condor.config,
+            "getint",
+            side_effect=lambda section, option, fallback=None: settings[option],
+        ):
+            job_list.refresh(timeout=5)
+        self.assertEqual(len(self.constraints), 9)
+        self.assertLessEqual(max(peak), 2)
+
+
+class ConstraintTests(unittest.TestCase):
+    """Tests of building constraints for the clusters tracked by a ledger."""
+
+    def test_constraint(self):
+        """Check that a cluster and the nodes of its DAG are selected."""
+        self.assertEqual(
+            cluster_constraints([12, "10.0"], batch_size=5),
+            ["ClusterId == 10 || DAGManJobId == 10 || ClusterId == 12 || DAGManJobId == 12"],
+        )
+
+    def test_batches(self):
+        """Check that long lists of clusters are split up."""
+        constraints = cluster_constraints(range(1, 8), batch_size=3)
+        self.assertEqual(len(constraints), 3)
+        self.assertEqual(constraints[-1], "ClusterId == 7 || DAGManJobId == 7")
+        self.assertEqual(cluster_constraints([]), [])
+
+    def test_tracked_clusters(self):
+        """Check that only the jobs of unfinished analyses are tracked."""
+        def summary(name, status, job_id):
+            return ProductionSummary("S000000xx", name, "bilby", status, job_id, None, ())
+
+        ledger = MagicMock()
+        ledger.get_summaries.return_value = {
+            "S000000xx": [
+                summary("Prod0", "uploaded", 10),
+                summary("Prod1", "running", 11),
+                summary("Prod2", "stuck", "12"),
+                summary("Prod3", "ready", None),
+                summary("Prod4", "running", "not a job"),
+            ]
+        }
+        self.assertEqual(tracked_clusters(ledger), {11, 12})
+
+
+class JobCacheTests(unittest.TestCase):
+    """Tests of the database of condor jobs."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = JobCache(os.path.join(self.directory, "jobs.sqlite"))
+        self.addCleanup(self.cache.close)
+        # Don't share the schedulers found by other tests
+        patcher = patch("asimov.condor.schedulers", SchedulerRegistry(ttl=600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def job(cluster, dag=None, status=2):
+        job = dict(id=cluster, command="bilby", hosts=1, status=status, name=f"job {cluster}")
+        if dag:
+            job["dag id"] = dag
+        return CondorJob.from_dict(job)
+
+    def test_lookup(self):
+        """Check that jobs are found by their cluster id."""
+        self.cache.store("schedd", [self.job(10), self.job(11, status=5)], ttl=900)
+        self.assertIn(10, self.cache)
+        self.assertIn("11", self.cache)
+        self.assertNotIn(12, self.cache)
+        self.assertNotIn("not a job", self.cache)
+        self.assertEqual(self.cache[11].status, "Held")
+        self.assertEqual(self.cache[10].name, "job 10")
+        self.assertEqual(list(self.cache), [10, 11])
+
+    def test_dag_nodes(self):
+        """Check that the nodes of a DAG are attached to it."""
+        self.cache.store(
+            "schedd", [self.job(10), self.job(11, dag=10), self.job(12, dag=10), self.job(21, dag=20)], ttl=900
+        )
+        self.assertEqual([job.idno for job in self.cache[10].subjobs], [11, 12])
+        self.assertEqual(self.cache.children(10), [11, 12])
+        self.assertEqual(self.cache.parent(11), 10)
+        self.assertIsNone(self.cache.parent(10))
+        # Nodes are only listed separately if their DAG is not in the cache
+        self.assertEqual(list(self.cache), [10, 21])
+        self.assertEqual(self.cache[21].dag, 20)
+
+    def test_replace(self):
+        """Check that only the jobs from one scheduler are replaced."""
+        self.cache.store("first", [self.job(10)], ttl=900)
+        self.cache.store("second", [self.job(20)], ttl=900)
+        self.cache.store("first", [self.job(11)], ttl=900)
+        self.assertEqual(list(self.cache), [11, 20])
+        self.assertEqual(len(self.cache), 2)
+
+    def test_fresh(self):
+        """Check that the cache is stale once any scheduler's jobs are too old."""
+        self.assertFalse(self.cache.fresh())
+        self.cache.store("first", [], ttl=900, updated=1000)
+        self.cache.store("second", [], ttl=100, updated=1000)
+        self.assertEqual(self.cache.updated(), {"first": (1000, 900), "second": (1000, 100)})
+        self.assertTrue(self.cache.fresh(now=1050))
+        self.assertFalse(self.cache.fresh(now=1150))
+
+    def test_shared(self):
+        """Check that the jobs can be read by another connection."""
+        self.cache.store("schedd", [self.job(10)], ttl=900)
+        other = JobCache(self.cache.location)
+        self.addCleanup(other.close)
+        self.assertTrue(other.fresh())
+        self.assertEqual(other[10].idno, 10)
+
+    def test_fresh_cache_is_used(self):
+        """Check that the schedulers are not polled while the cache is fresh."""
+        self.cache.store("schedd", [self.job(10)], ttl=900)
+        with patch.object(CondorJobList, "refresh") as refresh:
+            job_list = CondorJobList(cache=self.cache)
+        refresh.assert_not_called()
+        self.assertIn(10, job_list.jobs)
@@ -8,6 +8,9 @@ import asimov.event
 from asimov.ledger import YAMLLedger
 from asimov.cli.project import make_project
 from asimov.cli.application import apply_page
+from asimov.analysis import ProjectAnalysis
+from asimov.dag import DependencyGraph
+from asimov.testing import AsimovTestCase
 import git
 
 
@@ -56,3 +59,116 @@ class DAGTests(unittest.TestCase):
         apply_page(file = f"{self.cwd}/tests/test_data/test_complex_dag.yaml", event='GW150914_095045', ledger=self.ledger)
         event = self.ledger.get_event('GW150914_095045')[0]
         self.assertEqual(len(event.get_all_latest()), 2)
+
+
+class DependencyGraphTests(unittest.TestCase):
+    """Tests of the incremental tracking of analyses which are ready."""
+
+    def setUp(self):
+        self.graph = DependencyGraph()
+        self.graph.add("Prod0")
+        self.graph.add("Prod1", dependencies=["Prod0"])
+        self.graph.add("Prod2", dependencies=["Prod0"])
+        self.graph.add("Prod3", dependencies=["Prod1", "Prod2"])
+
+    def test_ready(self):
+        """Check that only analyses without unfinished dependencies are ready."""
+        self.assertEqual(set(self.graph.ready), {"Prod0"})
+        self.graph.set_finished("Prod0")
+        self.assertEqual(set(self.graph.ready), {"Prod1", "Prod2"})
+        self.graph.set_finished("Prod1")
+        self.assertEqual(set(self.graph.ready), {"Prod2"})
+        self.graph.set_finished("Prod2")
+        self.assertEqual(set(self.graph.ready), {"Prod3"})
+
+    def test_restarted(self):
+        """Check that analyses are blocked again if a dependency is no longer finished."""
+        self.graph.set_finished("Prod0")
+        self.graph.set_finished("Prod0", False)
+        self.assertEqual(set(self.graph.ready), {"Prod0"})
+        self.assertEqual(self.graph.blocking("Prod1"), 1)
+
+    def test_later_dependency(self):
+        """Check that analyses are connected to dependencies which are added later."""
+        self.graph.add("Prod4", dependencies=["Prod5"])
+        self.assertIn("Prod4", self.graph.ready)
+        self.graph.add("Prod5")
+        self.assertNotIn("Prod4", self.graph.ready)
+        self.graph.remove("Prod5")
+        self.assertIn("Prod4", self.graph.ready)
+
+    def test_duplicate(self):
+        """Check that an analysis can't be added twice."""
+        with self.assertRaises(ValueError):
+            self.graph.add("Prod0")
+
+
+class ProjectGraphTests(AsimovTestCase):
+    """Tests of the dependency graph of the analyses in a ledger."""
+
+    def setUp(self):
+        super().setUp()
+        for page in ("testing_pe.yaml", "event_non_standard_settings.yaml"):
+            apply_page(
+                file=f"{self.cwd}/tests/test_data/{page}", event=None, ledger=self.ledger
+            )
+        apply_page(
+            file=f"{self.cwd}/tests/test_data/test_linear_dag.yaml",
+            event="Nonstandard fmin",
+            ledger=self.ledger,
+        )
+
+    def test_matches_event(self):
+        """Check that the ready analyses match those found from the event."""
+        event = self.ledger.get_event("Nonstandard fmin")[0]
+        self.assertEqual(
+            self.ledger.dependency_graph.ready_analyses(),
+            {"Nonstandard fmin": [p.name for p in event.get_all_latest()]},
+        )
+
+    def test_status_changes(self):
+        """Check that the graph is updated when an analysis finishes."""
+        graph = self.ledger.dependency_graph
+        event = self.ledger.get_event("Nonstandard fmin")[0]
+        event.productions[0].status = "uploaded"
+        self.assertEqual([p.name for p in event.get_all_latest()], ["Prod1"])
+        self.assertEqual(graph.ready_analyses(), {"Nonstandard fmin": ["Prod1"]})
+
+    def test_other_event(self):
+        """Check that analyses can depend on the analyses of other events."""
+        graph = self.ledger.dependency_graph
+        data = dict(self.ledger.events["Nonstandard fmin"], name="Other")
+        data["productions"] = [
+            {
+                "Combined": {
+                    "pipeline": "bilby",
+                    "status": "ready",
+                    "needs": ["Nonstandard fmin/Prod1"],
+                }
+            }
+        ]
+        self.ledger.events["Other"] = data
+        self.ledger._reindex_event("Other")
+        self.assertEqual(graph.blocking(("Other", "Combined")), 1)
+        self.assertNotIn("Other", graph.ready_analyses())
+
+    def test_project_analysis(self):
+        """Check that project analyses depend on the analyses which they use."""
+        graph = self.ledger.dependency_graph
+        event = self.ledger.get_event("Nonstandard fmin")[0]
+        analysis = ProjectAnalysis(
+            subjects=[event],
+            analyses=event.productions,
+            name="Combined",
+            pipeline="bilby",
+            status="ready",
+        )
+        graph.update_project_analysis(analysis)
+        self.assertEqual(graph.blocking((None, "Combined")), 2)
+        self.assertEqual(graph.ready_project_analyses(), [])
+        self.assertEqual(graph.ready_analyses(), {"Nonstandard fmin": ["Prod0"]})
+        for production in event.productions:
+            production.status = "uploaded"
+        self.assertEqual(graph.ready_project_analyses(), ["Combined"])
+        graph.remove_project_analysis("Combined")
+        self.assertNotIn((None, "Combined"), graph)
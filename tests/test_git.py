@@ -0,0 +1,48 @@
+"""
+Tests of the git repositories which belong to events.
+"""
+
+import copy
+import os
+
+from asimov import config
+from asimov.cli.application import apply_page
+from asimov.git import EventRepo, LazyEventRepo
+from asimov.ledger import YAMLLedger
+from asimov.testing import AsimovTestCase
+
+
+class LazyRepositoryTests(AsimovTestCase):
+    """
+    Tests that event repositories are only opened when they are used.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        self.location = os.path.join(config.get("general", "git_default"), "S000000")
+
+    def test_not_opened_when_loaded(self):
+        """Check that loading an event does not open its repository."""
+        event = YAMLLedger(".asimov/ledger.yml").get_event("S000000")[0]
+        self.assertIsInstance(event.repository, LazyEventRepo)
+        self.assertFalse(event.repository.opened)
+        self.assertEqual(event.to_dict()["repository"], self.location)
+        copy.deepcopy(event.repository)
+        self.assertFalse(event.repository.opened)
+
+    def test_opened_when_used(self):
+        """Check that the repository is opened when one of its attributes is used."""
+        event = YAMLLedger(".asimov/ledger.yml").get_event("S000000")[0]
+        self.assertEqual(event.repository.directory, self.location)
+        self.assertTrue(event.repository.opened)
+
+    def test_handles_shared(self):
+        """Check that repositories at the same path share one git handle."""
+        first = EventRepo(self.location)
+        second = EventRepo(os.path.abspath(self.location))
+        self.assertIs(first.repo, second.repo)
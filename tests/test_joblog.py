@@ -0,0 +1,166 @@
+"""
+Tests of following jobs through their condor event logs.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from asimov.joblog import JobLogTracker, apply_events
+
+import htcondor
+
+
+def event(code, cluster, description, *details, node=0):
+    """The text of an event in a condor user log."""
+    lines = [f"{code:03d} ({cluster:03d}.{node:03d}.000) 2024-01-01 00:00:00 {description}"]
+    lines += [f"\t{detail}" for detail in details]
+    return "\n".join(lines + ["...", ""])
+
+
+def submitted(cluster, node=0):
+    return event(0, cluster, "Job submitted from host: <127.0.0.1:9618>", node=node)
+
+
+def executing(cluster, node=0):
+    return event(1, cluster, "Job executing on host: <127.0.0.1:9618>", node=node)
+
+
+def held(cluster, node=0):
+    return event(12, cluster, "Job was held.", "Out of memory", "Code 34 Subcode 0", node=node)
+
+
+def released(cluster, node=0):
+    return event(13, cluster, "Job was released.", "Released by user", node=node)
+
+
+def terminated(cluster, value=0, node=0):
+    return event(
+        5,
+        cluster,
+        "Job terminated.",
+        f"(1) Normal termination (return value {value})",
+        "\tUsr 0 00:00:00, Sys 0 00:00:00  -  Run Remote Usage",
+        "\tUsr 0 00:00:00, Sys 0 00:00:00  -  Run Local Usage",
+        "\tUsr 0 00:00:00, Sys 0 00:00:00  -  Total Remote Usage",
+        "\tUsr 0 00:00:00, Sys 0 00:00:00  -  Total Local Usage",
+        "0  -  Run Bytes Sent By Job",
+        "0  -  Run Bytes Received By Job",
+        "0  -  Total Bytes Sent By Job",
+        "0  -  Total Bytes Received By Job",
+        node=node,
+    )
+
+
+class JobLogTests(unittest.TestCase):
+    """Tests of the event log tracker."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.rundir = os.path.join(self.directory, "Prod0")
+        os.makedirs(os.path.join(self.rundir, "submit"))
+        self.dagman = os.path.join(self.rundir, "submit", "Prod0.dag.dagman.log")
+        self.nodes = os.path.join(self.rundir, "submit", "Prod0.dag.nodes.log")
+        self.database = os.path.join(self.directory, "logs.sqlite")
+        self.tracker = self.new_tracker()
+
+    def new_tracker(self):
+        tracker = JobLogTracker(self.database)
+        self.addCleanup(tracker.close)
+        return tracker
+
+    def write(self, path, *events):
+        with open(path, "a") as log:
+            log.write("".join(events))
+
+    def update(self, tracker=None, job_id=100):
+        return (tracker or self.tracker).update("S000000xx/Prod0", self.rundir, job_id)
+
+    def test_transitions(self):
+        """Check that the state of each job follows its events."""
+        self.write(
+            self.nodes,
+            submitted(101),
+            executing(101),
+            held(101),
+            submitted(102),
+            released(101),
+            executing(101),
+            terminated(101, value=3),
+        )
+        jobs = apply_events({}, htcondor.JobEventLog(self.nodes).events(stop_after=0))
+        self.assertEqual(jobs, {"101.0": ["completed", 3], "102.0": ["submitted", None]})
+
+    def test_no_logs(self):
+        """Check that nothing is known about an analysis without logs."""
+        self.assertIsNone(self.update())
+
+    def test_progress(self):
+        """Check that the progress of a DAG is found from its logs."""
+        self.write(self.dagman, submitted(100))
+        progress = self.update()
+        self.assertEqual(progress.state, "submitted")
+        self.assertEqual(progress.status, "Idle")
+
+        self.write(self.dagman, executing(100))
+        self.write(self.nodes, submitted(101), executing(101), submitted(102))
+        progress = self.update()
+        self.assertEqual(progress.status, "Running")
+        self.assertEqual(progress.nodes, {"running": 1, "submitted": 1})
+
+        self.write(self.nodes, held(102))
+        self.assertEqual(self.update().state, "held")
+
+        self.write(self.nodes, released(102), executing(102))
+        self.write(self.nodes, terminated(101), terminated(102))
+        self.write(self.dagman, terminated(100))
+        progress = self.update()
+        self.assertEqual(progress.state, "completed")
+        self.assertTrue(progress.succeeded)
+        self.assertEqual(progress.nodes, {"completed": 2})
+
+    def test_failed(self):
+        """Check that a DAG which fails has not succeeded."""
+        self.write(self.dagman, submitted(100), executing(100), terminated(100, value=1))
+        progress = self.update()
+        self.assertEqual(progress.state, "completed")
+        self.assertFalse(progress.succeeded)
+
+    def test_resume(self):
+        """Check that only the new events are read by a later run."""
+        self.write(self.dagman, submitted(100), executing(100))
+        self.assertEqual(self.update().state, "running")
+        # Events which have been read already are not read again
+        size = os.path.getsize(self.dagman)
+        with open(self.dagman, "r+") as log:
+            log.write(" " * size)
+        self.write(self.dagman, held(100))
+        self.assertEqual(self.update(self.new_tracker()).state, "held")
+        self.assertEqual(self.tracker.logs("S000000xx/Prod0"), [self.dagman])
+
+    def test_resubmitted(self):
+        """Check that the DAG for the analysis' job is used."""
+        self.write(self.dagman, submitted(100), executing(100), terminated(100, value=1))
+        self.assertFalse(self.update().succeeded)
+        self.write(self.dagman, submitted(200))
+        self.assertEqual(self.update(job_id=200).state, "submitted")
+        self.assertEqual(self.update(job_id=200).cluster, 200)
+        self.assertEqual(self.update(job_id=None).cluster, 200)
+        self.assertIsNone(self.update(job_id=300))
+
+    def test_new_logs(self):
+        """Check that logs written after the first check are found."""
+        self.write(self.dagman, submitted(100))
+        self.update()
+        rescue = os.path.join(self.rundir, "submit", "Rescue.dag.dagman.log")
+        self.write(rescue, submitted(200), executing(200))
+        self.assertEqual(self.update(job_id=200).state, "running")
+
+    def test_forget(self):
+        """Check that an analysis' logs can be forgotten."""
+        self.write(self.dagman, submitted(100))
+        self.update()
+        self.tracker.forget("S000000xx/Prod0")
+        self.assertEqual(self.tracker.logs("S000000xx/Prod0"), [])
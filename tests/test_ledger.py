@@ -0,0 +1,1041 @@
+"""
+Tests for the storage and retrieval of data in the project ledger.
+"""
+
+import datetime
+import os
+import shutil
+from unittest.mock import patch
+
+import yaml
+
+from asimov.cli.application import apply_page
+from asimov.cache import Dumper, LedgerCache
+from asimov.changes import ChangeFeed
+from asimov.event import Event
+from asimov.index import Range
+from asimov.journal import LedgerJournal
+from asimov import config
+from asimov.git import EventRepo
+from asimov.ledger import (
+    EventCache,
+    ReadOnlyLedgerError,
+    ShardedYAMLLedger,
+    SQLiteLedger,
+    YAMLLedger,
+)
+from asimov.lock import FileLock, LockTimeout
+from asimov.review import ReviewMessage
+from asimov.testing import AsimovTestCase
+
+
+class JournalTests(AsimovTestCase):
+    """
+    Tests of the change journal kept alongside the YAML ledger.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+
+    def test_update_appends_to_journal(self):
+        """Check that an event update is journaled rather than rewriting the ledger."""
+        with open(".asimov/ledger.yml", "r") as ledger_file:
+            snapshot = ledger_file.read()
+        length = len(self.ledger.journal)
+
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+
+        self.assertEqual(len(self.ledger.journal), length + 1)
+        with open(".asimov/ledger.yml", "r") as ledger_file:
+            self.assertEqual(ledger_file.read(), snapshot)
+
+    def test_journal_replayed_on_load(self):
+        """Check that journaled changes are visible when the ledger is reloaded."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        event = ledger.get_event("S000000")[0]
+        self.assertEqual(event.productions[0].status, "running")
+
+    def test_compaction(self):
+        """Check that compaction folds the journal into the ledger file."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        self.ledger.compact()
+
+        self.assertEqual(len(self.ledger.journal), 0)
+        self.assertFalse(os.path.exists(".asimov/ledger.yml.journal"))
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        self.assertEqual(ledger.get_event("S000000")[0].productions[0].status, "running")
+
+    def test_incomplete_record_ignored(self):
+        """Check that a partially written record is not replayed."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with open(".asimov/ledger.yml.journal", "a") as journal:
+            journal.write("---\naction: delete\nevent: S0")
+
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        self.assertIn("S000000", ledger.events)
+        self.assertEqual(len(ledger.journal), len(self.ledger.journal))
+
+    def test_only_new_records_read(self):
+        """Check that a write only reads the records added by other processes since the last one."""
+        other = YAMLLedger(".asimov/ledger.yml")
+        event = other.get_event("S000000")[0]
+        event.productions[0].status = "running"
+
+        event = self.ledger.get_event("S000000")[0]
+        event.meta["interesting"] = True
+        with patch("asimov.journal.yaml.load_all", wraps=yaml.load_all) as load:
+            self.ledger.update_event(event)
+        text = load.call_args[0][0]
+        self.assertEqual(text.count(LedgerJournal.terminator), 1)
+        self.assertIn("running", text)
+        self.assertEqual(len(self.ledger.journal), len(other.journal) + 1)
+
+        event = YAMLLedger(".asimov/ledger.yml").get_event("S000000")[0]
+        self.assertEqual(event.productions[0].status, "running")
+        self.assertTrue(event.meta["interesting"])
+
+    def test_truncated_journal_read(self):
+        """Check that the whole journal is read again once it has been truncated."""
+        journal = LedgerJournal(".asimov/ledger.yml.journal")
+        journal.records()
+        other = LedgerJournal(".asimov/ledger.yml.journal")
+        other.truncate()
+        other.append({"action": "delete", "event": "S000000"})
+
+        self.assertEqual(
+            journal.records(new=True), [{"action": "delete", "event": "S000000"}]
+        )
+        self.assertEqual(len(journal), 1)
+        self.assertEqual(journal.records(new=True), [])
+
+
+class LazyEventTests(AsimovTestCase):
+    """
+    Tests that events are only constructed when they are requested.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+
+    def test_events_not_built_on_load(self):
+        """Check that loading the ledger does not construct any events."""
+        with patch("asimov.ledger.Event", wraps=Event) as event_class:
+            ledger = YAMLLedger(".asimov/ledger.yml")
+            self.assertEqual(event_class.call_count, 0)
+            ledger.get_event("S000000")
+            self.assertEqual(event_class.call_count, 1)
+
+    def test_event_reused(self):
+        """Check that requesting an event twice returns the same object."""
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        first = ledger.get_event("S000000")[0]
+        second = ledger.get_event("S000000")[0]
+        self.assertIs(first, second)
+
+    def test_cache_bounded(self):
+        """Check that the least recently used event is discarded from a full cache."""
+        cache = EventCache(self.ledger, size=1)
+        cache.add(Event(name="S000001", ledger=self.ledger))
+        event = cache["S000000"]
+        self.assertEqual(list(cache._events.keys()), ["S000000"])
+        self.assertIs(cache["S000000"], event)
+
+    def test_missing_event(self):
+        """Check that requesting an unknown event raises a KeyError."""
+        with self.assertRaises(KeyError):
+            self.ledger.get_event("S999999")
+
+
+class SQLiteLedgerTests(AsimovTestCase):
+    """
+    Tests of the SQLite ledger engine.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        self.ledger.compact()
+        self.database = SQLiteLedger.from_yaml(
+            ".asimov/ledger.yml", location=".asimov/ledger.db"
+        )
+
+    def test_import(self):
+        """Check that events and productions are imported from a YAML ledger."""
+        ledger = SQLiteLedger(".asimov/ledger.db")
+        self.assertEqual(list(ledger.events), ["S000000"])
+        event = ledger.get_event("S000000")[0]
+        self.assertEqual(event.meta["event time"], 900)
+        self.assertEqual(
+            event.productions[0].name, "bilby-IMRPhenomXPHM-QuickTest"
+        )
+
+    def test_production_filter(self):
+        """Check that productions can be found using the indexed columns."""
+        event = self.database.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        self.database.update_event(event)
+
+        ledger = SQLiteLedger(".asimov/ledger.db")
+        running = ledger.get_productions(filters={"status": "running"})
+        self.assertEqual([p.name for p in running], ["bilby-IMRPhenomXPHM-QuickTest"])
+        self.assertEqual(ledger.get_productions(filters={"status": "ready"}), [])
+        self.assertEqual(
+            len(ledger.get_productions(filters={"pipeline": "bilby"})), 1
+        )
+
+    def test_export(self):
+        """Check that an SQLite ledger can be exported back to YAML."""
+        self.database.to_yaml(".asimov/exported.yml")
+        ledger = YAMLLedger(".asimov/exported.yml")
+        self.assertEqual(
+            ledger.events["S000000"]["productions"],
+            self.ledger.events["S000000"]["productions"],
+        )
+
+    def test_round_trip(self):
+        """Check that values keep their types through an SQLite ledger."""
+        values = {
+            "nothing": None,
+            "day": datetime.date(2023, 1, 2),
+            "moment": datetime.datetime(2023, 1, 2, 3, 4, 5),
+            "count": 3,
+            "ratio": 0.25,
+            "flag": True,
+            "text": "None",
+        }
+        with open(".asimov/ledger.yml") as ledger_file:
+            data = yaml.safe_load(ledger_file)
+        event = data["events"][0]
+        event["notes"] = dict(values)
+        production = list(event["productions"][0].values())[0]
+        production["notes"] = dict(values)
+        production["review"] = [
+            {"message": "Looks good", "status": "APPROVED", "timestamp": None},
+            {"message": "Checked", "status": "APPROVED", "timestamp": values["moment"]},
+        ]
+        with open(".asimov/typed.yml", "w") as ledger_file:
+            yaml.dump(data, ledger_file, Dumper=Dumper)
+
+        SQLiteLedger.from_yaml(".asimov/typed.yml", location=".asimov/typed.db")
+        SQLiteLedger(".asimov/typed.db").to_yaml(".asimov/exported.yml")
+        with open(".asimov/exported.yml") as ledger_file:
+            exported = yaml.safe_load(ledger_file)
+
+        event = exported["events"][0]
+        self.assertEqual(event["notes"], values)
+        production = list(event["productions"][0].values())[0]
+        self.assertEqual(production["notes"], values)
+        self.assertEqual(
+            [review["timestamp"] for review in production["review"]],
+            [None, values["moment"]],
+        )
+        self.assertEqual(exported["events"], data["events"])
+
+    def test_delete_event(self):
+        """Check that deleted events are moved to the archive."""
+        self.database.delete_event("S000000")
+        ledger = SQLiteLedger(".asimov/ledger.db")
+        self.assertEqual(len(ledger.events), 0)
+        self.assertEqual(ledger.archive.versions("S000000")[-1]["reason"], "deleted")
+
+
+class TransactionTests(AsimovTestCase):
+    """
+    Tests of grouping ledger changes into transactions.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        self.ledger.compact()
+
+    def test_single_write(self):
+        """Check that repeated updates to an event are written once at the end."""
+        with self.ledger.transaction():
+            event = self.ledger.get_event("S000000")[0]
+            event.productions[0].status = "running"
+            event.productions[0].status = "finished"
+            self.ledger.update_event(event)
+            self.assertEqual(len(self.ledger.journal), 0)
+        self.assertEqual(len(self.ledger.journal), 1)
+
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        self.assertEqual(
+            ledger.get_event("S000000")[0].productions[0].status, "finished"
+        )
+
+    def test_save_deferred(self):
+        """Check that saving inside a transaction happens when it closes."""
+        with open(".asimov/ledger.yml", "r") as ledger_file:
+            snapshot = ledger_file.read()
+        with self.ledger.transaction():
+            self.ledger.data["cronjob"] = 42
+            self.ledger.save()
+            with open(".asimov/ledger.yml", "r") as ledger_file:
+                self.assertEqual(ledger_file.read(), snapshot)
+        self.assertEqual(YAMLLedger(".asimov/ledger.yml").data["cronjob"], 42)
+
+    def test_rollback(self):
+        """Check that changes are discarded if the transaction fails."""
+        with self.assertRaises(ValueError):
+            with self.ledger.transaction():
+                event = self.ledger.get_event("S000000")[0]
+                event.productions[0].status = "running"
+                self.ledger.data["cronjob"] = 42
+                self.ledger.save()
+                raise ValueError
+
+        self.assertEqual(len(self.ledger.journal), 0)
+        self.assertNotIn("cronjob", self.ledger.data)
+        event = self.ledger.get_event("S000000")[0]
+        self.assertEqual(event.productions[0].status, "ready")
+
+    def test_no_rollback(self):
+        """Check that changes can be kept if the transaction fails."""
+        with self.assertRaises(ValueError):
+            with self.ledger.transaction(rollback=False):
+                event = self.ledger.get_event("S000000")[0]
+                event.productions[0].status = "running"
+                raise ValueError
+
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        self.assertEqual(
+            ledger.get_event("S000000")[0].productions[0].status, "running"
+        )
+
+    def test_nested(self):
+        """Check that only the outermost transaction writes to the ledger."""
+        with self.ledger.transaction():
+            with self.ledger.transaction():
+                event = self.ledger.get_event("S000000")[0]
+                event.productions[0].status = "running"
+            self.assertEqual(len(self.ledger.journal), 0)
+        self.assertEqual(len(self.ledger.journal), 1)
+
+    def test_sqlite(self):
+        """Check that transactions can be used with an SQLite ledger."""
+        ledger = SQLiteLedger.from_yaml(
+            ".asimov/ledger.yml", location=".asimov/ledger.db"
+        )
+        with ledger.transaction():
+            event = ledger.get_event("S000000")[0]
+            event.productions[0].status = "running"
+            self.assertEqual(
+                ledger.db.query_productions(status="running"), []
+            )
+        self.assertEqual(
+            SQLiteLedger(".asimov/ledger.db")
+            .get_event("S000000")[0]
+            .productions[0]
+            .status,
+            "running",
+        )
+
+
+class IndexTests(AsimovTestCase):
+    """
+    Tests of finding analyses using the ledger's indexes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_index_analyses.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+
+    def names(self, productions):
+        return [production.name for production in productions]
+
+    def test_events_not_built(self):
+        """Check that no events are constructed if no analyses match."""
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        with patch("asimov.ledger.Event", wraps=Event) as event_class:
+            self.assertEqual(ledger.get_productions(filters={"status": "running"}), [])
+            self.assertEqual(event_class.call_count, 0)
+
+    def test_multiple_filters(self):
+        """Check that analyses must match every filter."""
+        productions = self.ledger.get_productions(
+            filters={"pipeline": "bilby", "status": "ready"}
+        )
+        self.assertEqual(
+            self.names(productions), ["bilby-IMRPhenomXPHM-QuickTest", "Prod1"]
+        )
+        productions = self.ledger.get_productions(
+            filters={"pipeline": "bilby", "comment": "Bilby parameter estimation job"}
+        )
+        self.assertEqual(self.names(productions), ["Prod1"])
+
+    def test_index_updated(self):
+        """Check that the indexes follow changes to analyses."""
+        self.ledger.get_productions(filters={"status": "running"})
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[1].status = "running"
+        self.assertEqual(
+            self.names(self.ledger.get_productions(filters={"status": "running"})),
+            ["Prod0"],
+        )
+        self.assertEqual(
+            self.names(
+                self.ledger.get_productions(event="S000000", filters={"status": "ready"})
+            ),
+            ["bilby-IMRPhenomXPHM-QuickTest", "Prod1"],
+        )
+
+    def test_index_in_transaction(self):
+        """Check that changes made inside a transaction are found."""
+        self.ledger.get_productions(filters={"status": "running"})
+        with self.ledger.transaction():
+            event = self.ledger.get_event("S000000")[0]
+            event.productions[0].status = "running"
+            self.assertEqual(
+                self.names(self.ledger.get_productions(filters={"status": "running"})),
+                ["bilby-IMRPhenomXPHM-QuickTest"],
+            )
+
+    def test_range(self):
+        """Check that analyses can be found using a range of values."""
+        self.assertEqual(
+            len(self.ledger.get_productions(filters={"event time": Range(800, 900)})), 3
+        )
+        self.assertEqual(
+            self.ledger.get_productions(filters={"event time": Range(minimum=901)}), []
+        )
+
+    def test_review_status(self):
+        """Check that analyses can be found by their review status."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[2].review.add(
+            ReviewMessage(message="Fine", status="approved", production=None)
+        )
+        self.ledger.update_event(event)
+        self.assertEqual(
+            self.names(
+                self.ledger.get_productions(filters={"review status": "APPROVED"})
+            ),
+            ["Prod1"],
+        )
+
+    def test_registered_path(self):
+        """Check that additional metadata paths can be indexed."""
+        self.ledger.register_index("waveform/approximant")
+        self.assertEqual(
+            self.names(
+                self.ledger.get_productions(
+                    filters={"waveform/approximant": "IMRPhenomXPHM"}
+                )
+            ),
+            ["bilby-IMRPhenomXPHM-QuickTest"],
+        )
+
+
+class ParsedCacheTests(AsimovTestCase):
+    """
+    Tests of the cache of the parsed ledger file.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        self.ledger.compact()
+
+    def test_cache_used(self):
+        """Check that the ledger file is not parsed again if it has not changed."""
+        YAMLLedger(".asimov/ledger.yml")
+        self.assertTrue(os.path.exists(".asimov/_cache_ledger.yml.pickle"))
+        with patch("asimov.cache.yaml.load", wraps=yaml.load) as load:
+            ledger = YAMLLedger(".asimov/ledger.yml")
+            self.assertEqual(load.call_count, 0)
+        self.assertEqual(ledger.events["S000000"]["event time"], 900)
+
+    def test_cache_updated_on_save(self):
+        """Check that saving the ledger refreshes the cache."""
+        self.ledger.data["cronjob"] = 42
+        self.ledger.save()
+        with patch("asimov.cache.yaml.load", wraps=yaml.load) as load:
+            ledger = YAMLLedger(".asimov/ledger.yml")
+            self.assertEqual(load.call_count, 0)
+        self.assertEqual(ledger.data["cronjob"], 42)
+
+    def test_changed_file(self):
+        """Check that the cache is not used once the ledger file is edited."""
+        YAMLLedger(".asimov/ledger.yml")
+        with open(".asimov/ledger.yml", "r") as ledger_file:
+            text = ledger_file.read()
+        with open(".asimov/ledger.yml", "w") as ledger_file:
+            ledger_file.write(text.replace("event time: 900", "event time: 901"))
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        self.assertEqual(ledger.events["S000000"]["event time"], 901)
+
+    def test_damaged_cache(self):
+        """Check that a damaged cache is ignored."""
+        with open(".asimov/_cache_ledger.yml.pickle", "wb") as cache_file:
+            cache_file.write(b"not a pickle")
+        cache = LedgerCache(".asimov/ledger.yml")
+        self.assertIn("S000000", [event["name"] for event in cache.load()["events"]])
+
+
+class ShardedLedgerTests(AsimovTestCase):
+    """
+    Tests of the ledger which stores each event in its own file.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        self.ledger.compact()
+        self.sharded = ShardedYAMLLedger.from_yaml(
+            ".asimov/ledger.yml", location=".asimov/project.yml"
+        )
+        self.sharded.events["S000001"] = {"name": "S000001", "event time": 1000}
+
+    def test_convert(self):
+        """Check that each event is written to its own file."""
+        self.assertTrue(os.path.exists(".asimov/events/S000000.yml"))
+        with open(".asimov/project.yml", "r") as manifest:
+            data = yaml.safe_load(manifest)
+        self.assertNotIn("events", data)
+        self.assertIn("bilby", data["pipelines"])
+
+        ledger = ShardedYAMLLedger(".asimov/project.yml")
+        self.assertEqual(list(ledger.events), ["S000000", "S000001"])
+        event = ledger.get_event("S000000")[0]
+        self.assertEqual(event.productions[0].name, "bilby-IMRPhenomXPHM-QuickTest")
+
+    def test_lazy_loading(self):
+        """Check that only the requested event is read."""
+        ledger = ShardedYAMLLedger(".asimov/project.yml")
+        self.assertEqual(ledger.events.loaded, {})
+        ledger.get_event("S000000")
+        self.assertEqual(list(ledger.events.loaded.keys()), ["S000000"])
+
+    def test_update_single_shard(self):
+        """Check that updating an event only re-writes that event's file."""
+        untouched = {
+            path: os.stat(path).st_mtime_ns
+            for path in (".asimov/project.yml", ".asimov/events/S000001.yml")
+        }
+        event = self.sharded.get_event("S000000")[0]
+        event.productions[0].status = "running"
+
+        for path, mtime in untouched.items():
+            self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+        ledger = ShardedYAMLLedger(".asimov/project.yml")
+        self.assertEqual(
+            ledger.get_event("S000000")[0].productions[0].status, "running"
+        )
+
+    def test_delete_event(self):
+        """Check that deleted events are moved to the archive."""
+        self.sharded.delete_event("S000001")
+        self.assertFalse(os.path.exists(".asimov/events/S000001.yml"))
+        ledger = ShardedYAMLLedger(".asimov/project.yml")
+        self.assertEqual(list(ledger.events), ["S000000"])
+        self.assertEqual(ledger.archive.versions("S000001")[-1]["reason"], "deleted")
+
+    def test_export(self):
+        """Check that a sharded ledger can be joined back into a single file."""
+        self.sharded.to_yaml(".asimov/exported.yml")
+        ledger = YAMLLedger(".asimov/exported.yml")
+        self.assertEqual(
+            ledger.events["S000000"]["productions"],
+            self.ledger.events["S000000"]["productions"],
+        )
+        self.assertEqual(ledger.events["S000001"]["event time"], 1000)
+
+
+class ConcurrentLedgerTests(AsimovTestCase):
+    """
+    Tests of several processes using the same ledger.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        self.ledger.compact()
+        self.first = YAMLLedger(".asimov/ledger.yml")
+        self.second = YAMLLedger(".asimov/ledger.yml")
+
+    def reload(self):
+        return YAMLLedger(".asimov/ledger.yml").get_event("S000000")[0]
+
+    def test_separate_changes_merged(self):
+        """Check that changes to different parts of an event are both kept."""
+        first = self.first.get_event("S000000")[0]
+        second = self.second.get_event("S000000")[0]
+        first.productions[0].status = "running"
+        second.meta["interesting"] = True
+        second.productions[0].comment = "A comment"
+        self.second.update_event(second)
+
+        event = self.reload()
+        self.assertEqual(event.productions[0].status, "running")
+        self.assertTrue(event.meta["interesting"])
+        self.assertTrue(event.meta["interesting"])
+
+    def test_later_changes_merged(self):
+        """Check that a process does not undo changes it merged earlier."""
+        first = self.first.get_event("S000000")[0]
+        second = self.second.get_event("S000000")[0]
+        first.productions[0].status = "running"
+        second.meta["interesting"] = True
+        self.second.update_event(second)
+        second.meta["more interesting"] = True
+        self.second.update_event(second)
+
+        event = self.reload()
+        self.assertEqual(event.productions[0].status, "running")
+        self.assertTrue(event.meta["more interesting"])
+
+    def test_conflict(self):
+        """Check that the last writer's value is kept if both change the same field."""
+        first = self.first.get_event("S000000")[0]
+        second = self.second.get_event("S000000")[0]
+        first.productions[0].status = "running"
+        with self.assertLogs("asimov.ledger", level="WARNING"):
+            second.productions[0].status = "stuck"
+        self.assertEqual(self.reload().productions[0].status, "stuck")
+
+    def test_update_applied(self):
+        """Check that an applied update is merged with another process's changes."""
+        second = self.second.get_event("S000000")[0]
+        second.productions[0].status = "running"
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event_update.yaml",
+            event="S000000",
+            ledger=self.first,
+            update_page=True,
+        )
+
+        event = self.reload()
+        self.assertEqual(event.meta["event time"], 909)
+        self.assertEqual(event.meta["priors"]["luminosity distance"]["maximum"], 1010)
+        self.assertEqual(event.productions[0].status, "running")
+
+    def test_update_applied_after_compaction(self):
+        """Check that an applied update is merged after another process saves."""
+        second = self.second.get_event("S000000")[0]
+        second.productions[0].status = "running"
+        self.second.save()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event_update.yaml",
+            event="S000000",
+            ledger=self.first,
+            update_page=True,
+        )
+
+        event = self.reload()
+        self.assertEqual(event.meta["event time"], 909)
+        self.assertEqual(event.productions[0].status, "running")
+
+    def test_compacted_by_other_process(self):
+        """Check that changes are merged after another process re-writes the ledger."""
+        first = self.first.get_event("S000000")[0]
+        first.productions[0].status = "running"
+        self.first.data["cronjob"] = 42
+        self.first.save()
+
+        second = self.second.get_event("S000000")[0]
+        second.meta["interesting"] = True
+        self.second.data["hooks"] = {}
+        self.second.save()
+
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        event = ledger.get_event("S000000")[0]
+        self.assertEqual(event.productions[0].status, "running")
+        self.assertEqual(ledger.data["cronjob"], 42)
+        self.assertEqual(ledger.data["hooks"], {})
+
+    def test_stale_records_skipped(self):
+        """Check that journal records older than the ledger file are not replayed."""
+        event = self.first.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with open(".asimov/ledger.yml.journal", "r") as journal:
+            stale = journal.read()
+        event.productions[0].status = "finished"
+        self.first.compact()
+        with open(".asimov/ledger.yml.journal", "w") as journal:
+            journal.write(stale)
+
+        self.assertEqual(self.reload().productions[0].status, "finished")
+
+    def test_version(self):
+        """Check that each write increases the ledger's version."""
+        version = self.first.version
+        event = self.first.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        self.assertEqual(self.first.version, version + 1)
+        self.assertEqual(YAMLLedger(".asimov/ledger.yml").version, version + 1)
+
+    def test_lock_timeout(self):
+        """Check that a lock which is held elsewhere times out."""
+        with FileLock(".asimov/ledger.yml.lock"):
+            with self.assertRaises(LockTimeout):
+                with FileLock(".asimov/ledger.yml.lock", timeout=0.1):
+                    pass
+
+
+class ChangeFeedTests(AsimovTestCase):
+    """
+    Tests of the feed of changes made to the ledger.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(config.set, "ledger", "change feed", config.get("ledger", "change feed"))
+        config.set("ledger", "change feed", "True")
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        self.feed = self.ledger.changes
+        # Skip past the changes made while setting up the project
+        with self.feed.consume("test"):
+            pass
+
+    def test_field_changes(self):
+        """Check that only the fields which changed are added to the feed."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with self.feed.consume("test") as changes:
+            self.assertEqual(len(changes), 1)
+            change = changes[0]
+        self.assertEqual(change.event, "S000000")
+        self.assertEqual(change.production, event.productions[0].name)
+        self.assertEqual(change.field, "status")
+        self.assertEqual(change.new, "running")
+
+    def test_sequence(self):
+        """Check that changes are numbered in the order they were made."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        event.productions[0].status = "finished"
+        changes, _ = self.feed.read()
+        sequences = [change.sequence for change in changes]
+        self.assertEqual(sequences, sorted(set(sequences)))
+        self.assertEqual(changes[-1].new, "finished")
+
+    def test_resume(self):
+        """Check that a reader only sees the changes made since it last read the feed."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with self.feed.consume("test") as changes:
+            self.assertEqual(changes[-1].new, "running")
+        event.productions[0].status = "finished"
+        with ChangeFeed(".asimov/changes.jsonl").consume("test") as changes:
+            self.assertEqual([change.new for change in changes], ["finished"])
+        with self.feed.consume("test") as changes:
+            self.assertEqual(changes, [])
+
+    def test_failed_reader(self):
+        """Check that the cursor does not move if the changes are not processed."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with self.assertRaises(ValueError):
+            with self.feed.consume("test") as changes:
+                raise ValueError
+        with self.feed.consume("test") as changes:
+            self.assertEqual(changes[-1].new, "running")
+
+    def test_deleted_event(self):
+        """Check that deleting an event is added to the feed."""
+        self.ledger.delete_event("S000000")
+        with self.feed.consume("test") as changes:
+            self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0].event, "S000000")
+        self.assertIsNone(changes[0].field)
+        self.assertIsNone(changes[0].new)
+
+    def test_incomplete_record(self):
+        """Check that a record which is still being written is not read."""
+        with open(".asimov/changes.jsonl", "a") as feed:
+            feed.write('{"sequence": 1000, "event"')
+        with self.feed.consume("test") as changes:
+            self.assertEqual(changes, [])
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with self.feed.consume("test") as changes:
+            self.assertEqual([change.new for change in changes], ["running"])
+
+    def test_compact(self):
+        """Check that changes which every reader has read are removed."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with self.feed.consume("test"):
+            pass
+        event.productions[0].status = "finished"
+        with self.feed.consume("other") as changes:
+            self.assertIn("finished", [change.new for change in changes])
+        before, _ = self.feed.read()
+        removed = self.feed.compact()
+        after, _ = self.feed.read()
+        self.assertEqual(len(before) - removed, len(after))
+        self.assertEqual([change.new for change in after], ["finished"])
+
+        event.productions[0].status = "uploaded"
+        with self.feed.consume("test") as changes:
+            self.assertEqual([change.new for change in changes], ["finished", "uploaded"])
+        with self.feed.consume("other") as changes:
+            self.assertEqual([change.new for change in changes], ["uploaded"])
+        self.assertGreater(changes[0].sequence, after[0].sequence)
+
+    def test_compact_keeps_last(self):
+        """Check that the last change is kept so that the sequence carries on."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with self.feed.consume("test"):
+            pass
+        self.feed.compact()
+        changes, _ = self.feed.read()
+        self.assertEqual([change.new for change in changes], ["running"])
+        event.productions[0].status = "finished"
+        with self.feed.consume("test") as changes:
+            self.assertEqual([change.new for change in changes], ["finished"])
+
+    def test_compact_without_readers(self):
+        """Check that nothing is removed if nobody reads the feed."""
+        os.remove(".asimov/changes.jsonl.cursors")
+        self.assertEqual(self.feed.compact(), 0)
+
+    def test_compact_size(self):
+        """Check that a large feed is compacted once it has been read."""
+        event = self.ledger.get_event("S000000")[0]
+        event.productions[0].status = "running"
+        with ChangeFeed(".asimov/changes.jsonl", compact_size=0).consume("test"):
+            pass
+        changes, _ = self.feed.read()
+        self.assertEqual(len(changes), 1)
+
+
+class ArchiveTests(AsimovTestCase):
+    """
+    Tests of the archive of previous versions of events.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+
+    def test_deleted_event_archived(self):
+        """Check that deleted events are kept in the archive, not the ledger."""
+        self.ledger.delete_event("S000000")
+        self.ledger.save()
+        with open(".asimov/ledger.yml", "r") as ledger_file:
+            self.assertNotIn("trash", yaml.safe_load(ledger_file))
+        self.assertTrue(os.path.exists(".asimov/archive/S000000.yml"))
+        versions = YAMLLedger(".asimov/ledger.yml").archive.versions("S000000")
+        self.assertEqual(versions[0]["reason"], "deleted")
+        self.assertEqual(versions[0]["data"]["event time"], 900)
+
+    def test_restore_deleted(self):
+        """Check that a deleted event can be restored."""
+        self.ledger.delete_event("S000000")
+        self.ledger.restore_event("S000000", "version-1")
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        event = ledger.get_event("S000000")[0]
+        self.assertEqual(event.meta["event time"], 900)
+        self.assertEqual(len(event.productions), 1)
+
+    def test_restore_updated(self):
+        """Check that restoring an event archives the version it replaces."""
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event_update.yaml",
+            event="S000000",
+            ledger=self.ledger,
+            update_page=True,
+        )
+        self.ledger.restore_event("S000000", "version-1")
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        self.assertEqual(ledger.events["S000000"]["event time"], 900)
+        versions = ledger.archive.versions("S000000")
+        self.assertEqual(
+            [entry["reason"] for entry in versions], ["updated", "replaced"]
+        )
+        self.assertEqual(versions[1]["data"]["event time"], 909)
+
+    def test_missing_version(self):
+        """Check that restoring a version which does not exist fails."""
+        with self.assertRaises(KeyError):
+            self.ledger.restore_event("S000000", "version-1")
+
+    def test_legacy_history_moved(self):
+        """Check that history kept in the ledger by older versions is archived."""
+        self.ledger.data["history"] = {
+            "S000000": {
+                "version-2": {"event time": 901},
+                "version-1": {"event time": 900, "date changed": "yesterday"},
+            }
+        }
+        self.ledger.data["trash"] = {"events": {"S000001": {"name": "S000001"}}}
+        self.ledger.save()
+
+        ledger = YAMLLedger(".asimov/ledger.yml")
+        self.assertNotIn("history", ledger.data)
+        self.assertNotIn("trash", ledger.data)
+        versions = ledger.archive.versions("S000000")
+        self.assertEqual([entry["data"]["event time"] for entry in versions], [900, 901])
+        self.assertEqual(versions[0]["date"], "yesterday")
+        self.assertEqual(ledger.archive.events(), ["S000000", "S000001"])
+
+    def test_migrated_archive(self):
+        """Check that the archive is copied when the ledger is migrated."""
+        self.ledger.delete_event("S000000")
+        database = SQLiteLedger.from_ledger(self.ledger, location=".asimov/ledger.db")
+        self.assertEqual(database.archive.events(), ["S000000"])
+        database.restore_event("S000000", "version-1")
+        self.assertIn("S000000", SQLiteLedger(".asimov/ledger.db").events)
+
+
+class ReadOnlyTests(AsimovTestCase):
+    """
+    Tests of reading the ledger without changing the project.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+        self.directories = [
+            os.path.join(config.get("general", "rundir_default"), "S000000"),
+            os.path.join(config.get("general", "git_default"), "S000000"),
+            os.path.join(config.get("logging", "directory"), "S000000"),
+        ]
+        for directory in self.directories:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.ledger = YAMLLedger(".asimov/ledger.yml")
+
+    def test_no_directories_created(self):
+        """Check that reading an event does not create its directories or repository."""
+        with self.ledger.reading():
+            event = self.ledger.get_event("S000000")[0]
+            self.assertEqual(len(event.productions), 1)
+            data = event.to_dict()
+        self.assertEqual(
+            data["repository"],
+            os.path.join(config.get("general", "git_default"), "S000000"),
+        )
+        for directory in self.directories:
+            self.assertFalse(os.path.exists(directory))
+
+    def test_changes_refused(self):
+        """Check that a read-only ledger cannot be changed."""
+        with self.ledger.reading():
+            event = self.ledger.get_event("S000000")[0]
+            with self.assertRaises(ReadOnlyLedgerError):
+                event.productions[0].status = "running"
+            with self.assertRaises(ReadOnlyLedgerError):
+                self.ledger.save()
+        self.assertEqual(
+            YAMLLedger(".asimov/ledger.yml").events["S000000"]["productions"][0][
+                "bilby-IMRPhenomXPHM-QuickTest"
+            ]["status"],
+            "ready",
+        )
+
+    def test_loaded_again_after_reading(self):
+        """Check that events read while read-only are loaded in full afterwards."""
+        with self.ledger.reading():
+            event = self.ledger.get_event("S000000")[0]
+        # The event's repository is expected to exist outside of read-only mode
+        EventRepo.create(self.directories[1])
+        writable = self.ledger.get_event("S000000")[0]
+        self.assertIsNot(event, writable)
+        writable.productions[0].status = "running"
+        for directory in self.directories:
+            self.assertTrue(os.path.exists(directory))
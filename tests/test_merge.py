@@ -0,0 +1,99 @@
+"""
+Tests of merging and comparing ledger data.
+"""
+
+import unittest
+from copy import deepcopy
+
+from asimov.merge import copy_tree, diff, merge
+
+
+class MergeTests(unittest.TestCase):
+    """
+    Tests of merging nested dictionaries.
+    """
+
+    def setUp(self):
+        self.defaults = {
+            "quality": {"minimum frequency": {"H1": 20, "L1": 20}},
+            "priors": {"luminosity distance": {"minimum": 10, "maximum": 1000}},
+        }
+        self.event = {
+            "name": "S000000",
+            "interferometers": ["H1", "L1"],
+            "quality": {"minimum frequency": {"H1": 30}},
+            "productions": [{"Prod0": {"pipeline": "bilby", "status": "ready"}}],
+        }
+
+    def _update(self, base, changes):
+        """The recursive update which merge replaces."""
+        base = deepcopy(base)
+        for key, value in changes.items():
+            if isinstance(value, dict):
+                base[key] = self._update(base.get(key, {}), value)
+            else:
+                base[key] = deepcopy(value)
+        return base
+
+    def test_merge(self):
+        """Check that merging gives the same result as a recursive update."""
+        merged = merge(self.defaults, self.event)
+        self.assertEqual(merged, self._update(self.defaults, self.event))
+        self.assertEqual(list(merged), list(self._update(self.defaults, self.event)))
+        self.assertEqual(merged["quality"]["minimum frequency"], {"H1": 30, "L1": 20})
+
+    def test_inputs_unchanged(self):
+        """Check that the result of a merge can be changed without changing its inputs."""
+        original = deepcopy(self.defaults), deepcopy(self.event)
+        merged = merge(self.defaults, self.event)
+        merged["priors"]["luminosity distance"]["maximum"] = 2000
+        merged["interferometers"].append("V1")
+        merged["productions"][0]["Prod0"]["status"] = "running"
+        self.assertEqual((self.defaults, self.event), original)
+
+    def test_shared(self):
+        """Check that values from only one input are shared if they aren't copied."""
+        merged = merge(self.defaults, self.event, copy=False)
+        self.assertIs(merged["priors"], self.defaults["priors"])
+        self.assertIs(merged["productions"], self.event["productions"])
+        self.assertIsNot(merged["quality"], self.defaults["quality"])
+
+    def test_owned(self):
+        """Check that values from only the owned input are reused, and defaults are copied."""
+        merged = merge(self.defaults, self.event, owned=True)
+        self.assertEqual(merged, merge(self.defaults, self.event))
+        self.assertIs(merged["productions"], self.event["productions"])
+        self.assertIs(merged["interferometers"], self.event["interferometers"])
+        self.assertIsNot(merged["quality"], self.event["quality"])
+        merged["priors"]["luminosity distance"]["maximum"] = 2000
+        merged["quality"]["minimum frequency"]["L1"] = 30
+        self.assertEqual(self.defaults["priors"]["luminosity distance"]["maximum"], 1000)
+        self.assertEqual(self.defaults["quality"]["minimum frequency"]["L1"], 20)
+
+    def test_copy_tree(self):
+        """Check that copying plain data makes an independent copy."""
+        copied = copy_tree(self.event)
+        self.assertEqual(copied, self.event)
+        self.assertIsNot(copied["productions"][0], self.event["productions"][0])
+
+
+class DiffTests(unittest.TestCase):
+    """
+    Tests of finding the differences between nested dictionaries.
+    """
+
+    def test_diff(self):
+        """Check that only added and changed values are found."""
+        old = {"a": 1, "b": {"c": 2, "d": 3}, "e": [1], "f": 4}
+        new = {"a": 1, "b": {"c": 2, "d": 5}, "e": [1, 2], "g": {"h": 6}}
+        self.assertEqual(diff(old, new), {"b": {"d": 5}, "e": [1, 2], "g": {"h": 6}})
+
+    def test_shared_values_skipped(self):
+        """Check that values which are the same object are not compared."""
+
+        class Uncomparable(dict):
+            def __eq__(self, other):
+                raise AssertionError("This value should not have been compared")
+
+        shared = Uncomparable(a=1)
+        self.assertEqual(diff({"x": shared, "y": 1}, {"x": shared, "y": 2}), {"y": 2})
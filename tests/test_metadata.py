@@ -0,0 +1,183 @@
+"""
+Tests of the layered metadata used by analyses.
+"""
+
+import unittest
+from unittest import mock
+
+from asimov.cli.application import apply_page
+from asimov.metadata import LayeredMetadata
+from asimov.testing import AsimovTestCase
+
+
+class LayeredMetadataTests(unittest.TestCase):
+    """
+    Tests of looking up and changing values through layers of metadata.
+    """
+
+    def setUp(self):
+        self.defaults = {
+            "quality": {"minimum frequency": {"H1": 20}},
+            "sampler": {"nlive": 1000},
+        }
+        self.event = {
+            "event time": 900,
+            "interferometers": ["H1", "L1"],
+            "quality": {"minimum frequency": {"L1": 20}},
+        }
+        self.meta = LayeredMetadata(
+            [self.defaults, self.event], {"sampler": {"nlive": 500}}
+        )
+
+    def test_lookup(self):
+        """Check that values are found in the highest layer which has them."""
+        self.assertEqual(self.meta["event time"], 900)
+        self.assertEqual(self.meta["sampler"]["nlive"], 500)
+        self.assertEqual(
+            self.meta["quality"]["minimum frequency"], {"H1": 20, "L1": 20}
+        )
+        self.assertNotIn("waveform", self.meta)
+
+    def test_lower_layers_unchanged(self):
+        """Check that changes are only made to the top layer."""
+        self.meta["quality"]["minimum frequency"]["H1"] = 30
+        self.meta["interferometers"].append("V1")
+        del self.meta["event time"]
+        self.assertEqual(self.defaults["quality"]["minimum frequency"]["H1"], 20)
+        self.assertEqual(self.event["interferometers"], ["H1", "L1"])
+        self.assertEqual(self.event["event time"], 900)
+        self.assertEqual(self.meta["quality"]["minimum frequency"]["H1"], 30)
+        self.assertNotIn("event time", self.meta)
+
+    def test_overrides(self):
+        """Check that only the values which differ from the lower layers are serialised."""
+        self.meta["quality"]["minimum frequency"]["H1"] = 30
+        self.meta["interferometers"]
+        self.meta["likelihood"] = {}
+        self.assertEqual(
+            self.meta.overrides(),
+            {
+                "sampler": {"nlive": 500},
+                "quality": {"minimum frequency": {"H1": 30}},
+                "likelihood": {},
+            },
+        )
+
+    def test_assignment_replaces(self):
+        """Check that assigning a dictionary replaces the one in the lower layers."""
+        self.meta["quality"] = {"maximum frequency": {"H1": 448}}
+        self.assertEqual(self.meta["quality"], {"maximum frequency": {"H1": 448}})
+
+    def test_to_dict(self):
+        """Check that the merged metadata can be turned into a dictionary."""
+        self.assertEqual(
+            self.meta.to_dict(),
+            {
+                "quality": {"minimum frequency": {"H1": 20, "L1": 20}},
+                "sampler": {"nlive": 500},
+                "event time": 900,
+                "interferometers": ["H1", "L1"],
+            },
+        )
+
+    def test_version(self):
+        """Check that the version changes when the metadata might have been changed."""
+        version = self.meta.version
+        self.meta["event time"]
+        self.meta.lookup("interferometers")
+        self.assertEqual(self.meta.version, version)
+        self.meta["quality"]["minimum frequency"]["H1"] = 30
+        self.assertGreater(self.meta.version, version)
+        version = self.meta.version
+        self.meta["interferometers"]
+        self.assertGreater(self.meta.version, version)
+
+
+class ProductionMetadataTests(AsimovTestCase):
+    """
+    Tests of the metadata of productions read from the ledger.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event="S000000",
+            ledger=self.ledger,
+        )
+
+    def test_event_metadata_not_copied(self):
+        """Check that changing a production does not change its event."""
+        event = self.ledger.get_event("S000000")[0]
+        production = event.productions[0]
+        self.assertEqual(production.meta["event time"], 900)
+        production.meta["priors"]["luminosity distance"]["maximum"] = 2000
+        self.assertEqual(event.meta["priors"]["luminosity distance"]["maximum"], 1000)
+
+    def test_only_overrides_stored(self):
+        """Check that values inherited from the event are not stored with the production."""
+        event = self.ledger.get_event("S000000")[0]
+        production = event.productions[0]
+        production.meta["priors"]["luminosity distance"]["maximum"] = 2000
+        self.ledger.update_event(event)
+        stored = self.ledger.events["S000000"]["productions"][0][production.name]
+        self.assertNotIn("event time", stored)
+        self.assertEqual(stored["priors"], {"luminosity distance": {"maximum": 2000}})
+        self.assertEqual(stored["waveform"], {"approximant": "IMRPhenomXPHM"})
+
+    def test_serialisation_reused(self):
+        """Check that an unchanged production reuses its last representation."""
+        event = self.ledger.get_event("S000000")[0]
+        production = event.productions[0]
+        first = production.to_dict()[production.name]
+        with mock.patch.object(
+            production.meta, "overrides", wraps=production.meta.overrides
+        ) as overrides:
+            second = production.to_dict()[production.name]
+        overrides.assert_not_called()
+        self.assertEqual(first, second)
+        # Each representation can be changed without affecting the others
+        self.assertIsNot(first["waveform"], second["waveform"])
+        second["waveform"]["approximant"] = "IMRPhenomD"
+        self.assertEqual(
+            production.to_dict()[production.name]["waveform"],
+            {"approximant": "IMRPhenomXPHM"},
+        )
+
+        production.meta["waveform"]["approximant"] = "IMRPhenomD"
+        self.assertEqual(
+            production.to_dict()[production.name]["waveform"],
+            {"approximant": "IMRPhenomD"},
+        )
+
+    def test_serialisation_follows_event(self):
+        """Check that a production's representation changes with its event."""
+        event = self.ledger.get_event("S000000")[0]
+        production = event.productions[0]
+        production.meta["priors"]["luminosity distance"]["maximum"] = 2000
+        self.assertIn("priors", production.to_dict()[production.name])
+        event.meta["priors"]["luminosity distance"]["maximum"] = 2000
+        self.assertNotIn("priors", production.to_dict()[production.name])
+
+    def test_serialisation_held_value(self):
+        """Check that changes to a value which was read earlier are stored."""
+        event = self.ledger.get_event("S000000")[0]
+        production = event.productions[0]
+        waveform = production.meta["waveform"]
+        self.ledger.update_event(event)
+        waveform["approximant"] = "IMRPhenomD"
+        self.ledger.update_event(event)
+        stored = self.ledger.events["S000000"]["productions"][0][production.name]
+        self.assertEqual(stored["waveform"], {"approximant": "IMRPhenomD"})
+
+        data = production.meta["data"]
+        self.ledger.update_event(event)
+        data["segment length"] = 8
+        self.ledger.update_event(event)
+        stored = self.ledger.events["S000000"]["productions"][0][production.name]
+        self.assertEqual(stored["data"]["segment length"], 8)
@@ -0,0 +1,133 @@
+"""
+Tests of the checks of event and analysis descriptions.
+"""
+
+import unittest
+
+from asimov.cli.application import apply_page
+from asimov.schema import ANALYSIS, EVENT, ValidationError, validate_event
+from asimov.testing import AsimovTestCase
+
+
+class SchemaTests(unittest.TestCase):
+    """
+    Tests of checking documents against the schema.
+    """
+
+    def test_valid(self):
+        """Check that a valid analysis has no problems."""
+        analysis = {
+            "name": "Prod0",
+            "pipeline": "bilby",
+            "needs": ["Prod1"],
+            "quality": {"minimum frequency": {"H1": 20, "L1": 20.5}},
+        }
+        self.assertEqual(ANALYSIS.validate(analysis), [])
+
+    def test_all_problems(self):
+        """Check that every problem with a document is found at once."""
+        errors = ANALYSIS.validate(
+            {
+                "name": "Prod0",
+                "pipeline": "unknown",
+                "needs": 1,
+                "likelihood": {"sample rate": True},
+            }
+        )
+        self.assertEqual(len(errors), 3)
+        self.assertIn("analysis/needs should be a list or a string or empty, not int", errors)
+
+    def test_existing_ledgers(self):
+        """Check that forms of settings used by existing ledgers are valid."""
+        analysis = {"name": "Prod0", "pipeline": "BayesWave", "needs": "Prod1"}
+        self.assertEqual(ANALYSIS.validate(analysis), [])
+        event = {"name": "S000000", "repository": None}
+        self.assertEqual(EVENT.validate(event), [])
+
+    def test_required(self):
+        """Check that an event without a name is rejected."""
+        with self.assertRaises(ValidationError) as context:
+            EVENT.check({"event time": 900})
+        self.assertEqual(context.exception.errors, ["event/name is required"])
+
+    def test_cached(self):
+        """Check that documents with the same contents are only checked once."""
+        analysis = {"name": "Prod0", "pipeline": "bilby", "needs": 1}
+        errors = ANALYSIS.validate(analysis)
+        ANALYSIS._results[ANALYSIS._digest(dict(analysis))] = ("cached",)
+        self.assertEqual(ANALYSIS.validate(dict(analysis)), ["cached"])
+        analysis["needs"] = ["Prod1"]
+        self.assertEqual(ANALYSIS.validate(analysis), [])
+        self.assertEqual(len(errors), 1)
+
+    def test_ledger_event(self):
+        """Check that problems are reported against the analysis which has them."""
+        event = {
+            "name": "S000000",
+            "event time": 900,
+            "productions": [
+                {"Prod0": {"pipeline": "bilby", "status": "ready"}},
+                {"Prod1": {"pipeline": "bilby"}},
+            ],
+        }
+        self.assertEqual(
+            validate_event(event), {"Prod1": ["analysis/status is required"]}
+        )
+
+
+class ApplyValidationTests(AsimovTestCase):
+    """
+    Tests that invalid documents are not applied to a project.
+    """
+
+    def test_ledger_valid(self):
+        """Check that a project built from valid documents is valid."""
+        apply_page(
+            file=f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            file=f"{self.cwd}/tests/test_data/test_analysis_S000000.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        self.assertEqual(self.ledger.validate(), {})
+
+    def test_invalid_rejected(self):
+        """Check that an invalid analysis is not added to the ledger."""
+        apply_page(
+            file=f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        with open("invalid.yaml", "w") as blueprint:
+            blueprint.write(
+                "kind: analysis\nname: Prod0\npipeline: bilby\nneeds: 1\n"
+            )
+        apply_page(file="invalid.yaml", event="S000000", ledger=self.ledger)
+        self.assertEqual(self.ledger.get_event("S000000")[0].productions, [])
+
+    def test_single_dependency(self):
+        """Check that an analysis which needs a single analysis is built and stored as a list."""
+        apply_page(
+            file=f"{self.cwd}/tests/test_data/test_event.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        with open("single.yaml", "w") as blueprint:
+            blueprint.write(
+                "kind: analysis\nname: Prod0\npipeline: bilby\n---\n"
+                "kind: analysis\nname: Prod1\npipeline: Bilby\nneeds: Prod0\n"
+            )
+        apply_page(file="single.yaml", event="S000000", ledger=self.ledger)
+        event = self.ledger.get_event("S000000")[0]
+        self.assertEqual([p.name for p in event.productions], ["Prod0", "Prod1"])
+        self.assertEqual(event.productions[1].dependencies, ["Prod0"])
+        self.assertEqual([p.name for p in event.get_all_latest()], ["Prod0"])
+        summary = self.ledger.get_summaries("S000000")["S000000"][1]
+        self.assertEqual(summary.dependencies, ("Prod0",))
+        self.ledger.update_event(event)
+        stored = self.ledger.events["S000000"]["productions"][1]["Prod1"]
+        self.assertEqual(stored["needs"], ["Prod0"])
+        self.assertEqual(self.ledger.validate(), {})
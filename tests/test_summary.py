@@ -0,0 +1,64 @@
+"""
+Tests of the summaries of analyses used by listing commands.
+"""
+
+from asimov.cli.application import apply_page
+from asimov.summary import ProductionSummary, latest
+from asimov.testing import AsimovTestCase
+
+EVENT = "Nonstandard fmin"
+
+
+class ProductionSummaryTests(AsimovTestCase):
+    """
+    Tests that summaries built from the ledger match the analyses.
+    """
+
+    def setUp(self):
+        super().setUp()
+        apply_page(
+            f"{self.cwd}/tests/test_data/testing_pe.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/event_non_standard_settings.yaml",
+            event=None,
+            ledger=self.ledger,
+        )
+        apply_page(
+            f"{self.cwd}/tests/test_data/test_linear_dag.yaml",
+            event=EVENT,
+            ledger=self.ledger,
+        )
+
+    def test_matches_productions(self):
+        """Check that the summaries match those of the built analyses."""
+        summaries = self.ledger.get_summaries(EVENT)[EVENT]
+        productions = self.ledger.get_event(EVENT)[0].productions
+        self.assertEqual(
+            summaries,
+            [ProductionSummary.from_production(production) for production in productions],
+        )
+        self.assertEqual(summaries[1].dependencies, ("Prod0",))
+        self.assertEqual(summaries[1].pipeline, "bilby")
+
+    def test_latest(self):
+        """Check that analyses waiting on an unfinished analysis are not ready."""
+        summaries = self.ledger.get_summaries()[EVENT]
+        event = self.ledger.get_event(EVENT)[0]
+        self.assertEqual(
+            [summary.name for summary in latest(summaries)],
+            [production.name for production in event.get_all_latest()],
+        )
+
+    def test_unwritten_changes(self):
+        """Check that changes inside a transaction are included."""
+        with self.ledger.transaction():
+            event = self.ledger.get_event(EVENT)[0]
+            event.productions[0].status = "uploaded"
+            summaries = self.ledger.get_summaries()[EVENT]
+            self.assertEqual(summaries[0].status, "uploaded")
+            self.assertEqual(
+                [summary.name for summary in latest(summaries)], ["Prod1"]
+            )